@@ -0,0 +1,87 @@
+import os
+import sys
+
+if 'SUMO_HOME' in os.environ:
+    sys.path.append(os.path.join(os.environ['SUMO_HOME'], 'tools'))
+
+class TraciBackend:
+    def __init__(self, label, port=None, use_gui=False):
+        '''
+        SUMO running as a separate process, driven over a labeled TraCI socket connection.
+        '''
+        self.label = label
+        self.port = port
+        self.use_gui = use_gui
+        self._connection = None
+
+    def start(self, args):
+        '''
+        Start SUMO with the command line arguments and return the connection
+        TrafficEnv sends its commands to.
+        '''
+        import traci
+        from sumolib import checkBinary
+
+        binary = checkBinary("sumo-gui" if self.use_gui else "sumo")
+        traci.start([binary] + args, port=self.port, label=self.label)
+        self._connection = traci.getConnection(self.label)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close(wait=False)
+            self._connection = None
+
+class LibsumoBackend:
+    def __init__(self, use_gui=False):
+        '''
+        SUMO loaded into this process through libsumo, which saves the socket round-trip
+        of every command. libsumo runs one simulation per process.
+        '''
+        if use_gui:
+            raise ValueError('libsumo has no GUI, use the traci backend')
+        self._started = False
+
+    def start(self, args):
+        import libsumo
+
+        libsumo.start(["sumo"] + args)
+        self._started = True
+        return libsumo
+
+    def close(self):
+        if self._started:
+            import libsumo
+
+            libsumo.close()
+            self._started = False
+
+class FakeBackend:
+    def __init__(self):
+        '''
+        The pure Python FakeSimulation, so TrafficEnv runs without SUMO installed.
+        '''
+        self._simulation = None
+
+    def start(self, args):
+        from fake_sumo import FakeSimulation
+
+        self._simulation = FakeSimulation(args)
+        return self._simulation
+
+    def close(self):
+        if self._simulation is not None:
+            self._simulation.close()
+            self._simulation = None
+
+def make_backend(name, label, port=None, use_gui=False):
+    '''
+    Create the simulation backend called name: 'traci', 'libsumo' or 'fake'.
+    '''
+    if name == 'traci':
+        return TraciBackend(label, port, use_gui)
+    if name == 'libsumo':
+        return LibsumoBackend(use_gui)
+    if name == 'fake':
+        return FakeBackend()
+    raise ValueError("unknown backend '%s', expected 'traci', 'libsumo' or 'fake'" % name)
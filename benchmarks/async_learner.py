@@ -0,0 +1,48 @@
+'''
+Wall-clock time per episode and learner updates per second of the synchronous
+training loop (replay after every step) against the learner thread.
+
+Run from the repository root: python -m benchmarks.async_learner [episodes] [backend]
+'''
+import sys
+import time
+from environment import TrafficEnv
+from dqn import DQNAgent
+from training_simulation import ENV_KWARGS
+
+NUM_EPISODES = 5
+BATCH_SIZE = 32
+
+def train(env, agent, num_episodes, asynchronous):
+    episode_times = []
+    start = time.perf_counter()
+    if asynchronous:
+        agent.start_learner(BATCH_SIZE, update_to_data_ratio=1.0)
+    for episode in range(num_episodes):
+        episode_start = time.perf_counter()
+        state, _ = env.reset(seed=episode)
+        truncated = False
+        while not truncated:
+            action = agent.act(state)
+            next_state, reward, _, truncated, _ = env.step(action)
+            agent.remember(state, action, reward, next_state, truncated)
+            state = next_state
+            if not asynchronous:
+                agent.replay(BATCH_SIZE)
+        if not asynchronous:
+            agent.update_target_model()
+        episode_times.append(time.perf_counter() - episode_start)
+    agent.stop_learner()
+    return episode_times, agent.gradient_steps / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    num_episodes = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_EPISODES
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'traci'
+    print('%12s %18s %18s %14s' % ('learner', 'episode mean (s)', 'learner updates/s', 'updates'))
+    for asynchronous in [False, True]:
+        env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, reset_mode='load'))
+        agent = DQNAgent(state_size=12, action_size=2, gamma=0.95, epsilon=0.1, learning_rate=0.0002, update_rate=0.001)
+        episode_times, updates_per_second = train(env, agent, num_episodes, asynchronous)
+        env.close()
+        print('%12s %18.2f %18.1f %14i' % ('thread' if asynchronous else 'synchronous',
+            sum(episode_times) / len(episode_times), updates_per_second, agent.gradient_steps))
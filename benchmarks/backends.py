@@ -0,0 +1,33 @@
+'''
+Per-step latency of TrafficEnv with each simulation backend: TraCI over a socket,
+libsumo in process and the pure Python fake simulator.
+
+Run from the repository root: python -m benchmarks.backends [backend ...]
+'''
+import sys
+import time
+import numpy as np
+from environment import TrafficEnv
+from training_simulation import ENV_KWARGS
+
+BACKENDS = ['traci', 'libsumo', 'fake']
+SEED = 0
+
+if __name__ == '__main__':
+    backends = sys.argv[1:] or BACKENDS
+    print('%10s %14s %14s %14s %16s' % ('backend', 'subscriptions', 'step p50 (ms)', 'step p99 (ms)', 'sim second (us)'))
+    for backend in backends:
+        for use_subscriptions in [False, True]:
+            env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, use_subscriptions=use_subscriptions))
+            env.reset(seed=SEED)
+            rng = np.random.default_rng(SEED)
+            latencies = []
+            truncated = False
+            while not truncated:
+                start = time.perf_counter()
+                _, _, _, truncated, _ = env.step(int(rng.integers(2)))
+                latencies.append(time.perf_counter() - start)
+            env.close()
+            print('%10s %14s %14.2f %14.2f %16.1f' % (
+                backend, use_subscriptions, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000,
+                sum(latencies) / env.sumo_step * 1e6))
@@ -0,0 +1,59 @@
+'''
+Member updates per second of DQNEnsembleAgent, where one replay call updates all
+K members, against K separate DQNAgents replaying one after the other, for
+K = 1 to 64. Every memory is filled with the same number of random transitions.
+
+Run from the repository root: python -m benchmarks.ensemble [threads]
+'''
+import sys
+import time
+import numpy as np
+import torch
+from dqn import DQNAgent
+from ensemble import DQNEnsembleAgent
+
+MEMBERS = [1, 2, 4, 8, 16, 32, 64]
+STATE_SIZE = 12
+BATCH_SIZE = 32
+TRANSITIONS = 2000
+SECONDS = 3.0
+
+def fill(memory):
+    memory.push_batch(
+        np.random.randint(0, 20, (TRANSITIONS, STATE_SIZE)).astype(np.float32),
+        np.random.randint(0, 2, TRANSITIONS),
+        -np.random.rand(TRANSITIONS).astype(np.float32) * 100,
+        np.random.randint(0, 20, (TRANSITIONS, STATE_SIZE)).astype(np.float32),
+        np.zeros(TRANSITIONS, dtype=np.float32))
+
+def calls_per_second(function):
+    function()
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SECONDS:
+        function()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+def separate(k):
+    agents = [DQNAgent(STATE_SIZE, 2, 0.95, 0.1, 0.0002, 0.001) for _ in range(k)]
+    for agent in agents:
+        fill(agent.memory)
+    def replay():
+        for agent in agents:
+            agent.replay(BATCH_SIZE)
+    return k * calls_per_second(replay)
+
+def ensemble(k):
+    agent = DQNEnsembleAgent(STATE_SIZE, 2, k, 0.95, 0.1, 0.001, 0.001)
+    for memory in agent.memories:
+        fill(memory)
+    return k * calls_per_second(lambda: agent.replay(BATCH_SIZE))
+
+if __name__ == '__main__':
+    torch.set_num_threads(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
+    print('%8s %22s %22s %10s' % ('members', 'separate updates/s', 'ensemble updates/s', 'speedup'))
+    for k in MEMBERS:
+        separate_rate = separate(k)
+        ensemble_rate = ensemble(k)
+        print('%8i %22.0f %22.0f %10.2f' % (k, separate_rate, ensemble_rate, ensemble_rate / separate_rate))
@@ -0,0 +1,40 @@
+'''
+Scaling of evaluation.run_evaluation with the number of worker processes: the
+fixed-time and actuated controllers on the same seeds, on 1, 2, 4, ... workers
+up to the core count (at least 2), reporting episodes per minute and the
+efficiency against 1 worker.
+
+Run from the repository root:
+    python -m benchmarks.evaluation [backend] [seeds]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+from evaluation import run_evaluation
+from training_simulation import ENV_KWARGS
+
+CONTROLLERS = ['fixed', 'actuated']
+TIME_STEPS = 900
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'traci'
+    seeds = list(range(10000, 10000 + (int(sys.argv[2]) if len(sys.argv) > 2 else 8)))
+    env_kwargs = dict(ENV_KWARGS, backend=backend, time_steps=TIME_STEPS)
+    worker_counts = [1]
+    while worker_counts[-1] < max(os.cpu_count(), 2):
+        worker_counts.append(worker_counts[-1] * 2)
+
+    rates = []
+    for workers in worker_counts:
+        evaluation_dir = tempfile.mkdtemp(prefix='evaluation_benchmark_')
+        start = time.perf_counter()
+        run_evaluation(evaluation_dir, CONTROLLERS, seeds, env_kwargs, workers)
+        rates.append(len(CONTROLLERS) * len(seeds) / (time.perf_counter() - start) * 60)
+        shutil.rmtree(evaluation_dir)
+
+    print('%i cores, %i episodes of %i seconds' % (os.cpu_count(), len(CONTROLLERS) * len(seeds), TIME_STEPS))
+    print('%8s %16s %10s %12s' % ('workers', 'episodes/min', 'speedup', 'efficiency'))
+    for workers, rate in zip(worker_counts, rates):
+        print('%8i %16.1f %10.2f %12.2f' % (workers, rate, rate / rates[0], rate / rates[0] / workers))
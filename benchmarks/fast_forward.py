@@ -0,0 +1,38 @@
+'''
+Episode wall time, agent decisions and simulated seconds per wall second of
+TrafficEnv with and without fast_forward, for the demand profiles of
+TrafficGenerator, under an alternating fixed policy.
+
+Run from the repository root: python -m benchmarks.fast_forward [backend]
+'''
+import sys
+import time
+from environment import TrafficEnv
+from generator import DEMAND_PROFILES
+from training_simulation import ENV_KWARGS
+
+SEED = 0
+
+def run(backend, demand_scale, fast_forward):
+    env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, demand_scale=demand_scale, fast_forward=fast_forward))
+    env.reset(seed=SEED)
+    decisions = 0
+    truncated = False
+    start = time.perf_counter()
+    while not truncated:
+        _, _, _, truncated, info = env.step(decisions % 2)
+        decisions += 1
+    wall_time = time.perf_counter() - start
+    env.close()
+    return wall_time, decisions, info['sim_seconds'], info['skipped_seconds']
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'traci'
+    print('%8s %13s %10s %10s %10s %14s %9s' % ('profile', 'fast forward', 'wall (s)', 'decisions', 'skipped', 'sim s/wall s', 'speedup'))
+    for profile, demand_scale in DEMAND_PROFILES.items():
+        baseline = None
+        for fast_forward in [False, True]:
+            wall_time, decisions, sim_seconds, skipped = run(backend, demand_scale, fast_forward)
+            baseline = baseline or wall_time
+            print('%8s %13s %10.2f %10i %10i %14.0f %9.2f' % (
+                profile, fast_forward, wall_time, decisions, skipped, sim_seconds / wall_time, baseline / wall_time))
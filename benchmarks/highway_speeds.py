@@ -0,0 +1,39 @@
+'''
+Memory of the highway speed statistics over long episodes: the bytes held by
+HighwaySpeedStats against a dict with one speed per highway vehicle, which the
+environment kept before, for episodes of 1 to 24 simulated hours. Also the
+TraCI calls per decision spent on the highway detectors.
+
+Run from the repository root: python -m benchmarks.highway_speeds [backend] [hours ...]
+'''
+import sys
+import time
+from environment import TrafficEnv
+from training_simulation import ENV_KWARGS
+
+def stats_bytes(stats):
+    # the histogram and one (time, count) pair per read in the flow window
+    return stats.histogram.nbytes + sys.getsizeof(stats._recent) + len(stats._recent) * sys.getsizeof((0, 0))
+
+def speed_dict_bytes(vehicles):
+    speeds = {'veh%i' % i: 15.0 for i in range(vehicles)}
+    return sys.getsizeof(speeds) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in speeds.items())
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'fake'
+    hours = [int(h) for h in sys.argv[2:]] or [1, 6, 24]
+    print('%6s %10s %10s %16s %16s %14s' % ('hours', 'decisions', 'vehicles', 'stats bytes', 'dict bytes', 'wall time (s)'))
+    for h in hours:
+        env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, time_steps=h * 3600))
+        env.reset(seed=0)
+        decisions = 0
+        truncated = False
+        start = time.perf_counter()
+        while not truncated:
+            _, _, _, truncated, info = env.step(decisions % 2)
+            decisions += 1
+        wall_time = time.perf_counter() - start
+        print('%6i %10i %10i %16i %16i %14.1f' % (h, decisions, info['highway_vehicles'], stats_bytes(env.highway_speeds),
+            speed_dict_bytes(info['highway_vehicles']), wall_time))
+        env.close()
+    print('detector calls per decision: %i' % (2 * len(env.highway_detectors.detector_ids)))
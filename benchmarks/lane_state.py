@@ -0,0 +1,49 @@
+'''
+Cost of TrafficEnv.get_state, one aggregate query per approach lane, against the
+previous per-vehicle observation, which asked every vehicle on the approaches for
+its lane index, for the demand profiles of TrafficGenerator. Both are timed on
+the same simulation states of an episode under an alternating fixed policy.
+
+Run from the repository root: python -m benchmarks.lane_state [backend]
+'''
+import sys
+import time
+import numpy as np
+from environment import TrafficEnv
+from generator import DEMAND_PROFILES
+from training_simulation import ENV_KWARGS
+
+def vehicle_lane_state(env):
+    state = [0] * 12
+    roads = env.intersections[0]['roads']
+    for i in range(len(roads)):
+        for vehID in env._traci.edge.getLastStepVehicleIDs(roads[i]):
+            state[i * 3 + env._traci.vehicle.getLaneIndex(vehID)] += 1
+    return state
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'traci'
+    print('%8s %18s %22s %20s %10s' % ('demand', 'approach vehicles', 'per vehicle (us/call)', 'per lane (us/call)', 'equal'))
+    for profile, demand_scale in DEMAND_PROFILES.items():
+        env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, demand_scale=demand_scale))
+        env.reset(seed=0)
+        vehicles, vehicle_times, lane_times = [], [], []
+        equal = True
+        truncated = False
+        step = 0
+        while not truncated:
+            _, _, _, truncated, _ = env.step(step % 2)
+            step += 1
+            old, old_time = timed(lambda: vehicle_lane_state(env))
+            new, new_time = timed(env.get_state)
+            equal &= np.array_equal(np.array(old, dtype=np.float32), new)
+            vehicles.append(sum(old))
+            vehicle_times.append(old_time)
+            lane_times.append(new_time)
+        env.close()
+        print('%8s %18.1f %22.1f %20.1f %10s' % (profile, np.mean(vehicles), np.mean(vehicle_times) * 1e6, np.mean(lane_times) * 1e6, equal))
@@ -0,0 +1,51 @@
+'''
+Decision latency of one batched SharedDQNAgent.act for K intersections against K
+DQNAgent.act calls, one per intersection, and the environment step time with one
+and with both intersections of the network on the fake simulator.
+
+Run from the repository root: python -m benchmarks.multi_intersection
+'''
+import time
+import numpy as np
+import torch
+from environment import TrafficEnv
+from dqn import DQNAgent, SharedDQNAgent
+from training_simulation import ENV_KWARGS, INTERSECTIONS
+
+SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+REPEATS = 2000
+
+def percentiles(function):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return np.percentile(samples, 50) * 1e6, np.percentile(samples, 99) * 1e6
+
+def step_time(env_kwargs, actions):
+    env = TrafficEnv(**env_kwargs)
+    env.reset(seed=0)
+    truncated = False
+    steps = 0
+    start = time.perf_counter()
+    while not truncated:
+        _, _, _, truncated, _ = env.step(actions[steps % 2])
+        steps += 1
+    env.close()
+    return (time.perf_counter() - start) / steps * 1e3
+
+if __name__ == '__main__':
+    torch.set_num_threads(1)
+    print('%6s %16s %16s %16s %16s' % ('K', 'batched p50 us', 'batched p99 us', 'per-int p50 us', 'per-int p99 us'))
+    for k in SIZES:
+        states = np.random.randint(0, 20, (k, 12)).astype(np.float32)
+        shared = SharedDQNAgent(12, 2, k, 0.95, 0.0, 0.0002, 0.001)
+        single = DQNAgent(12, 2, 0.95, 0.0, 0.0002, 0.001)
+        batched = percentiles(lambda: shared.act(states))
+        looped = percentiles(lambda: [single.act(state) for state in states])
+        print('%6i %16.1f %16.1f %16.1f %16.1f' % (k, batched[0], batched[1], looped[0], looped[1]))
+
+    fake = dict(ENV_KWARGS, backend='fake')
+    print('TrafficEnv.step, 1 intersection:  %.2f ms' % step_time(fake, [0, 1]))
+    print('TrafficEnv.step, 2 intersections: %.2f ms' % step_time(dict(fake, intersections=INTERSECTIONS), [[0, 1], [1, 0]]))
@@ -0,0 +1,85 @@
+'''
+Updates per second of offline training from recorded transitions against online
+training. The online run trains a DQNAgent as training_simulation.py does, one
+update per decision, while recording its transitions; the offline runs train a
+fresh agent on the recording with no simulation, reading batches from the
+memory-mapped shards or from memory, with the prefetching loader and with the
+batches read in the training loop.
+
+Run from the repository root: python -m benchmarks.offline_training [backend] [episodes] [updates]
+'''
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from environment import TrafficEnv
+from dqn import DQNAgent
+from offline_training import train_offline
+from training_simulation import ENV_KWARGS
+from transitions import TransitionRecorder, TransitionDataset, PrefetchLoader, _shard_arrays
+
+BATCH_SIZE = 32
+
+def make_agent(state_size):
+    return DQNAgent(state_size=state_size, action_size=2, gamma=0.95, epsilon=0.1, learning_rate=0.0002, update_rate=0.001)
+
+class InlineLoader:
+    # the batches of PrefetchLoader read in the training loop, without the thread
+    def __init__(self, dataset, batch_size):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self._rng = np.random.default_rng(0)
+        self._buffer = {name: np.empty((batch_size,) + shape, dtype=dtype) for name, (shape, dtype) in _shard_arrays(dataset.state_size).items()}
+
+    def next(self):
+        self.dataset.gather(np.sort(self._rng.integers(0, len(self.dataset), self.batch_size)), self._buffer)
+        return tuple(self._buffer[name] for name in ('states', 'actions', 'rewards', 'next_states', 'dones'))
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'fake'
+    episodes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    updates = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    torch.manual_seed(0)
+    directory = tempfile.mkdtemp(prefix='transitions_benchmark_')
+
+    env = TrafficEnv(**dict(ENV_KWARGS, backend=backend))
+    state_size = env.observation_space.shape[-1]
+    agent = make_agent(state_size)
+    recorder = TransitionRecorder(directory, state_size, shard_size=200)
+    online_updates = 0
+    start = time.perf_counter()
+    for episode in range(episodes):
+        recorder.begin_episode(episode, episode)
+        state, _ = env.reset(seed=episode)
+        truncated = False
+        while not truncated:
+            action = agent.act(state)
+            next_state, reward, _, truncated, _ = env.step(action)
+            agent.remember(state, action, reward, next_state, truncated)
+            recorder.record(state, action, reward, next_state, truncated)
+            state = next_state
+            agent.replay(BATCH_SIZE)
+        agent.update_target_model()
+        recorder.end_episode()
+    online_time = time.perf_counter() - start
+    online_updates = agent.gradient_steps
+    recorder.close()
+    env.close()
+
+    print('%s backend, %i episodes, %i updates online' % (backend, episodes, online_updates))
+    print('%-28s %14s %10s' % ('', 'updates/sec', 'speedup'))
+    online_rate = online_updates / online_time
+    print('%-28s %14.0f %10.2f' % ('online', online_rate, 1.0))
+    for in_memory in (False, True):
+        dataset = TransitionDataset(directory, in_memory)
+        for prefetch in (False, True):
+            loader = PrefetchLoader(dataset, BATCH_SIZE, seed=0) if prefetch else InlineLoader(dataset, BATCH_SIZE)
+            rate = train_offline(make_agent(state_size), loader, updates, log_interval=updates + 1)
+            if prefetch:
+                loader.close()
+            name = 'offline %s, %s' % ('in memory' if in_memory else 'memory-mapped', 'prefetch' if prefetch else 'inline')
+            print('%-28s %14.0f %10.2f' % (name, rate, rate / online_rate))
+    print('%i transitions in %i shards' % (len(dataset), len(dataset.shards)))
+    shutil.rmtree(directory)
@@ -0,0 +1,85 @@
+'''
+Latency per greedy decision, p50 and p99, of DQNAgent.act against the exported
+policies of policy_export: TorchScript, int8 TorchScript, ONNX and the NumPy
+runtime. Also the fraction of states on which each exported policy picks the
+action of the PyTorch model, for states seen on the fake simulator and random ones.
+
+Run from the repository root:
+    python -m benchmarks.policy_serving
+    python -m benchmarks.policy_serving --checkpoint-dir checkpoints    # a trained network
+'''
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from dqn import DQNAgent
+from checkpoint import Checkpointer
+from environment import TrafficEnv
+from policy_export import export_policy, load_policy, action_agreement
+from training_simulation import ENV_KWARGS
+
+DECISIONS = 20000
+WARMUP = 1000
+
+def observed_states():
+    env = TrafficEnv(**dict(ENV_KWARGS, backend='fake'))
+    state, _ = env.reset(seed=0)
+    states = [state]
+    truncated = False
+    while not truncated:
+        state, _, _, truncated, _ = env.step(len(states) % 2)
+        states.append(state)
+    env.close()
+    return np.array(states, dtype=np.float32)
+
+def latencies(act, states):
+    times = np.empty(DECISIONS)
+    for i in range(WARMUP):
+        act(states[i % len(states)])
+    for i in range(DECISIONS):
+        state = states[i % len(states)]
+        start = time.perf_counter_ns()
+        act(state)
+        times[i] = time.perf_counter_ns() - start
+    return np.percentile(times, 50) / 1000, np.percentile(times, 99) / 1000
+
+def serve(policy):
+    observation = policy.observation
+    def act(state):
+        observation[:] = state
+        return policy.act()
+    return act
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint-dir', help='export the latest checkpoint instead of an untrained network')
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    torch.manual_seed(0)
+    agent = DQNAgent(12, 2, 0.95, 0.0, 0.0002, 0.001)
+    if args.checkpoint_dir:
+        Checkpointer(args.checkpoint_dir).load(agent)
+    model = agent.model.cpu().eval()
+
+    states = observed_states()
+    random_states = np.random.default_rng(0).integers(0, 40, (10000, 12)).astype(np.float32)
+
+    exports = [('torchscript', 'policy.pt', False), ('torchscript int8', 'policy.pt', True),
+        ('onnx', 'policy.onnx', False), ('numpy', 'policy.npz', False)]
+    print('%-18s %10s %10s %14s %14s' % ('policy', 'p50 (us)', 'p99 (us)', 'observed agree', 'random agree'))
+    print('%-18s %10.1f %10.1f %14s %14s' % (('DQNAgent.act',) + latencies(agent.act, states) + ('-', '-')))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, file_name, quantize in exports:
+            path = os.path.join(directory, file_name)
+            try:
+                export_policy(model, path, quantize)
+                policy = load_policy(path)
+            except ImportError as e:
+                print('%-18s skipped: %s' % (name, e))
+                continue
+            p50, p99 = latencies(serve(policy), states)
+            print('%-18s %10.1f %10.1f %14.4f %14.4f' % (name, p50, p99,
+                action_agreement(model, policy, states), action_agreement(model, policy, random_states)))
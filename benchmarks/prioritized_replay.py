@@ -0,0 +1,107 @@
+'''
+Throughput of PrioritizedReplayMemory against the uniform ReplayMemory: batches
+sampled per second and, for the prioritized memory, batch priority updates per
+second, at 100k to 1M capacity. Then training on the fake simulator with both,
+reporting the average staying time per vehicle against simulated hours.
+
+Run from the repository root:
+    python -m benchmarks.prioritized_replay
+    python -m benchmarks.prioritized_replay --episodes 40    # longer convergence run
+'''
+import argparse
+import random
+import time
+import numpy as np
+import torch
+from replay_memory import ReplayMemory
+from prioritized_replay import PrioritizedReplayMemory
+from environment import TrafficEnv
+from dqn import DQNAgent
+from training_simulation import ENV_KWARGS
+
+CAPACITIES = [100000, 300000, 1000000]
+STATE_SIZE = 12
+BATCH_SIZE = 32
+SECONDS = 2.0
+
+def fill(memory):
+    n = memory.capacity
+    memory.push_batch(
+        np.random.randint(0, 20, (n, STATE_SIZE)).astype(np.float32),
+        np.random.randint(0, 2, n),
+        -np.random.rand(n).astype(np.float32) * 100,
+        np.random.randint(0, 20, (n, STATE_SIZE)).astype(np.float32),
+        np.zeros(n, dtype=np.float32))
+    return memory
+
+def per_second(function):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SECONDS:
+        function()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+def throughput():
+    print('%10s %16s %16s %16s' % ('capacity', 'uniform batch/s', 'per batch/s', 'per update/s'))
+    for capacity in CAPACITIES:
+        uniform = fill(ReplayMemory(capacity, STATE_SIZE))
+        uniform_rate = per_second(lambda: uniform.sample(BATCH_SIZE))
+        del uniform
+
+        prioritized = fill(PrioritizedReplayMemory(capacity, STATE_SIZE))
+        prioritized.update_priorities(np.arange(capacity), np.random.rand(capacity) * 10)
+        sample_rate = per_second(lambda: prioritized.sample(BATCH_SIZE))
+        indices = np.random.randint(0, capacity, BATCH_SIZE)
+        td_errors = np.random.rand(BATCH_SIZE)
+        update_rate = per_second(lambda: prioritized.update_priorities(indices, td_errors))
+        del prioritized
+        print('%10i %16.0f %16.0f %16.0f' % (capacity, uniform_rate, sample_rate, update_rate))
+
+def convergence(episodes, seed):
+    '''
+    Average staying time per vehicle per episode for uniform and prioritized replay,
+    with the same seeds, demand and initial network.
+    '''
+    env_kwargs = dict(ENV_KWARGS, backend='fake')
+    curves = {}
+    for prioritized in (False, True):
+        random.seed(seed)
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        agent = DQNAgent(12, 2, 0.95, 0.1, 0.0002, 0.001, prioritized=prioritized)
+        env = TrafficEnv(**env_kwargs)
+        curve = []
+        sim_seconds = 0
+        for episode in range(episodes):
+            state, _ = env.reset(seed=episode)
+            truncated = False
+            while not truncated:
+                action = agent.act(state)
+                next_state, reward, _, truncated, info = env.step(action)
+                agent.remember(state, action, reward, next_state, truncated)
+                agent.replay(BATCH_SIZE)
+                state = next_state
+            agent.update_target_model()
+            sim_seconds += env.sumo_step
+            curve.append((sim_seconds / 3600, info['average_staying_time_per_vehicle']))
+        env.close()
+        curves['prioritized' if prioritized else 'uniform'] = curve
+
+    print('%8s %14s %18s %18s' % ('episode', 'sim hours', 'uniform stay (s)', 'prioritized stay (s)'))
+    for episode in range(episodes):
+        print('%8i %14.1f %18.2f %18.2f' % (episode, curves['uniform'][episode][0],
+            curves['uniform'][episode][1], curves['prioritized'][episode][1]))
+    quarter = max(episodes // 4, 1)
+    for name, curve in curves.items():
+        print('%-12s mean staying time over the last %i episodes: %.2f s' % (name, quarter, np.mean([c[1] for c in curve[-quarter:]])))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--episodes', type=int, default=20, help='training episodes per replay mode')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    throughput()
+    convergence(args.episodes, args.seed)
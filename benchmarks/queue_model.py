@@ -0,0 +1,40 @@
+'''
+Throughput of the queue model surrogate against TrafficEnv: decisions and
+simulated intersection-seconds per second of one SUMO environment and of
+QueueModelEnv with 1 to 4096 intersections in lockstep, all under the same
+alternating policy at peak demand.
+
+Run from the repository root: python -m benchmarks.queue_model [backend] [decisions]
+'''
+import sys
+import time
+import numpy as np
+from environment import TrafficEnv
+from queue_model import QueueModelEnv
+from training_simulation import ENV_KWARGS
+
+SIZES = (1, 16, 256, 1024, 4096)
+
+def report(name, decisions, sim_seconds, wall_time):
+    print('%-22s %14.0f %22.0f' % (name, decisions / wall_time, sim_seconds / wall_time))
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'traci'
+    decisions = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print('%-22s %14s %22s' % ('', 'decisions/sec', 'intersection-sec/sec'))
+
+    env = TrafficEnv(**dict(ENV_KWARGS, backend=backend))
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for step in range(decisions):
+        env.step(step % 2)
+    report('TrafficEnv ' + backend, decisions, env.sumo_step, time.perf_counter() - start)
+    env.close()
+
+    for n in SIZES:
+        env = QueueModelEnv(n, **ENV_KWARGS)
+        env.reset(seed=0)
+        start = time.perf_counter()
+        for step in range(decisions):
+            env.step(np.full(n, step % 2))
+        report('QueueModelEnv x%i' % n, n * decisions, env.time.sum(), time.perf_counter() - start)
@@ -0,0 +1,81 @@
+'''
+Calibration of the queue model surrogate against SUMO: both run the same fixed
+signal policies under the demand profiles of TrafficGenerator, and the report
+compares the episode mean of the staying time per vehicle, of the vehicles and
+halting vehicles on the approaches at the decisions, per approach and in total,
+and of the reward. SUMO runs a few seeded episodes, the surrogate many
+episodes at once; the surrogate values are given with their relative error.
+
+Run from the repository root:
+    python -m benchmarks.queue_model_calibration [backend] [sumo episodes] [surrogate episodes]
+'''
+import sys
+import numpy as np
+from environment import TrafficEnv
+from generator import DEMAND_PROFILES
+from queue_model import QueueModelEnv
+from training_simulation import ENV_KWARGS
+
+# action of a decision given its index: hold one phase, alternate every decision, or every third
+POLICIES = {
+    'alternate': lambda step: step % 2,
+    'every third': lambda step: (step // 3) % 2,
+}
+PROFILES = ('low', 'medium', 'peak')
+APPROACHES = ('n', 'e', 's', 'w')
+
+def summarize(staying_times, rewards, states):
+    states = np.array(states)
+    counts, halting = states[:, :12], states[:, 12:]
+    summary = {'staying time': np.mean(staying_times), 'reward': np.mean(rewards),
+        'vehicles': counts.sum(axis=1).mean(), 'halting': halting.sum(axis=1).mean()}
+    for i, approach in enumerate(APPROACHES):
+        summary['vehicles ' + approach] = counts[:, 3 * i:3 * i + 3].sum(axis=1).mean()
+    return summary
+
+def run_sumo(backend, policy, demand_scale, episodes):
+    env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, demand_scale=demand_scale, lane_features=('count', 'halting')))
+    staying_times, rewards, states = [], [], []
+    for seed in range(episodes):
+        env.reset(seed=seed)
+        truncated = False
+        step = 0
+        while not truncated:
+            state, reward, _, truncated, info = env.step(policy(step))
+            rewards.append(reward)
+            states.append(state)
+            step += 1
+        staying_times.append(info['average_staying_time_per_vehicle'])
+    env.close()
+    return summarize(staying_times, rewards, states)
+
+def run_surrogate(policy, demand_scale, episodes):
+    env = QueueModelEnv(episodes, **dict(ENV_KWARGS, demand_scale=demand_scale, lane_features=('count', 'halting')))
+    env.reset(seed=0)
+    staying_times, rewards, states = [], [], []
+    running = np.ones(episodes, dtype=bool)
+    step = 0
+    while running.any():
+        state, reward, _, truncated, info = env.step(np.full(episodes, policy(step)))
+        rewards.extend(reward[running])
+        states.extend(state[running])
+        if truncated.any():
+            staying_times.extend(info['average_staying_time_per_vehicle'][truncated & running])
+            running &= ~truncated
+        step += 1
+    return summarize(staying_times, rewards, states)
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'traci'
+    sumo_episodes = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    surrogate_episodes = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    print('%s: %i episodes, surrogate: %i episodes' % (backend, sumo_episodes, surrogate_episodes))
+    for policy_name, policy in POLICIES.items():
+        for profile in PROFILES:
+            sumo = run_sumo(backend, policy, DEMAND_PROFILES[profile], sumo_episodes)
+            surrogate = run_surrogate(policy, DEMAND_PROFILES[profile], surrogate_episodes)
+            print('\n%s, %s demand' % (policy_name, profile))
+            print('%-14s %10s %10s %10s' % ('', backend, 'surrogate', 'error'))
+            for key in sumo:
+                error = (surrogate[key] - sumo[key]) / abs(sumo[key]) if sumo[key] else np.nan
+                print('%-14s %10.2f %10.2f %+9.0f%%' % (key, sumo[key], surrogate[key], 100 * error))
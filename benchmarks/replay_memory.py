@@ -0,0 +1,91 @@
+'''
+Compare the array backed ReplayMemory with the deque of Python lists DQNAgent used
+before: batches sampled and converted to tensors per second, and memory footprint.
+
+Run from the repository root: python -m benchmarks.replay_memory
+'''
+import random
+import time
+import tracemalloc
+from collections import deque
+import numpy as np
+import torch
+from replay_memory import ReplayMemory
+
+CAPACITIES = [10000, 100000, 1000000]
+STATE_SIZE = 12
+BATCH_SIZE = 32
+SAMPLE_SECONDS = 2.0
+
+def transitions(n):
+    '''
+    Random transitions shaped like the ones TrafficEnv produces.
+    '''
+    for _ in range(n):
+        yield (
+            np.random.randint(0, 20, STATE_SIZE).astype(np.float32),
+            random.randrange(2),
+            -random.random() * 100,
+            np.random.randint(0, 20, STATE_SIZE).astype(np.float32),
+            False
+        )
+
+def sample_deque(memory):
+    '''
+    The sampling path of DQNAgent.replay before ReplayMemory.
+    '''
+    batch = random.sample(memory, BATCH_SIZE)
+    states, actions, rewards, next_states, dones = zip(*batch)
+    return (
+        torch.tensor(states, dtype=torch.float32),
+        torch.tensor(actions, dtype=torch.int64).unsqueeze(-1),
+        torch.tensor(rewards, dtype=torch.float32).unsqueeze(-1),
+        torch.tensor(next_states, dtype=torch.float32),
+        torch.tensor(dones, dtype=torch.float32).unsqueeze(-1)
+    )
+
+def sample_ring(memory):
+    '''
+    The sampling path of DQNAgent.replay with ReplayMemory.
+    '''
+    states, actions, rewards, next_states, dones = memory.sample(BATCH_SIZE)
+    return (
+        torch.from_numpy(states),
+        torch.from_numpy(actions).unsqueeze(-1),
+        torch.from_numpy(rewards).unsqueeze(-1),
+        torch.from_numpy(next_states),
+        torch.from_numpy(dones).unsqueeze(-1)
+    )
+
+def fill(make_memory, push, capacity):
+    '''
+    Fill a memory to capacity and return it with the bytes it allocated.
+    '''
+    tracemalloc.start()
+    memory = make_memory()
+    for transition in transitions(capacity):
+        push(memory, transition)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return memory, size
+
+def batches_per_second(sample, memory):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SAMPLE_SECONDS:
+        sample(memory)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    print('%10s %16s %16s %14s %14s' % ('capacity', 'deque batch/s', 'ring batch/s', 'deque MB', 'ring MB'))
+    for capacity in CAPACITIES:
+        old, old_bytes = fill(lambda: deque(maxlen=capacity), lambda m, t: m.append(list(t)), capacity)
+        old_rate = batches_per_second(sample_deque, old)
+        del old
+
+        new, new_bytes = fill(lambda: ReplayMemory(capacity, STATE_SIZE), lambda m, t: m.push(*t), capacity)
+        new_rate = batches_per_second(sample_ring, new)
+        del new
+
+        print('%10i %16.0f %16.0f %14.1f %14.1f' % (capacity, old_rate, new_rate, old_bytes / 2 ** 20, new_bytes / 2 ** 20))
@@ -0,0 +1,45 @@
+'''
+Reset latency and total run time of TrafficEnv for restarting SUMO on every reset,
+reloading the running SUMO with traci.load, and reloading plus starting from a
+cached warm-start state. Seeds cycle through NUM_SEEDS values, so the warm-start
+states are cached after the first NUM_SEEDS episodes.
+
+Run from the repository root: python -m benchmarks.reset_modes [episodes] [backend]
+'''
+import sys
+import tempfile
+import time
+import numpy as np
+from environment import TrafficEnv
+from training_simulation import ENV_KWARGS
+
+NUM_EPISODES = 100
+NUM_SEEDS = 10
+WARM_START_STEPS = 300
+
+MODES = [
+    ('restart', dict(reset_mode='restart')),
+    ('load', dict(reset_mode='load')),
+    ('load + warm start', dict(reset_mode='load', warm_start_steps=WARM_START_STEPS)),
+]
+
+if __name__ == '__main__':
+    num_episodes = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_EPISODES
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'traci'
+    print('%20s %16s %16s %14s' % ('mode', 'reset mean (ms)', 'reset p99 (ms)', 'total (s)'))
+    for name, kwargs in MODES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            env = TrafficEnv(**dict(ENV_KWARGS, backend=backend, route_cache_dir=tmp_dir, state_cache_dir=tmp_dir, **kwargs))
+            rng = np.random.default_rng(0)
+            resets = []
+            start = time.perf_counter()
+            for episode in range(num_episodes):
+                reset_start = time.perf_counter()
+                env.reset(seed=episode % NUM_SEEDS)
+                resets.append(time.perf_counter() - reset_start)
+                truncated = False
+                while not truncated:
+                    _, _, _, truncated, _ = env.step(int(rng.integers(2)))
+            total = time.perf_counter() - start
+            env.close()
+        print('%20s %16.1f %16.1f %14.1f' % (name, np.mean(resets) * 1000, np.percentile(resets, 99) * 1000, total))
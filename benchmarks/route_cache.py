@@ -0,0 +1,38 @@
+'''
+Time the route file preparation of TrafficEnv.reset for a fixed seed set, regenerating
+the file on every reset versus reading it from a RouteCache.
+
+Run from the repository root: python -m benchmarks.route_cache
+'''
+import os
+import tempfile
+import time
+from generator import TrafficGenerator
+from route_cache import RouteCache
+
+SEEDS = list(range(20))
+PASSES = 3
+TIME_STEPS = 3600
+
+if __name__ == '__main__':
+    traffic_generator = TrafficGenerator(TIME_STEPS)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        route_file = os.path.join(tmp_dir, 'routes.rou.xml')
+        cache = RouteCache(os.path.join(tmp_dir, 'cache'))
+
+        print('%6s %16s %16s' % ('pass', 'generate (ms)', 'cache (ms)'))
+        for i in range(PASSES):
+            start = time.perf_counter()
+            for seed in SEEDS:
+                traffic_generator.generate_routefile(seed, route_file)
+            generate = (time.perf_counter() - start) / len(SEEDS)
+
+            start = time.perf_counter()
+            for seed in SEEDS:
+                cache.get(traffic_generator, seed)
+            cached = (time.perf_counter() - start) / len(SEEDS)
+            print('%6i %16.2f %16.3f' % (i + 1, generate * 1000, cached * 1000))
+
+        size = sum(entry.stat().st_size for entry in os.scandir(cache.cache_dir))
+        print('cache size: %.0f KB for %i seeds (%.0f KB uncompressed per file)' % (
+            size / 1024, len(SEEDS), os.path.getsize(route_file) / 1024))
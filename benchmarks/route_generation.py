@@ -0,0 +1,35 @@
+'''
+Time TrafficGenerator.generate_routefile in sequential (exact) and vectorized mode
+for demand horizons from one hour up to 24 hours.
+
+Run from the repository root: python -m benchmarks.route_generation
+'''
+import os
+import tempfile
+import time
+from generator import TrafficGenerator
+
+TIME_STEPS = [3600, 7200, 14400, 28800, 57600, 86400]
+REPEATS = 5
+
+def best_time(traffic_generator, seed, route_file):
+    '''
+    Best wall-clock time of REPEATS route file generations.
+    '''
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        traffic_generator.generate_routefile(seed, route_file)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        route_file = os.path.join(tmp_dir, 'routes.rou.xml')
+
+        print('%10s %12s %12s %10s' % ('time_steps', 'exact (ms)', 'vector (ms)', 'file (KB)'))
+        for time_steps in TIME_STEPS:
+            exact = best_time(TrafficGenerator(time_steps), 0, route_file)
+            vectorized = best_time(TrafficGenerator(time_steps, vectorized=True), 0, route_file)
+            size = os.path.getsize(route_file) / 1024
+            print('%10i %12.1f %12.1f %10.0f' % (time_steps, exact * 1000, vectorized * 1000, size))
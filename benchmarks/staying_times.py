@@ -0,0 +1,99 @@
+'''
+Compare StayingTimeTracker with the dict and list bookkeeping TrafficEnv used
+before, on a synthetic saturated trace: queues of up to QUEUE_LENGTH vehicles per
+road that build up and discharge. Checks that rewards, road averages and the
+episode average are identical and reports the time spent in the bookkeeping.
+
+Run from the repository root: python -m benchmarks.staying_times
+'''
+import time
+import numpy as np
+from staying_times import StayingTimeTracker
+
+ROADS = ['n', 'e', 's', 'w']
+TIME_STEPS = 3600
+DECISION_INTERVAL = 10
+QUEUE_LENGTHS = [25, 100, 400]
+
+class LegacyStayingTimes:
+    '''
+    The staying time bookkeeping of TrafficEnv before StayingTimeTracker.
+    '''
+    def __init__(self, roads):
+        self.staying_times = {road: {} for road in roads}
+        self.num_vehicles = {road: 0 for road in roads}
+        self.staying_time_per_vehicle = []
+
+    def update(self, vehicle_ids):
+        for road in self.staying_times:
+            for vehID in vehicle_ids[road]:
+                if vehID not in self.staying_times[road]:
+                    self.staying_times[road][vehID] = 1
+                    self.num_vehicles[road] += 1
+                else:
+                    self.staying_times[road][vehID] += 1
+
+    def remove_departed(self, vehicle_ids):
+        vehicles_in_roads = []
+        for road in self.staying_times:
+            vehicles_in_roads += vehicle_ids[road]
+        for road in self.staying_times:
+            for vehID, staying_time in list(self.staying_times[road].items()):
+                if vehID not in vehicles_in_roads:
+                    self.staying_time_per_vehicle.append(self.staying_times[road][vehID])
+                    del self.staying_times[road][vehID]
+                    self.num_vehicles[road] -= 1
+
+    def average(self, road):
+        return 0 if self.num_vehicles[road] == 0 else (sum(self.staying_times[road].values()) / self.num_vehicles[road])
+
+def saturated_trace(queue_length, seed=0):
+    '''
+    Vehicle IDs per road for every second: each road fills up to queue_length
+    vehicles and then serves a few of them per second in alternating green phases.
+    '''
+    rng = np.random.default_rng(seed)
+    queues = {road: [] for road in ROADS}
+    next_id = 0
+    trace = []
+    for t in range(TIME_STEPS):
+        for i, road in enumerate(ROADS):
+            for _ in range(rng.poisson(1.0)):
+                if len(queues[road]) < queue_length:
+                    queues[road].append('veh%i' % next_id)
+                    next_id += 1
+            if (t // 40) % 2 == i % 2:
+                del queues[road][:rng.integers(0, 3)]
+        trace.append({road: tuple(queue) for road, queue in queues.items()})
+    return trace
+
+def reward(bookkeeping, vehicle_ids):
+    bookkeeping.remove_departed(vehicle_ids)
+    averages = [bookkeeping.average(road) for road in ROADS]
+    overall = sum(averages) / 4
+    return sum(abs(overall - average) for average in averages)
+
+def run(bookkeeping, trace):
+    rewards = []
+    start = time.perf_counter()
+    for t, vehicle_ids in enumerate(trace):
+        bookkeeping.update(vehicle_ids)
+        if t % DECISION_INTERVAL == DECISION_INTERVAL - 1:
+            rewards.append(reward(bookkeeping, vehicle_ids))
+    return rewards, time.perf_counter() - start
+
+if __name__ == '__main__':
+    print('%12s %14s %14s' % ('queue length', 'legacy (ms)', 'tracker (ms)'))
+    for queue_length in QUEUE_LENGTHS:
+        trace = saturated_trace(queue_length)
+        legacy = LegacyStayingTimes(ROADS)
+        tracker = StayingTimeTracker(ROADS)
+        legacy_rewards, legacy_time = run(legacy, trace)
+        tracker_rewards, tracker_time = run(tracker, trace)
+
+        assert legacy_rewards == tracker_rewards
+        assert np.mean(legacy.staying_time_per_vehicle) == tracker.stats.mean()
+        assert np.isclose(np.var(legacy.staying_time_per_vehicle), tracker.stats.variance())
+        for q in [50, 90, 99]:
+            assert np.percentile(legacy.staying_time_per_vehicle, q) == tracker.stats.percentile(q)
+        print('%12i %14.1f %14.1f' % (queue_length, legacy_time * 1000, tracker_time * 1000))
@@ -0,0 +1,76 @@
+'''
+Compare the per-call TraCI data path of TrafficEnv with the subscription based one.
+
+Runs one episode per seed in each mode with the same action sequence, checks that
+states, rewards, staying times and highway speeds match and reports the number of
+TraCI round-trips and the wall-clock time per episode (excluding the SUMO start-up in reset).
+
+Run from the repository root: python -m benchmarks.subscriptions
+'''
+import time
+import numpy as np
+import traci.connection
+from environment import TrafficEnv
+
+SEEDS = [0, 1, 2]
+TIME_STEPS = 3600
+
+round_trips = 0
+_send_exact = traci.connection.Connection._sendExact
+
+def _counting_send_exact(self):
+    global round_trips
+    round_trips += 1
+    return _send_exact(self)
+
+traci.connection.Connection._sendExact = _counting_send_exact
+
+def run_episode(env, seed):
+    '''
+    Run one episode with a fixed action pattern and record everything the agent and log see.
+    '''
+    global round_trips
+    state, _ = env.reset(seed=seed)
+    round_trips = 0
+    start = time.perf_counter()
+    trace = {'states': [state], 'rewards': []}
+    rng = np.random.default_rng(seed)
+    truncated = False
+    while not truncated:
+        state, reward, _, truncated, _ = env.step(int(rng.integers(2)))
+        trace['states'].append(state)
+        trace['rewards'].append(reward)
+    trace['staying_time_per_vehicle'] = env.staying_time_tracker.stats.summary()
+    trace['highway_speeds'] = dict(env.highway_speeds)
+    trace['round_trips'] = round_trips
+    trace['wall_time'] = time.perf_counter() - start
+    return trace
+
+if __name__ == '__main__':
+    results = {}
+    for use_subscriptions in [False, True]:
+        env = TrafficEnv(
+            sumocfg_file_name='run.sumocfg',
+            log_file_name='log.txt',
+            time_steps=TIME_STEPS,
+            n_id='int1ns1',
+            e_id='ew3',
+            s_id='int1sn1',
+            w_id='we1',
+            tls_id='int1',
+            n_highway_id='hwn',
+            s_highway_id='hws',
+            green_time=10,
+            yellow_time=6,
+            use_subscriptions=use_subscriptions
+        )
+        results[use_subscriptions] = [run_episode(env, seed) for seed in SEEDS]
+        env.close()
+
+    for seed, calls, subscriptions in zip(SEEDS, results[False], results[True]):
+        assert np.array_equal(calls['states'], subscriptions['states']), 'states differ for seed %i' % seed
+        assert calls['rewards'] == subscriptions['rewards'], 'rewards differ for seed %i' % seed
+        assert calls['staying_time_per_vehicle'] == subscriptions['staying_time_per_vehicle'], 'staying times differ for seed %i' % seed
+        assert calls['highway_speeds'] == subscriptions['highway_speeds'], 'highway speeds differ for seed %i' % seed
+        print('seed %i: TraCI calls %i -> %i, wall time %.2fs -> %.2fs' % (
+            seed, calls['round_trips'], subscriptions['round_trips'], calls['wall_time'], subscriptions['wall_time']))
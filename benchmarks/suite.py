@@ -0,0 +1,175 @@
+'''
+Benchmark suite for the training hot paths. Every stage is timed on its own with
+the fake simulation backend, so no SUMO install is needed and runs are
+deterministic: the fake simulator replays the same vehicle IDs, lane indices and
+speeds for a seed on every run.
+
+Results are written as JSON and compared with a stored baseline; stages slower
+than the baseline by more than the threshold are reported as regressions and
+make the script exit with status 1.
+
+Run from the repository root:
+    python -m benchmarks.suite                    # run and compare with the baseline
+    python -m benchmarks.suite --save-baseline    # run and store the results as the baseline
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from environment import TrafficEnv
+from generator import TrafficGenerator
+from dqn import DQNAgent
+from training_simulation import ENV_KWARGS
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+RESULTS_FILE = os.path.join(os.path.dirname(__file__), 'results.json')
+SEED = 0
+REPEATS = 5
+
+def timed(function, calls):
+    '''
+    Median over REPEATS of the mean time per call of function, in microseconds.
+    '''
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        samples.append((time.perf_counter() - start) / calls * 1e6)
+    return {'us_per_call': float(np.median(samples)), 'calls': calls, 'repeats': REPEATS}
+
+def make_env():
+    return TrafficEnv(**dict(ENV_KWARGS, backend='fake'))
+
+def make_agent():
+    torch.manual_seed(SEED)
+    np.random.seed(SEED)
+    return DQNAgent(state_size=12, action_size=2, gamma=0.95, epsilon=0.0, learning_rate=0.0002, update_rate=0.001)
+
+def bench_env_step():
+    '''
+    A full episode of TrafficEnv.step with alternating actions, per step.
+    '''
+    env = make_env()
+    samples = []
+    for _ in range(REPEATS):
+        env.reset(seed=SEED)
+        steps = 0
+        truncated = False
+        start = time.perf_counter()
+        while not truncated:
+            _, _, _, truncated, _ = env.step(steps % 2)
+            steps += 1
+        samples.append((time.perf_counter() - start) / steps * 1e6)
+    env.close()
+    return {'us_per_call': float(np.median(samples)), 'calls': steps, 'repeats': REPEATS}
+
+def busy_env():
+    '''
+    An environment stepped into the middle of an episode, so the roads have queues.
+    '''
+    env = make_env()
+    env.reset(seed=SEED)
+    for i in range(60):
+        env.step(i % 2)
+    return env
+
+def bench_get_state():
+    env = busy_env()
+    result = timed(env.get_state, 2000)
+    env.close()
+    return result
+
+def bench_compute_reward():
+    env = busy_env()
+    result = timed(env.compute_reward, 2000)
+    env.close()
+    return result
+
+def bench_generate_routefile(vectorized):
+    traffic_generator = TrafficGenerator(ENV_KWARGS['time_steps'], vectorized=vectorized)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        route_file = os.path.join(tmp_dir, 'routes.rou.xml')
+        return timed(lambda: traffic_generator.generate_routefile(SEED, route_file), 5)
+
+def bench_act():
+    agent = make_agent()
+    state = np.arange(12, dtype=np.float32)
+    return timed(lambda: agent.act(state), 2000)
+
+def filled_agent():
+    agent = make_agent()
+    rng = np.random.default_rng(SEED)
+    for _ in range(agent.memory.capacity):
+        agent.remember(rng.integers(0, 20, 12).astype(np.float32), int(rng.integers(2)), -rng.random() * 100,
+            rng.integers(0, 20, 12).astype(np.float32), False)
+    return agent
+
+def bench_replay():
+    agent = filled_agent()
+    return timed(lambda: agent.replay(32), 500)
+
+def bench_update_target_model():
+    agent = make_agent()
+    return timed(agent.update_target_model, 2000)
+
+STAGES = {
+    'TrafficEnv.step': bench_env_step,
+    'TrafficEnv.get_state': bench_get_state,
+    'TrafficEnv.compute_reward': bench_compute_reward,
+    'TrafficGenerator.generate_routefile': lambda: bench_generate_routefile(False),
+    'TrafficGenerator.generate_routefile[vectorized]': lambda: bench_generate_routefile(True),
+    'DQNAgent.act': bench_act,
+    'DQNAgent.replay': bench_replay,
+    'DQNAgent.update_target_model': bench_update_target_model,
+}
+
+def compare(results, baseline, threshold):
+    '''
+    Print the change of every stage against the baseline and return the regressed stages.
+    '''
+    regressions = []
+    print('%-48s %14s %14s %8s' % ('stage', 'baseline (us)', 'current (us)', 'ratio'))
+    for stage, result in results.items():
+        if stage not in baseline:
+            print('%-48s %14s %14.1f %8s' % (stage, '-', result['us_per_call'], 'new'))
+            continue
+        ratio = result['us_per_call'] / baseline[stage]['us_per_call']
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print('%-48s %14.1f %14.1f %8.2f%s' % (stage, baseline[stage]['us_per_call'], result['us_per_call'], ratio, flag))
+        if ratio > threshold:
+            regressions.append(stage)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=RESULTS_FILE, help='file the results are written to')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline results to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown against the baseline reported as a regression')
+    parser.add_argument('--stage', action='append', help='only run the given stage, can be repeated')
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    results = {}
+    for stage, bench in STAGES.items():
+        if args.stage and stage not in args.stage:
+            continue
+        results[stage] = bench()
+        print('%-48s %14.1f us' % (stage, results[stage]['us_per_call']), file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
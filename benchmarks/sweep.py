@@ -0,0 +1,40 @@
+'''
+Scaling of sweep.run_sweep with the number of worker processes: the same grid
+of trials, without early stopping, on 1, 2, 4, ... workers up to the core count
+(at least 2), reporting trials per minute and the efficiency against 1 worker.
+
+Run from the repository root:
+    python -m benchmarks.sweep [backend] [episodes]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+from sweep import grid_trials, run_sweep
+from training_simulation import ENV_KWARGS
+
+SPACE = {'gamma': [0.9, 0.95], 'green_time': [10, 15], 'yellow_time': [4, 6]}
+TIME_STEPS = 900
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'fake'
+    episodes = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    trials = grid_trials(SPACE)
+    env_kwargs = dict(ENV_KWARGS, backend=backend, time_steps=TIME_STEPS)
+    worker_counts = [1]
+    while worker_counts[-1] < max(os.cpu_count(), 2):
+        worker_counts.append(worker_counts[-1] * 2)
+
+    rates = []
+    for workers in worker_counts:
+        sweep_dir = tempfile.mkdtemp(prefix='sweep_benchmark_')
+        start = time.perf_counter()
+        run_sweep(sweep_dir, trials, episodes, env_kwargs, workers, early_stopping=False)
+        rates.append(len(trials) / (time.perf_counter() - start) * 60)
+        shutil.rmtree(sweep_dir)
+
+    print('%i cores, %i trials of %i episodes' % (os.cpu_count(), len(trials), episodes))
+    print('%8s %14s %10s %12s' % ('workers', 'trials/min', 'speedup', 'efficiency'))
+    for workers, rate in zip(worker_counts, rates):
+        print('%8i %14.1f %10.2f %12.2f' % (workers, rate, rate / rates[0], rate / rates[0] / workers))
@@ -0,0 +1,78 @@
+'''
+CPU throughput of the DQNAgent training step: updates per second of replay
+with the TD update before this change (target network forward with autograd),
+eager, compiled with torch.compile, and with several gradient steps per replay
+call, and the time of a soft target network update with the per-tensor loop it
+replaced against the foreach update.
+
+Run from the repository root: python -m benchmarks.train_step [updates]
+'''
+import random
+import sys
+import time
+import numpy as np
+import torch
+from dqn import DQNAgent
+
+STATE_SIZE = 12
+BATCH_SIZES = (32, 256)
+
+def make_agent(compile_step=False):
+    random.seed(0)
+    torch.manual_seed(0)
+    agent = DQNAgent(state_size=STATE_SIZE, action_size=2, gamma=0.95, epsilon=0.1, learning_rate=0.0002, update_rate=0.001,
+        compile_step=compile_step)
+    rng = np.random.default_rng(0)
+    states = rng.random((10000, STATE_SIZE), dtype=np.float32)
+    agent.remember_batch(states, rng.integers(0, 2, 10000), rng.random(10000, dtype=np.float32), states, np.zeros(10000, dtype=np.float32))
+    return agent
+
+def previous_td_update(agent, states, actions, rewards, next_states, dones, weights=None):
+    # the update before the target network forward ran without autograd
+    current_q_values = agent.model(states).gather(1, actions)
+    next_q_values = agent.target_model(next_states).max(1)[0].unsqueeze(1)
+    target_q_values = rewards + (1 - dones) * agent.gamma * next_q_values
+    loss = agent.loss_fn(current_q_values, target_q_values.detach())
+    agent.optimizer.zero_grad()
+    loss.backward()
+    agent.optimizer.step()
+
+def previous_target_update(agent):
+    for target_param, param in zip(agent.target_model.parameters(), agent.model.parameters()):
+        target_param.data.copy_(agent.update_rate * param.data + (1 - agent.update_rate) * target_param.data)
+
+def updates_per_second(agent, batch_size, updates, gradient_steps=1):
+    # the first calls compile and warm up
+    for _ in range(3):
+        agent.replay(batch_size, gradient_steps)
+    start = time.perf_counter()
+    for _ in range(updates // gradient_steps):
+        agent.replay(batch_size, gradient_steps)
+    return updates // gradient_steps * gradient_steps / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print('%i threads' % torch.get_num_threads())
+    print('%-34s %s' % ('updates/sec', ' '.join('%10s' % ('batch %i' % b) for b in BATCH_SIZES)))
+    previous = make_agent()
+    previous.target_model.requires_grad_(True)
+    previous._td_step = lambda *batch: previous_td_update(previous, *batch)
+    eager = make_agent()
+    compiled = make_agent(compile_step=True)
+    runs = [
+        ('previous step', previous, 1),
+        ('eager', eager, 1),
+        ('eager, 8 steps per replay', eager, 8),
+        ('compiled', compiled, 1),
+        ('compiled, 8 steps per replay', compiled, 8),
+    ]
+    for name, agent, gradient_steps in runs:
+        rates = [updates_per_second(agent, b, updates, gradient_steps) for b in BATCH_SIZES]
+        print('%-34s %s' % (name, ' '.join('%10.0f' % rate for rate in rates)))
+
+    agent = make_agent()
+    for name, update in (('previous loop', previous_target_update), ('foreach', lambda agent: agent.update_target_model())):
+        start = time.perf_counter()
+        for _ in range(updates):
+            update(agent)
+        print('target update, %-19s %8.1f us' % (name, (time.perf_counter() - start) / updates * 1e6))
@@ -0,0 +1,30 @@
+'''
+Environment steps per second of make_vector_env with 1 to 16 worker processes,
+using random actions.
+
+Run from the repository root: python -m benchmarks.vector_env [num_workers ...]
+'''
+import sys
+import time
+import numpy as np
+from vector_env import make_vector_env
+from training_simulation import ENV_KWARGS
+
+NUM_WORKERS = [1, 2, 4, 8, 16]
+VECTOR_STEPS = 200
+
+if __name__ == '__main__':
+    num_workers = [int(n) for n in sys.argv[1:]] or NUM_WORKERS
+    rng = np.random.default_rng(0)
+    print('%8s %14s %10s' % ('workers', 'env steps/s', 'speedup'))
+    base = None
+    for n in num_workers:
+        envs = make_vector_env(n, **ENV_KWARGS)
+        envs.reset(seed=0)
+        start = time.perf_counter()
+        for _ in range(VECTOR_STEPS):
+            envs.step(rng.integers(2, size=n))
+        rate = n * VECTOR_STEPS / (time.perf_counter() - start)
+        envs.close()
+        base = base or rate
+        print('%8i %14.1f %10.2f' % (n, rate, rate / base))
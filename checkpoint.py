@@ -0,0 +1,124 @@
+import os
+import shutil
+import threading
+import torch
+from replay_memory import ReplayMemory
+
+class Checkpointer:
+    def __init__(self, directory, keep=2):
+        '''
+        Periodic checkpoints of a DQNAgent in directory, one subdirectory per
+        episode. The agent is snapshotted in the calling thread and the files are
+        written by a background thread into a temporary directory that is renamed
+        into place when complete, so a checkpoint is either whole or missing.
+        Only the keep newest checkpoints are kept.
+        '''
+        self.directory = directory
+        self.keep = keep
+        self._writer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, agent, episode, extra=None):
+        '''
+        Checkpoint the agent after the episode. extra is a dict of picklable values
+        stored with it, e.g. the state of the training loop.
+        '''
+        snapshot = agent.snapshot()
+        # at most one checkpoint is written at a time, which bounds the memory held by snapshots
+        self.wait()
+        self._writer = threading.Thread(target=self._write, args=(snapshot, episode, extra or {}), daemon=True)
+        self._writer.start()
+
+    def wait(self):
+        '''
+        Wait until the checkpoint being written is on disk.
+        '''
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    def _write(self, snapshot, episode, extra):
+        name = 'episode_%06i' % episode
+        tmp_dir = os.path.join(self.directory, '.' + name + '.tmp')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        memory = snapshot.pop('memory')
+        ReplayMemory.save(tmp_dir, memory)
+        torch.save(dict(snapshot, episode=episode, extra=extra), os.path.join(tmp_dir, 'agent.pt'))
+        _sync_directory(tmp_dir)
+
+        final_dir = os.path.join(self.directory, name)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.rename(tmp_dir, final_dir)
+        _sync_directory(self.directory)
+
+        for old in self.checkpoints()[:-self.keep]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def checkpoints(self):
+        '''
+        The complete checkpoints, oldest first.
+        '''
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith('episode_'))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def load(self, agent, path=None):
+        '''
+        Restore the agent from a checkpoint, the latest one by default. Returns the
+        episode it was taken after and its extra dict, or None if there is none.
+        '''
+        path = path or self.latest()
+        if path is None:
+            return None
+        snapshot = torch.load(os.path.join(path, 'agent.pt'), weights_only=False)
+        agent.restore(snapshot, type(agent.memory).load(path))
+        return snapshot['episode'], snapshot['extra']
+
+def load_checkpoint_agent(checkpoint_dir):
+    '''
+    The agent of the latest checkpoint in checkpoint_dir, built with the network
+    the checkpoint holds: a SharedDQNAgent where it has an intersection embedding,
+    a DQNAgent otherwise. None if there is no checkpoint.
+    '''
+    from dqn import DQNAgent, SharedDQNAgent
+
+    checkpointer = Checkpointer(checkpoint_dir)
+    path = checkpointer.latest()
+    if path is None:
+        return None
+    weights = torch.load(os.path.join(path, 'agent.pt'), weights_only=False)['model']
+    if 'fc1.weight' not in weights or 'fc3.weight' not in weights:
+        raise ValueError('%s holds no DQN checkpoint' % path)
+    # the observation size follows the lane features the agent was trained with
+    kwargs = dict(action_size=weights['fc3.weight'].shape[0], gamma=0.95, epsilon=0.0, learning_rate=0.0002, update_rate=0.001)
+    if 'embedding.weight' in weights:
+        num_intersections, embedding_size = weights['embedding.weight'].shape
+        agent = SharedDQNAgent(state_size=weights['fc1.weight'].shape[1] - embedding_size, num_intersections=num_intersections,
+            embedding_size=embedding_size, **kwargs)
+    else:
+        agent = DQNAgent(state_size=weights['fc1.weight'].shape[1], **kwargs)
+    checkpointer.load(agent, path)
+    return agent
+
+def _sync_directory(directory):
+    '''
+    fsync the files of a directory and the directory itself, so a rename that follows is durable.
+    '''
+    for name in os.listdir(directory):
+        file_name = os.path.join(directory, name)
+        if os.path.isfile(file_name):
+            fd = os.open(file_name, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -3,7 +3,11 @@ import torch.nn as nn
 import torch.optim as optim
 import numpy as np
 import random
-from collections import deque
+import copy
+import threading
+from replay_memory import ReplayMemory
+from prioritized_replay import PrioritizedReplayMemory
+from profiling import NULL_PROFILER
 
 class DQN(nn.Module):
     def __init__(self, state_size, action_size):
@@ -17,9 +21,30 @@ class DQN(nn.Module):
         x = torch.relu(self.fc2(x))
         x = self.fc3(x)
         return x
-    
+
+class SharedDQN(nn.Module):
+    def __init__(self, state_size, action_size, num_intersections, embedding_size=8):
+        '''
+        The DQN shared by several intersections. The last input column is the index
+        of the intersection a row belongs to; its learned embedding is appended to
+        the state, so one network can still act differently per intersection.
+        '''
+        super(SharedDQN, self).__init__()
+        self.embedding = nn.Embedding(num_intersections, embedding_size)
+        self.fc1 = nn.Linear(state_size + embedding_size, 64)
+        self.fc2 = nn.Linear(64, 128)
+        self.fc3 = nn.Linear(128, action_size)
+
+    def forward(self, x):
+        x = torch.cat([x[:, :-1], self.embedding(x[:, -1].long())], dim=1)
+        x = torch.relu(self.fc1(x))
+        x = torch.relu(self.fc2(x))
+        x = self.fc3(x)
+        return x
+
 class DQNAgent:
-    def __init__(self, state_size, action_size, gamma, epsilon, learning_rate, update_rate):
+    def __init__(self, state_size, action_size, gamma, epsilon, learning_rate, update_rate, memory_size=10000, profiler=None,
+            prioritized=False, alpha=0.6, beta=0.4, compile_step=False):
         self.state_size = state_size
         self.action_size = action_size
         self.gamma = gamma
@@ -28,47 +53,281 @@ class DQNAgent:
         self.update_rate = update_rate
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        self.model = DQN(state_size, action_size).to(self.device)
-        self.target_model = DQN(state_size, action_size).to(self.device)
+        self.model = self._build_model().to(self.device)
+        self.target_model = self._build_model().to(self.device)
         self.target_model.load_state_dict(self.model.state_dict())
         self.target_model.eval()
+        # the target network only changes through update_target_model, which needs no gradients
+        self.target_model.requires_grad_(False)
+        self._params = list(self.model.parameters())
+        self._target_params = list(self.target_model.parameters())
+        self._polyak_buffer = [torch.empty_like(param) for param in self._params]
 
         self.optimizer = optim.RMSprop(self.model.parameters(), lr=update_rate)
-        self.memory = deque(maxlen=10000)
+        # seeded from the random module, which sampled the batches before, so random.seed still makes training reproducible
+        # with prioritized, batches are drawn by TD error and the loss is weighted to correct for it
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayMemory(memory_size, state_size, alpha, beta, seed=random.getrandbits(64))
+        else:
+            self.memory = ReplayMemory(memory_size, state_size, seed=random.getrandbits(64))
         self.loss_fn = nn.MSELoss()
+        # with compile_step the whole TD update, the loss, its backward pass and the
+        # optimizer step, runs as code generated by torch.compile; it is compiled on
+        # the first update of every batch shape
+        self._td_step = torch.compile(self._td_update) if compile_step else self._td_update
+
+        # the network act() uses; it is a separate copy only while the learner thread runs
+        self.policy_model = self.model
+        self._policy_lock = threading.Lock()
+        # guards the replay memory and the transition count the learner waits on
+        self._memory_condition = threading.Condition()
+        self._learner = None
+        # held while the networks and the optimizer change, so a checkpoint sees them between updates
+        self._model_lock = threading.Lock()
+        self.transitions = 0
+        self.gradient_steps = 0
+        # a profiling.Profiler timing act, replay and the target network updates
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+
+    def _build_model(self):
+        return DQN(self.state_size, self.action_size)
 
     def act(self, state):
+        with self.profiler.stage('act'):
+            return self._act(state)
+
+    def _act(self, state):
         if np.random.rand() <= self.epsilon:
             return random.randrange(self.action_size)
         state = torch.tensor(state, dtype=torch.float32).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            q_values = self.model(state)
+        with torch.no_grad(), self._policy_lock:
+            q_values = self.policy_model(state)
         return np.argmax(q_values.cpu().detach().numpy())
 
+    def act_batch(self, states):
+        '''
+        Choose the actions for a batch of states with one forward pass.
+        '''
+        states = torch.from_numpy(np.asarray(states, dtype=np.float32)).to(self.device)
+        with self.profiler.stage('act'), torch.no_grad(), self._policy_lock:
+            actions = self.policy_model(states).argmax(dim=1).cpu().numpy()
+        explore = np.random.rand(len(actions)) <= self.epsilon
+        actions[explore] = np.random.randint(self.action_size, size=explore.sum())
+        return actions
+
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append([state, action, reward, next_state, done])
+        with self._memory_condition:
+            self.memory.push(state, action, reward, next_state, done)
+            self.transitions += 1
+            self._memory_condition.notify()
+
+    def remember_batch(self, states, actions, rewards, next_states, dones):
+        with self._memory_condition:
+            self.memory.push_batch(states, actions, rewards, next_states, dones)
+            self.transitions += len(actions)
+            self._memory_condition.notify()
 
-    def replay(self, batch_size):
-        if len(self.memory) < batch_size:
+    def replay(self, batch_size, gradient_steps=1):
+        with self.profiler.stage('replay'):
+            self._replay(batch_size, gradient_steps)
+
+    def _replay(self, batch_size, gradient_steps=1):
+        if self.prioritized:
+            # the priorities of one batch change what the next one samples
+            for _ in range(gradient_steps):
+                with self._memory_condition:
+                    if len(self.memory) < batch_size:
+                        return
+                    batch = self.memory.sample(batch_size)
+                td_errors = self.train_batch(*batch[:5], weights=batch[5])
+                with self._memory_condition:
+                    self.memory.update_priorities(batch[6], td_errors)
             return
-        batch = random.sample(self.memory, batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
 
-        states = torch.tensor(states, dtype=torch.float32).to(self.device)
-        actions = torch.tensor(actions, dtype=torch.int64).unsqueeze(-1).to(self.device)
-        rewards = torch.tensor(rewards, dtype=torch.float32).unsqueeze(-1).to(self.device)
-        next_states = torch.tensor(next_states, dtype=torch.float32).to(self.device)
-        dones = torch.tensor(dones, dtype=torch.float32).unsqueeze(-1).to(self.device)
+        with self._memory_condition:
+            if len(self.memory) < batch_size:
+                return
+            batches = [self.memory.sample(batch_size) for _ in range(gradient_steps)]
+        if gradient_steps == 1:
+            self.train_batch(*batches[0])
+        else:
+            # all batches go to the device at once, the same as gradient_steps replay calls
+            batches = self._to_tensors(*(np.stack(arrays) for arrays in zip(*batches)))
+            for i in range(gradient_steps):
+                self._gradient_step(*(tensor[i] for tensor in batches))
+
+    def train_batch(self, states, actions, rewards, next_states, dones, weights=None):
+        '''
+        One gradient step on a batch of transitions given as arrays, e.g. sampled
+        from the replay memory or read from recorded transitions. With importance
+        sampling weights the loss is weighted and the TD errors are returned.
+        '''
+        td_errors = self._gradient_step(*self._to_tensors(states, actions, rewards, next_states, dones, weights))
+        if weights is not None:
+            return td_errors.squeeze(-1).cpu().numpy()
+
+    def _to_tensors(self, states, actions, rewards, next_states, dones, weights=None):
+        tensors = [torch.from_numpy(states), torch.from_numpy(actions).unsqueeze(-1), torch.from_numpy(rewards).unsqueeze(-1),
+            torch.from_numpy(next_states), torch.from_numpy(dones).unsqueeze(-1)]
+        if weights is not None:
+            tensors.append(torch.from_numpy(weights).unsqueeze(-1))
+        return [tensor.to(self.device) for tensor in tensors]
+
+    def _gradient_step(self, states, actions, rewards, next_states, dones, weights=None):
+        with self._model_lock:
+            td_errors = self._td_step(states, actions, rewards, next_states, dones, weights)
+            self.gradient_steps += 1
+        self.profiler.count('gradient_steps')
+        return td_errors
 
+    def _td_update(self, states, actions, rewards, next_states, dones, weights=None):
         current_q_values = self.model(states).gather(1, actions)
-        next_q_values = self.target_model(next_states).max(1)[0].unsqueeze(1)
-        target_q_values = rewards + (1 - dones) * self.gamma * next_q_values
+        with torch.no_grad():
+            next_q_values = self.target_model(next_states).max(1)[0].unsqueeze(1)
+            target_q_values = rewards + (1 - dones) * self.gamma * next_q_values
 
-        loss = self.loss_fn(current_q_values, target_q_values.detach())
+        td_errors = None
+        if weights is not None:
+            td_errors = target_q_values - current_q_values
+            loss = (weights * td_errors.pow(2)).mean()
+            td_errors = td_errors.detach()
+        else:
+            loss = self.loss_fn(current_q_values, target_q_values)
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        return td_errors
 
     def update_target_model(self):
-        for target_param, param in zip(self.target_model.parameters(), self.model.parameters()):
-            target_param.data.copy_(self.update_rate * param.data + (1 - self.update_rate) * target_param.data)
\ No newline at end of file
+        with self.profiler.stage('update_target_model'):
+            self._update_target_model()
+
+    def _update_target_model(self):
+        # in place and for all parameters at once; update_rate * param goes to a
+        # preallocated buffer, as add_ with alpha would round differently from the formula
+        with self._model_lock, torch.no_grad():
+            torch._foreach_copy_(self._polyak_buffer, self._params)
+            torch._foreach_mul_(self._polyak_buffer, self.update_rate)
+            torch._foreach_mul_(self._target_params, 1 - self.update_rate)
+            torch._foreach_add_(self._target_params, self._polyak_buffer)
+
+    def snapshot(self):
+        '''
+        A copy of everything training depends on: the networks, the optimizer
+        state, epsilon, the counters, the random number generators and the replay
+        memory. It is taken between two updates and can be written by
+        checkpoint.Checkpointer while training goes on.
+        '''
+        with self._memory_condition, self._model_lock:
+            return {
+                'model': copy.deepcopy(self.model.state_dict()),
+                'target_model': copy.deepcopy(self.target_model.state_dict()),
+                'optimizer': copy.deepcopy(self.optimizer.state_dict()),
+                'epsilon': self.epsilon,
+                'transitions': self.transitions,
+                'gradient_steps': self.gradient_steps,
+                'random_state': random.getstate(),
+                'numpy_random_state': np.random.get_state(),
+                'torch_random_state': torch.get_rng_state(),
+                'memory': self.memory.snapshot(),
+            }
+
+    def restore(self, snapshot, memory):
+        '''
+        Continue from a snapshot, with the replay memory loaded separately.
+        '''
+        with self._memory_condition, self._model_lock:
+            self.model.load_state_dict(snapshot['model'])
+            self.target_model.load_state_dict(snapshot['target_model'])
+            self.optimizer.load_state_dict(snapshot['optimizer'])
+            self.epsilon = snapshot['epsilon']
+            self.transitions = snapshot['transitions']
+            self.gradient_steps = snapshot['gradient_steps']
+            random.setstate(snapshot['random_state'])
+            np.random.set_state(snapshot['numpy_random_state'])
+            torch.set_rng_state(snapshot['torch_random_state'])
+            self.memory = memory
+        if self.policy_model is not self.model:
+            with self._policy_lock:
+                self.policy_model.load_state_dict(self.model.state_dict())
+
+    def start_learner(self, batch_size, update_to_data_ratio=1.0, publish_interval=10, target_update_interval=100):
+        '''
+        Train in a background thread instead of calling replay after every step.
+        The learner keeps at most update_to_data_ratio gradient steps per stored
+        transition, copies its weights to the network act() uses every
+        publish_interval gradient steps and updates the target network every
+        target_update_interval gradient steps.
+        '''
+        if self._learner is not None:
+            raise RuntimeError('the learner thread is already running')
+        self.policy_model = copy.deepcopy(self.model)
+        self.policy_model.eval()
+        self._stop_learner = False
+        self._learner = threading.Thread(
+            target=self._learn,
+            args=(batch_size, update_to_data_ratio, publish_interval, target_update_interval),
+            daemon=True)
+        self._learner.start()
+
+    def stop_learner(self):
+        '''
+        Stop the learner thread and act with the trained network again.
+        '''
+        if self._learner is None:
+            return
+        with self._memory_condition:
+            self._stop_learner = True
+            self._memory_condition.notify()
+        self._learner.join()
+        self._learner = None
+        with self._policy_lock:
+            self.policy_model = self.model
+
+    def _learn(self, batch_size, update_to_data_ratio, publish_interval, target_update_interval):
+        steps = 0
+        while True:
+            with self._memory_condition:
+                # wait for enough data, both to sample a batch and to stay within the update-to-data ratio
+                while not self._stop_learner and (len(self.memory) < batch_size or steps >= update_to_data_ratio * self.transitions):
+                    self._memory_condition.wait()
+                if self._stop_learner:
+                    return
+            self.replay(batch_size)
+            steps += 1
+            if steps % publish_interval == 0:
+                with self._policy_lock:
+                    self.policy_model.load_state_dict(self.model.state_dict())
+            if steps % target_update_interval == 0:
+                self.update_target_model()
+
+class SharedDQNAgent(DQNAgent):
+    def __init__(self, state_size, action_size, num_intersections, gamma, epsilon, learning_rate, update_rate, memory_size=10000, embedding_size=8, profiler=None,
+            prioritized=False, alpha=0.6, beta=0.4, compile_step=False):
+        '''
+        One SharedDQN controlling num_intersections intersections. act and remember
+        take the stacked observations of a multi-intersection TrafficEnv: the
+        actions of all intersections come from one batched forward pass, and every
+        intersection's transition is stored in the same replay memory with the
+        intersection index as the last state column.
+        '''
+        self.num_intersections = num_intersections
+        self.embedding_size = embedding_size
+        super().__init__(state_size + 1, action_size, gamma, epsilon, learning_rate, update_rate, memory_size, profiler, prioritized, alpha, beta,
+            compile_step)
+        self._indexed_states = np.zeros((num_intersections, state_size + 1), dtype=np.float32)
+        self._indexed_states[:, -1] = np.arange(num_intersections)
+        self._indexed_next_states = self._indexed_states.copy()
+
+    def _build_model(self):
+        return SharedDQN(self.state_size - 1, self.action_size, self.num_intersections, self.embedding_size)
+
+    def act(self, states):
+        self._indexed_states[:, :-1] = states
+        return self.act_batch(self._indexed_states)
+
+    def remember(self, states, actions, rewards, next_states, done):
+        self._indexed_states[:, :-1] = states
+        self._indexed_next_states[:, :-1] = next_states
+        self.remember_batch(self._indexed_states, actions, rewards, self._indexed_next_states, np.full(self.num_intersections, done))
@@ -0,0 +1,142 @@
+import random
+import numpy as np
+import torch
+from dqn import DQN
+from replay_memory import ReplayMemory
+
+LAYERS = ('fc1', 'fc2', 'fc3')
+# RMSprop defaults of torch.optim.RMSprop, which DQNAgent trains with
+RMSPROP_ALPHA = 0.99
+RMSPROP_EPS = 1e-8
+
+class DQNEnsembleAgent:
+    def __init__(self, state_size, action_size, num_members, gamma, epsilons, learning_rates, update_rate, memory_size=10000):
+        '''
+        num_members independent DQN agents trained together. The weights of every
+        layer are stacked along a leading member axis, so acting is one batched
+        forward pass and replay is one batched forward and backward pass for all
+        members, through batched matrix products. Each member has its own replay
+        memory, epsilon and learning rate; the loss is the sum of the members'
+        losses, so their gradients stay independent.
+
+        epsilons and learning_rates are one value per member or one value for
+        all. The learning rate is the RMSprop step size, which DQNAgent takes
+        from update_rate; update_rate here is only the target network rate.
+        '''
+        self.state_size = state_size
+        self.action_size = action_size
+        self.num_members = num_members
+        self.gamma = gamma
+        self.epsilons = np.broadcast_to(np.asarray(epsilons, dtype=np.float64), num_members).copy()
+        self.learning_rates = np.broadcast_to(np.asarray(learning_rates, dtype=np.float32), num_members).copy()
+        self.update_rate = update_rate
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        # initialised like num_members separate DQNs; weights are stored as (member, in, out) for torch.baddbmm
+        members = [DQN(state_size, action_size) for _ in range(num_members)]
+        self.params = []
+        for layer in LAYERS:
+            self.params.append(torch.stack([getattr(m, layer).weight.detach().t() for m in members]).contiguous())
+            self.params.append(torch.stack([getattr(m, layer).bias.detach().unsqueeze(0) for m in members]))
+        self.params = [p.to(self.device).requires_grad_() for p in self.params]
+        self.target_params = [p.detach().clone() for p in self.params]
+        self.square_avgs = [torch.zeros_like(p) for p in self.params]
+        self._step_sizes = torch.from_numpy(self.learning_rates).view(-1, 1, 1).to(self.device)
+
+        # seeded from the random module like the memory of DQNAgent
+        self.memories = [ReplayMemory(memory_size, state_size, seed=random.getrandbits(64)) for _ in range(num_members)]
+        self.transitions = 0
+        self.gradient_steps = 0
+        self._batch_size = None
+
+    def _forward(self, params, x):
+        w1, b1, w2, b2, w3, b3 = params
+        x = torch.relu(torch.baddbmm(b1, x, w1))
+        x = torch.relu(torch.baddbmm(b2, x, w2))
+        return torch.baddbmm(b3, x, w3)
+
+    def act(self, states):
+        '''
+        One action per member for a (num_members, state_size) array of states,
+        each from the member's own environment.
+        '''
+        states = torch.from_numpy(np.asarray(states, dtype=np.float32)).unsqueeze(1).to(self.device)
+        with torch.no_grad():
+            actions = self._forward(self.params, states).squeeze(1).argmax(dim=1).cpu().numpy()
+        explore = np.random.rand(self.num_members) <= self.epsilons
+        actions[explore] = np.random.randint(self.action_size, size=explore.sum())
+        return actions
+
+    def remember(self, states, actions, rewards, next_states, dones, members=None):
+        '''
+        Store one transition per member, or only for the members given by index.
+        '''
+        for i in (range(self.num_members) if members is None else members):
+            self.memories[i].push(states[i], actions[i], rewards[i], next_states[i], dones[i])
+            self.transitions += 1
+
+    def _allocate_batch(self, batch_size):
+        # the sampled batches of all members are copied into these arrays, which the tensors below share
+        k = self.num_members
+        self._states = np.zeros((k, batch_size, self.state_size), dtype=np.float32)
+        self._actions = np.zeros((k, batch_size, 1), dtype=np.int64)
+        self._rewards = np.zeros((k, batch_size, 1), dtype=np.float32)
+        self._next_states = np.zeros((k, batch_size, self.state_size), dtype=np.float32)
+        self._dones = np.zeros((k, batch_size, 1), dtype=np.float32)
+        self._batch_tensors = [torch.from_numpy(a) for a in (self._states, self._actions, self._rewards, self._next_states, self._dones)]
+        self._batch_size = batch_size
+
+    def replay(self, batch_size):
+        '''
+        One gradient step for every member, on a batch from its own memory.
+        '''
+        if any(len(memory) < batch_size for memory in self.memories):
+            return
+        if self._batch_size != batch_size:
+            self._allocate_batch(batch_size)
+        for i, memory in enumerate(self.memories):
+            states, actions, rewards, next_states, dones = memory.sample(batch_size)
+            self._states[i] = states
+            self._actions[i, :, 0] = actions
+            self._rewards[i, :, 0] = rewards
+            self._next_states[i] = next_states
+            self._dones[i, :, 0] = dones
+        states, actions, rewards, next_states, dones = (t.to(self.device) for t in self._batch_tensors)
+
+        current_q_values = self._forward(self.params, states).gather(2, actions)
+        with torch.no_grad():
+            next_q_values = self._forward(self.target_params, next_states).max(2)[0].unsqueeze(2)
+            target_q_values = rewards + (1 - dones) * self.gamma * next_q_values
+        loss = (current_q_values - target_q_values).pow(2).mean(dim=(1, 2)).sum()
+        grads = torch.autograd.grad(loss, self.params)
+
+        with torch.no_grad():
+            for param, grad, square_avg in zip(self.params, grads, self.square_avgs):
+                square_avg.mul_(RMSPROP_ALPHA).addcmul_(grad, grad, value=1 - RMSPROP_ALPHA)
+                param.sub_(self._step_sizes * grad / square_avg.sqrt().add_(RMSPROP_EPS))
+        self.gradient_steps += 1
+
+    def update_target_model(self, members=None):
+        '''
+        Move the target networks towards the trained ones, of all members or only
+        of the members given by index.
+        '''
+        if members is not None:
+            members = torch.as_tensor(members, dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            for target_param, param in zip(self.target_params, self.params):
+                if members is None:
+                    target_param.copy_(self.update_rate * param + (1 - self.update_rate) * target_param)
+                else:
+                    target_param[members] = self.update_rate * param[members] + (1 - self.update_rate) * target_param[members]
+
+    def member_model(self, i):
+        '''
+        A DQN with the weights of member i, e.g. to evaluate it or export it with policy_export.
+        '''
+        model = DQN(self.state_size, self.action_size)
+        with torch.no_grad():
+            for j, layer in enumerate(LAYERS):
+                getattr(model, layer).weight.copy_(self.params[2 * j][i].t())
+                getattr(model, layer).bias.copy_(self.params[2 * j + 1][i, 0])
+        return model
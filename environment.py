@@ -1,20 +1,46 @@
 import os
-import sys
+import math
+import shutil
+import tempfile
+import weakref
+import itertools
 
-if 'SUMO_HOME' in os.environ:
-        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-        sys.path.append(tools)
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-
-from sumolib import checkBinary
-import traci
+from backends import make_backend
+import traci.constants as tc
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 from generator import TrafficGenerator
+from network import net_file, read_edges, read_lanes, read_departures, read_lane_table
+from route_cache import RouteCache
+from staying_times import StayingTimeTracker, StayingTimeStats
+from highway_speeds import HighwaySpeedDetectors, HighwaySpeedStats, write_detector_file
+from signal_programs import SIGNAL_PROGRAMS, write_actuated_programs
+from profiling import NULL_PROFILER, CountingConnection
+
+# the per-lane values an observation can be made of, with their subscription
+# variable and lane query: vehicles, vehicles slower than 0.1 m/s and the share
+# of the lane length occupied by vehicles (0 to 1), all in the last step
+LANE_FEATURES = {
+    'count': (tc.LAST_STEP_VEHICLE_NUMBER, 'getLastStepVehicleNumber'),
+    'halting': (tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 'getLastStepHaltingNumber'),
+    'occupancy': (tc.LAST_STEP_OCCUPANCY, 'getLastStepOccupancy'),
+}
+
+# numbers the TraCI connection labels of the environments in this process
+_labels = itertools.count()
+
 
 class TrafficEnv(gym.Env):
+    # the keys of episode_metrics(), the queue ones only with queue_stats
+    EPISODE_METRICS = (
+        'average_staying_time_per_vehicle', 'staying_time_count', 'staying_time_variance',
+        'staying_time_p50', 'staying_time_p90', 'staying_time_p99',
+        'average_highway_speed', 'interval_mean_speed_p10', 'interval_mean_speed_p50', 'highway_vehicles', 'highway_flow',
+        'queue_mean', 'queue_p90', 'queue_max',
+        'sim_seconds', 'skipped_seconds',
+    )
+
     def __init__(
         self,
         sumocfg_file_name,
@@ -29,12 +55,24 @@ class TrafficEnv(gym.Env):
         s_highway_id, 
         green_time,
         yellow_time,
-        use_gui = False):
-
-        if use_gui:
-            self._sumo_binary = checkBinary("sumo-gui")
-        else:
-            self._sumo_binary = checkBinary("sumo")
+        use_gui = False,
+        use_subscriptions = False,
+        route_file = None,
+        route_cache_dir = None,
+        route_cache_bytes = 256 * 1024 * 1024,
+        label = None,
+        port = None,
+        backend = 'traci',
+        reset_mode = 'restart',
+        warm_start_steps = 0,
+        state_cache_dir = None,
+        profiler = None,
+        intersections = None,
+        fast_forward = False,
+        demand_scale = 1.0,
+        lane_features = ('count',),
+        signal_program = None,
+        queue_stats = False):
 
         self.sumocfg_file_name = sumocfg_file_name
         self.log_file_name = log_file_name
@@ -48,117 +86,263 @@ class TrafficEnv(gym.Env):
         self.s_highway_id = s_highway_id
         self.green_time = green_time
         self.yellow_time = yellow_time
+        self.use_subscriptions = use_subscriptions
+
+        # with intersections, a list of dicts with the tls_id and the n_id, e_id,
+        # s_id and w_id approach edges of every controlled intersection, the
+        # environment controls all of them: actions, observations and rewards
+        # get one row per intersection and tls_id and n_id to w_id are not used
+        self.multi_intersection = intersections is not None
+        if intersections is None:
+            intersections = [dict(tls_id=tls_id, n_id=n_id, e_id=e_id, s_id=s_id, w_id=w_id)]
+        self.intersections = [dict(i, roads=[i['n_id'], i['e_id'], i['s_id'], i['w_id']]) for i in intersections]
+        self.roads = [road for i in self.intersections for road in i['roads']]
+
+        # the lanes of the approach roads, read once from the network: the
+        # observation of an intersection has one value per lane and per feature
+        # in lane_features, so its size follows the geometry of the intersection
+        self._net_file = net_file(os.path.join('config', sumocfg_file_name))
+        self.lane_table = read_lane_table(self._net_file)
+        for intersection in self.intersections:
+            approaches = self.lane_table.get(intersection['tls_id'], {})
+            missing = [road for road in intersection['roads'] if road not in approaches]
+            if missing:
+                raise ValueError('%s are not approaches of traffic light %s' % (', '.join(missing), intersection['tls_id']))
+            intersection['lanes'] = [lane_id for road in intersection['roads'] for lane_id, _ in approaches[road]]
+        for feature in lane_features:
+            if feature not in LANE_FEATURES:
+                raise ValueError("unknown lane feature '%s', expected one of %s" % (feature, ', '.join(LANE_FEATURES)))
+        self.lane_features = [LANE_FEATURES[feature] for feature in lane_features]
+        # intersections with fewer lanes leave the end of their observation zero
+        self.observation_size = max(len(i['lanes']) for i in self.intersections) * len(lane_features)
+
+        # highway speeds are measured by induction loops SUMO loads from a generated
+        # additional file, and read once per decision
+        highway_lanes = [lane for highway in (n_highway_id, s_highway_id) for lane in read_lanes(self._net_file)[highway]]
+        detector_dir = tempfile.mkdtemp(prefix='detectors_')
+        weakref.finalize(self, shutil.rmtree, detector_dir, ignore_errors=True)
+        self._detector_file = os.path.join(detector_dir, 'detectors.add.xml')
+        write_detector_file(self._detector_file, highway_lanes)
+        self.highway_detectors = HighwaySpeedDetectors([lane_id for lane_id, _ in highway_lanes], use_subscriptions)
+        self._additional_files = [self._detector_file]
+
+        # with signal_program, the traffic lights run a program of SUMO instead of
+        # following the actions: 'static' is the fixed-time program of the network
+        # and 'actuated' an actuated program made from it; a step then lets
+        # green_time seconds pass whatever the action
+        if signal_program is not None and signal_program not in SIGNAL_PROGRAMS:
+            raise ValueError("signal_program must be one of %s" % ', '.join(SIGNAL_PROGRAMS))
+        if signal_program is not None and fast_forward:
+            raise ValueError('fast_forward holds the phases and cannot be combined with a signal_program')
+        self.signal_program = signal_program
+        if signal_program == 'actuated':
+            program_file = os.path.join(detector_dir, 'actuated.add.xml')
+            write_actuated_programs(program_file, self._net_file, [i['tls_id'] for i in self.intersections])
+            self._additional_files.append(program_file)
+
+        # with queue_stats, the halting vehicles on the approach lanes are counted
+        # every second, which costs one query per lane and second
+        self.queue_stats = queue_stats
 
         self.average_staying_time_per_vehicle = {}
         self.episode = 0
         self.sumo_step = 0
-        self.traffic_generator = TrafficGenerator(time_steps)
+        self.traffic_generator = TrafficGenerator(time_steps, demand_scale=demand_scale)
+
+        # every instance writes its own route file so that several environments
+        # can run from the same checkout
+        if route_file is None:
+            route_dir = tempfile.mkdtemp(prefix='routes_')
+            weakref.finalize(self, shutil.rmtree, route_dir, ignore_errors=True)
+            route_file = os.path.join(route_dir, 'routes.rou.xml')
+        self.route_file = route_file
+        self.route_cache = None if route_cache_dir is None else RouteCache(route_cache_dir, route_cache_bytes)
+
+        # with the traci backend each instance talks to its own SUMO process over
+        # its own labeled connection; with port None a free port is picked on every start
+        self.label = label if label is not None else 'TrafficEnv_%i_%i' % (os.getpid(), next(_labels))
+        self.port = port
+        self.backend = make_backend(backend, self.label, port, use_gui)
+        self._traci = None
+
+        # 'restart' starts a new SUMO process on every reset, 'load' reloads the
+        # running one with the new routes
+        if reset_mode not in ('restart', 'load'):
+            raise ValueError("reset_mode must be 'restart' or 'load'")
+        self.reset_mode = reset_mode
+        # with warm_start_steps > 0 and a seed, episodes start from a saved state of
+        # the simulation after that many seconds of the default signal program
+        self.warm_start_steps = warm_start_steps
+        self.state_cache_dir = state_cache_dir
+        if warm_start_steps > 0 and state_cache_dir is None:
+            raise ValueError('warm_start_steps needs a state_cache_dir')
+        if state_cache_dir is not None:
+            os.makedirs(state_cache_dir, exist_ok=True)
+
+        # with fast_forward, SUMO jumps ahead in bulk while no vehicle is on the
+        # approaches, up to the first second a vehicle could reach an approach, and
+        # no decision is asked for in between; the highway detectors keep counting
+        self.fast_forward = fast_forward
+        if fast_forward:
+            self._edges = read_edges(self._net_file)
+            self._watched = set(self.roads)
 
-        self.action_space = spaces.Discrete(2)
-        self.observation_space = spaces.Box(low=np.zeros(12), high=(np.ones(12) * np.inf), dtype=np.float32)
+        # a profiling.Profiler timing the stages of step and reset and counting the TraCI calls
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+
+        if self.multi_intersection:
+            k = len(self.intersections)
+            self.action_space = spaces.MultiDiscrete([2] * k)
+            self.observation_space = spaces.Box(low=np.zeros((k, self.observation_size)), high=(np.ones((k, self.observation_size)) * np.inf), dtype=np.float32)
+        else:
+            self.action_space = spaces.Discrete(2)
+            self.observation_space = spaces.Box(low=np.zeros(self.observation_size), high=(np.ones(self.observation_size) * np.inf), dtype=np.float32)
 
     def step(self, action):
+        with self.profiler.stage('step'):
+            return self._step(action)
+
+    def _step(self, action):
         #reward1 = self.compute_reward()
-        if action is None or self.prev_action is None or self.prev_action == action:
-            # chosen action is the same so keep traffic signal light unchanged
-            phase = traci.trafficlight.getPhase(self.tls_id)
-
-            for i in range(self.green_time):
-                traci.trafficlight.setPhase(self.tls_id, phase)
-                self.sumo_step += 1
-                traci.simulationStep()
-                self.update_highway_speeds(self.highway_speeds, self.n_highway_id)
-                self.update_highway_speeds(self.highway_speeds, self.s_highway_id)
-                self.update_staying_times()
-        else:
-            # chosen action is not the same
-            # transition phase
-            phase = traci.trafficlight.getPhase(self.tls_id)
-
-            for i in range(self.yellow_time): # turn on yellow light for either NS traffic or WE traffic
-                traci.trafficlight.setPhase(self.tls_id, phase + 1)
-                self.sumo_step += 1
-                traci.simulationStep()
-                self.update_highway_speeds(self.highway_speeds, self.n_highway_id)
-                self.update_highway_speeds(self.highway_speeds, self.s_highway_id)
-                self.update_staying_times()
-            for i in range(self.green_time): # turn on green light for left turn
-                traci.trafficlight.setPhase(self.tls_id, phase + 2)
-                self.sumo_step += 1
-                traci.simulationStep()
-                self.update_highway_speeds(self.highway_speeds, self.n_highway_id)
-                self.update_highway_speeds(self.highway_speeds, self.s_highway_id)
-                self.update_staying_times()
-            for i in range(self.yellow_time): # turn on yellow light for left turn
-                traci.trafficlight.setPhase(self.tls_id, phase + 3)
-                self.sumo_step += 1
-                traci.simulationStep()
-                self.update_highway_speeds(self.highway_speeds, self.n_highway_id)
-                self.update_highway_speeds(self.highway_speeds, self.s_highway_id)
-                self.update_staying_times()
-            
-            # turn on green light for phase transitioning to
-            for i in range(self.green_time):
-                traci.trafficlight.setPhase(self.tls_id, (phase + 4) % 8)
-                self.sumo_step += 1
-                traci.simulationStep()
-                self.update_highway_speeds(self.highway_speeds, self.n_highway_id)
-                self.update_highway_speeds(self.highway_speeds, self.s_highway_id)
-                self.update_staying_times()
+        actions = list(action) if self.multi_intersection else [action]
+        if self.signal_program is not None:
+            actions = [None] * len(self.intersections)
+        schedules = []
+        for i, intersection in enumerate(self.intersections):
+            phase = self._traci.trafficlight.getPhase(intersection['tls_id'])
+            if actions[i] is None or self.prev_actions[i] is None or self.prev_actions[i] == actions[i]:
+                # chosen action is the same so keep traffic signal light unchanged
+                schedule = [phase] * self.green_time
+            else:
+                # chosen action is not the same
+                # transition phase: yellow light for either NS traffic or WE traffic,
+                # green light for left turn, yellow light for left turn and then
+                # green light for phase transitioning to
+                schedule = ([phase + 1] * self.yellow_time + [phase + 2] * self.green_time
+                    + [phase + 3] * self.yellow_time + [(phase + 4) % 8] * self.green_time)
+            schedules.append(schedule)
+
+        for t in range(max(len(schedule) for schedule in schedules)):
+            if self.signal_program is None:
+                for intersection, schedule in zip(self.intersections, schedules):
+                    # an intersection that keeps its phase holds it while the others transition
+                    self._traci.trafficlight.setPhase(intersection['tls_id'], schedule[min(t, len(schedule) - 1)])
+            self._simulation_step()
         
-        self.prev_action = action
-        reward2 = -self.compute_reward()
+        self.prev_actions = actions
+        with self.profiler.stage('compute_reward'):
+            if self.multi_intersection:
+                reward2 = -self.compute_rewards()
+            else:
+                reward2 = -self.compute_reward()
+        if self.fast_forward:
+            self._fast_forward()
+        self.highway_detectors.read(self.sumo_step)
         #reward = reward1 - reward2
 
         truncated = False
+        info = {}
 
-        if self.sumo_step >= self.time_steps or traci.simulation.getMinExpectedNumber() <= 0:
+        if self.sumo_step >= self.time_steps or self._traci.simulation.getMinExpectedNumber() <= 0:
             truncated = True
+            # the same average is recorded in average_staying_time_per_vehicle on the next reset
+            info.update(self.episode_metrics())
         
-        return self.get_state(), reward2, False, truncated, {}
+        with self.profiler.stage('get_state'):
+            state = self.get_state()
+        return state, reward2, False, truncated, info
 
     def reset(self, seed=None, options=None):
         '''
         Reset the environment.
         '''
         super().reset(seed=seed)
+        with self.profiler.stage('reset'):
+            return self._reset(seed)
 
+    def _reset(self, seed):
         if self.episode != 0:
-            self.close()
-            self.average_staying_time_per_vehicle[self.episode] = np.mean(self.staying_time_per_vehicle)
+            if self.reset_mode == 'restart':
+                self.close()
+            self.average_staying_time_per_vehicle[self.episode] = self.staying_time_tracker.stats.mean()
         
         self.episode += 1
 
-        self.traffic_generator.generate_routefile(seed)
-        self._start_simulation()
+        with self.profiler.stage('route_generation'):
+            if self.route_cache is not None and seed is not None:
+                route_file = self.route_cache.get(self.traffic_generator, seed)
+            else:
+                # without a seed the demand is random, so there is nothing to reuse
+                route_file = self.route_file
+                self.traffic_generator.generate_routefile(seed, route_file)
+            if self.fast_forward:
+                departures = read_departures(route_file)
+                self._departures = {vehID: route for vehID, (_, route) in departures.items()}
+                self._departure_times = sorted((depart, vehID) for vehID, (depart, _) in departures.items())
+        with self.profiler.stage('sumo_start'):
+            self._start_simulation(route_file)
 
-        self.prev_action = None
-        self.staying_times = {self.n_id: {}, self.e_id: {}, self.s_id: {}, self.w_id: {}}
-        self.num_vehicles = {self.n_id: 0, self.e_id: 0, self.s_id: 0, self.w_id: 0}
-        self.staying_time_per_vehicle = []
+        self.prev_actions = [None] * len(self.intersections)
+        # one tracker per intersection, all recording into the same statistics
+        self.staying_time_trackers = []
+        for intersection in self.intersections:
+            stats = self.staying_time_trackers[0].stats if self.staying_time_trackers else None
+            self.staying_time_trackers.append(StayingTimeTracker(intersection['roads'], stats))
+        self.staying_time_tracker = self.staying_time_trackers[0]
+        self._road_trackers = {road: tracker for tracker in self.staying_time_trackers for road in tracker.roads}
         self.sumo_step = 0
         self.vehicles = dict()
-        self.highway_speeds = {} # key is vehID and value is the speed they entered the highway
+        self.skipped_seconds = 0
+        self._routes = {}
+        self._next_departure = 0
+
+        if self.warm_start_steps > 0 and seed is not None:
+            self._warm_start(seed)
+        if self.use_subscriptions:
+            self._subscribe()
+        self.highway_speeds = HighwaySpeedStats(start_time=self.sumo_step)
+        # halting vehicles on all approach lanes, one value per second
+        self.queue_lengths = StayingTimeStats()
+        self.highway_detectors.start(self._traci, self.highway_speeds)
 
-        return self.get_state(), self.average_staying_time_per_vehicle
+        # the averages of past episodes stay in average_staying_time_per_vehicle; the
+        # info is empty, vector environments merge it with the step infos of the others
+        return self.get_state(), {}
 
     def close(self):
         '''
         Closes the environment and stops the SUMO simulation.
         '''
-        traci.close(wait=False)
+        self.backend.close()
+        self._traci = None
 
     def get_state(self):
         '''
         Get the state of the SUMO environment.
         '''
-        state = [0] * 12
-        roads = [self.n_id, self.e_id, self.s_id, self.w_id]
-        for i in range(len(roads)):
-            for vehID in traci.edge.getLastStepVehicleIDs(roads[i]):
-                state[i * 3 + traci.vehicle.getLaneIndex(vehID)] += 1
+        if self.multi_intersection:
+            return np.array([self._intersection_state(i) for i in self.intersections])
+        return self._intersection_state(self.intersections[0])
 
-        return np.array(state, dtype=np.float32)
+    def _intersection_state(self, intersection):
+        '''
+        The lane features of the approach lanes of an intersection, one block of
+        values per feature with one value per lane. Each value is one aggregate
+        query per lane, so the cost does not grow with the number of vehicles.
+        '''
+        lanes = intersection['lanes']
+        state = np.zeros(self.observation_size, dtype=np.float32)
+        for f, (var, getter) in enumerate(self.lane_features):
+            offset = f * len(lanes)
+            if self.use_subscriptions:
+                # the values are part of the subscription snapshot
+                for j, laneID in enumerate(lanes):
+                    state[offset + j] = self._lane_results[laneID][var]
+            else:
+                get = getattr(self._traci.lane, getter)
+                for j, laneID in enumerate(lanes):
+                    state[offset + j] = get(laneID)
+        return state
 
     def compute_reward(self):
         '''
@@ -180,64 +364,240 @@ class TrafficEnv(gym.Env):
         
         return reward
 
+    def compute_rewards(self):
+        '''
+        Computes the reward of every intersection, the same way as compute_reward.
+        '''
+        self.remove_departed_vehicles()
+        rewards = np.zeros(len(self.intersections))
+        for i, tracker in enumerate(self.staying_time_trackers):
+            avg_staying_times = [tracker.average(road) for road in tracker.roads]
+            overall_avg_staying_time = sum(avg_staying_times) / 4
+            rewards[i] = sum(abs(overall_avg_staying_time - avg_staying_time) for avg_staying_time in avg_staying_times)
+        return rewards
+
+    def episode_metrics(self):
+        '''
+        Staying time and highway speed statistics of the episode up to the last decision.
+        '''
+        stats = self.staying_time_tracker.stats.summary()
+        metrics = {'average_staying_time_per_vehicle': stats.pop('mean')}
+        for name, value in stats.items():
+            metrics['staying_time_' + name] = value
+        metrics['average_highway_speed'] = self.highway_speeds.mean()
+        metrics['interval_mean_speed_p10'] = self.highway_speeds.percentile(10)
+        metrics['interval_mean_speed_p50'] = self.highway_speeds.percentile(50)
+        metrics['highway_vehicles'] = self.highway_speeds.count
+        metrics['highway_flow'] = self.highway_speeds.flow(self.sumo_step)
+        if self.queue_stats:
+            metrics['queue_mean'] = self.queue_lengths.mean()
+            metrics['queue_p90'] = self.queue_lengths.percentile(90)
+            metrics['queue_max'] = max(self.queue_lengths.histogram, default=0)
+        metrics['sim_seconds'] = self.sumo_step
+        metrics['skipped_seconds'] = self.skipped_seconds
+        return metrics
+
     def remove_departed_vehicles(self):
         '''
-        Remove the vehicles that have left the intersection from the dictionary of staying times.
+        Remove the vehicles that have left the intersection from the staying times.
         '''
-        roads = [self.n_id, self.e_id, self.s_id, self.w_id]
-        vehicles_in_roads = []
-        for road in roads:
-            vehicles_in_roads += traci.edge.getLastStepVehicleIDs(road)
-        for road in self.staying_times:
-            for vehID, staying_time in list(self.staying_times[road].items()):
-                if vehID not in vehicles_in_roads:
-                    self.staying_time_per_vehicle.append(self.staying_times[road][vehID])
-                    del self.staying_times[road][vehID]
-                    self.num_vehicles[road] -= 1
+        vehicle_ids = self._road_vehicle_ids()
+        for tracker in self.staying_time_trackers:
+            tracker.remove_departed(vehicle_ids)
 
     def update_staying_times(self):
         '''
         Update the staying time of all vehicles in the intersection.
         '''
-        roads = [self.n_id, self.e_id, self.s_id, self.w_id]
-        for road in roads:
-            for vehID in traci.edge.getLastStepVehicleIDs(road):
-                if vehID not in self.staying_times[road]:
-                    self.staying_times[road][vehID] = 1
-                    self.num_vehicles[road] += 1
-                else:
-                    self.staying_times[road][vehID] += 1
+        vehicle_ids = self._road_vehicle_ids()
+        for tracker in self.staying_time_trackers:
+            tracker.update(vehicle_ids)
 
     def avg_staying_time_of_road(self, road):
         '''
         Get the average staying time of a particular road.
         '''
-        return 0 if self.num_vehicles[road] == 0 else (sum(self.staying_times[road].values()) / self.num_vehicles[road])
+        return self._road_trackers[road].average(road)
 
-    def update_highway_speeds(self, highway_speeds: dict, highway_id: str) -> None:
-        '''Check if a vehicle has just entered the highway. If they did, add the
-        speed with the vehID as the key to the dictionary.'''
-        for vehID in traci.edge.getLastStepVehicleIDs(highway_id):
-                if vehID not in highway_speeds:
-                    highway_speeds[vehID] = traci.vehicle.getSpeed(vehID)
+    def _road_vehicle_ids(self):
+        '''
+        Get the IDs of the vehicles on each approach road of the controlled intersections.
+        '''
+        return {road: self._vehicle_ids(road) for road in self.roads}
+
+    def _simulation_step(self):
+        '''
+        Advance SUMO by one second and update the staying time bookkeeping.
+        '''
+        self.sumo_step += 1
+        with self.profiler.stage('sumo_step'):
+            self._traci.simulationStep()
+            if self.use_subscriptions:
+                self._read_subscriptions()
+        with self.profiler.stage('bookkeeping'):
+            self.update_staying_times()
+            if self.queue_stats:
+                self.queue_lengths.add(sum(self._traci.lane.getLastStepHaltingNumber(laneID) for i in self.intersections for laneID in i['lanes']))
+
+    def _fast_forward(self):
+        '''
+        Advance SUMO while the approaches are empty, holding the current phases.
+        Stretches in which no vehicle can reach an approach are skipped with one
+        simulationStep(targetTime); the seconds before one could are stepped one
+        by one with the usual bookkeeping. No staying time is recorded in a
+        skipped stretch, so they are the same as when stepping every second, and
+        the highway detectors count inside SUMO either way.
+        '''
+        phases = [self._traci.trafficlight.getPhase(i['tls_id']) for i in self.intersections]
+        while (self.sumo_step < self.time_steps and not any(self._vehicle_ids(road) for road in self.roads)
+                and self._traci.simulation.getMinExpectedNumber() > 0):
+            seconds = min(self._quiet_seconds(), self.time_steps - self.sumo_step)
+            for intersection, phase in zip(self.intersections, phases):
+                self._traci.trafficlight.setPhase(intersection['tls_id'], phase)
+                if seconds > 0:
+                    self._traci.trafficlight.setPhaseDuration(intersection['tls_id'], seconds + 1)
+            if seconds == 0:
+                self._simulation_step()
+                continue
+            with self.profiler.stage('sumo_step'):
+                self._traci.simulationStep(self._traci.simulation.getTime() + seconds)
+                if self.use_subscriptions:
+                    self._read_subscriptions()
+            self.sumo_step += seconds
+            self.skipped_seconds += seconds
+            if self.queue_stats:
+                # the approaches stay empty in a skipped stretch
+                for _ in range(seconds):
+                    self.queue_lengths.add(0)
 
-    def average_highway_speed(self, highway_speeds: dict):
+    def _quiet_seconds(self):
         '''
-        Calculate the average highway speed.
+        Number of whole seconds that certainly pass before a vehicle in the
+        network or still to depart reaches an approach, assuming it
+        drives at its top speed without stopping.
         '''
-        return sum(list(highway_speeds.values())) / len(list(highway_speeds.values()))
+        now = self._traci.simulation.getTime()
+        earliest = math.inf
+        for vehID in self._traci.vehicle.getIDList():
+            known = self._routes.get(vehID)
+            if known is None:
+                # neither changes while the vehicle drives
+                known = self._routes[vehID] = (tuple(self._traci.vehicle.getRoute(vehID)), self._traci.vehicle.getSpeedFactor(vehID))
+            route, speed_factor = known
+            index = self._traci.vehicle.getRouteIndex(vehID)
+            if self._traci.vehicle.getRoadID(vehID).startswith(':'):
+                # on a junction, past the end of route[index]
+                position = self._edges[route[index]][0]
+            else:
+                position = self._traci.vehicle.getLanePosition(vehID)
+            arrival = self._travel_time(route, index, position) / speed_factor
+            earliest = min(earliest, arrival)
 
-    def _start_simulation(self):
+        # vehicles waiting to be inserted can be on their first edge in the next step
+        for vehID in self._traci.simulation.getPendingVehicles():
+            earliest = min(earliest, self._departure_travel_time(self._departures[vehID]))
+
+        # a vehicle departing now is only inserted by the next step in SUMO
+        while self._next_departure < len(self._departure_times) and self._departure_times[self._next_departure][0] < now:
+            self._next_departure += 1
+        for depart, vehID in self._departure_times[self._next_departure:]:
+            if depart - now >= earliest:
+                break
+            earliest = min(earliest, depart - now + self._departure_travel_time(self._departures[vehID]))
+
+        if earliest == math.inf:
+            return self.time_steps
+        # a vehicle that can arrive after t seconds is seen at the latest in step ceil(t)
+        return max(math.ceil(earliest) - 1, 0)
+
+    def _travel_time(self, route, index, position):
+        '''
+        Shortest time from position on route[index] to the start of the next
+        approach on the route, at the highest speed limit on the way.
         '''
-        Starts the SUMO simulation.
+        distance = self._edges[route[index]][0] - position
+        speed = self._edges[route[index]][1]
+        for edge in route[index + 1:]:
+            if edge in self._watched:
+                return distance / speed
+            length, edge_speed = self._edges[edge]
+            distance += length
+            speed = max(speed, edge_speed)
+        return math.inf
+
+    def _departure_travel_time(self, route):
+        '''
+        Shortest time from the departure of a vehicle to its first approach.
+        '''
+        if route[0] in self._watched:
+            return 0.0
+        return self._travel_time(route, 0, 0.0)
+
+    def _vehicle_ids(self, edge_id):
         '''
-        sumo_cmd = [
-            self._sumo_binary, 
+        Get the IDs of the vehicles on an edge in the last simulation step.
+        '''
+        if self.use_subscriptions:
+            return self._edge_results[edge_id][tc.LAST_STEP_VEHICLE_ID_LIST]
+        return self._traci.edge.getLastStepVehicleIDs(edge_id)
+
+    def _subscribe(self):
+        '''
+        Register the edge, lane and vehicle subscriptions that replace the
+        per-step TraCI queries. SUMO pushes the subscribed values with every
+        simulation step, so reading them does not cost a round-trip.
+        '''
+        for road in self.roads:
+            self._traci.edge.subscribe(road, [tc.LAST_STEP_VEHICLE_ID_LIST])
+        lane_vars = [var for var, _ in self.lane_features]
+        for intersection in self.intersections:
+            for laneID in intersection['lanes']:
+                self._traci.lane.subscribe(laneID, lane_vars)
+        self._read_subscriptions()
+
+    def _read_subscriptions(self):
+        '''
+        Take the snapshot of the subscription results for the current simulation step.
+        '''
+        self._edge_results = self._traci.edge.getAllSubscriptionResults()
+        self._lane_results = self._traci.lane.getAllSubscriptionResults()
+
+    def _start_simulation(self, route_file):
+        '''
+        Starts the SUMO simulation with the given route file instead of the one in the config.
+        '''
+        sumo_args = [
             "-c", 
             os.path.join('config', self.sumocfg_file_name), 
+            "--route-files",
+            os.path.abspath(route_file),
+            "--additional-files",
+            ','.join(self._additional_files),
             "--no-step-log", 
             "true"
         ]
 
-        traci.start(sumo_cmd)
-    
+        if self.reset_mode == 'load' and self._traci is not None:
+            self._traci.load(sumo_args)
+        else:
+            self._traci = self.backend.start(sumo_args)
+            if self.profiler.enabled:
+                self._traci = CountingConnection(self._traci, self.profiler)
+
+    def _warm_start(self, seed):
+        '''
+        Skip the first warm_start_steps seconds of the episode by loading the saved
+        simulation state for the seed, saving it first if it is not cached yet.
+        '''
+        key = '%s_%i' % (self.traffic_generator.cache_key(seed), self.warm_start_steps)
+        state_file = os.path.join(self.state_cache_dir, key + '.sbx')
+        if os.path.exists(state_file):
+            self._traci.simulation.loadState(state_file)
+        else:
+            for _ in range(self.warm_start_steps):
+                self._traci.simulationStep()
+            # write to a temporary file first so other processes never load a partial state
+            tmp_file = os.path.join(self.state_cache_dir, '%s.%s.tmp.sbx' % (key, self.label))
+            self._traci.simulation.saveState(tmp_file)
+            os.replace(tmp_file, state_file)
+        self.sumo_step = self.warm_start_steps
@@ -0,0 +1,236 @@
+'''
+Evaluation of a trained policy against fixed-time and actuated signal control
+on the same demand, episodes running in parallel over a local process pool.
+
+    python evaluation.py evaluations/peak --checkpoint-dir checkpoints --seeds 100 --workers 8
+    python evaluation.py evaluations/peak --policy policy.npz --controllers dqn,actuated
+    python evaluation.py evaluations/peak --checkpoint-dir checkpoints --seeds 100    # again, to resume
+
+The controllers are 'dqn', the greedy policy of the latest checkpoint or of an
+exported policy file, 'fixed', the fixed-time program of the network, and
+'actuated', SUMO's actuated control made from it. Every controller runs one
+episode per demand seed of TrafficGenerator, the seeds counting up from
+--first-seed, so the controllers are compared on the same traffic. Every worker
+runs one SUMO at a time.
+
+Each finished episode is a line of episodes.jsonl in the evaluation directory;
+running the evaluation again only runs the missing ones. summary.json has per
+controller and metric the mean with its bootstrap confidence interval and the
+10th, 50th and 90th percentile over the episodes, and per baseline the mean
+difference of every metric to the dqn controller on the same seeds.
+'''
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+CONTROLLERS = ('dqn', 'fixed', 'actuated')
+# the signal program of TrafficEnv each baseline runs
+SIGNAL_PROGRAMS = {'fixed': 'static', 'actuated': 'actuated'}
+METRICS = (
+    'average_staying_time_per_vehicle', 'staying_time_p50', 'staying_time_p90',
+    'queue_mean', 'queue_p90', 'queue_max',
+    'average_highway_speed', 'interval_mean_speed_p10', 'interval_mean_speed_p50', 'highway_flow',
+)
+
+# the policy of a worker process, loaded by its first dqn episode
+_policy = {}
+
+def _greedy_policy(checkpoint_dir=None, policy_file=None):
+    '''
+    A function from an observation to the greedy action of the trained network.
+    '''
+    key = (checkpoint_dir, policy_file)
+    if key not in _policy:
+        if policy_file is not None:
+            from policy_export import load_policy
+
+            policy = load_policy(policy_file)
+
+            def act(state):
+                policy.observation[:] = state
+                return policy.act()
+        else:
+            import torch
+            from dqn import SharedDQNAgent
+            from checkpoint import load_checkpoint_agent
+
+            agent = load_checkpoint_agent(checkpoint_dir)
+            if agent is None:
+                raise ValueError('no checkpoint in %s' % checkpoint_dir)
+            if isinstance(agent, SharedDQNAgent):
+                raise ValueError('%s holds a multi-intersection agent, the evaluation runs a single intersection' % checkpoint_dir)
+            model = agent.model.eval()
+
+            def act(state):
+                with torch.no_grad():
+                    return int(model(torch.from_numpy(state).unsqueeze(0)).argmax())
+        _policy[key] = act
+    return _policy[key]
+
+def run_episode(controller, seed, env_kwargs, checkpoint_dir=None, policy_file=None):
+    '''
+    One episode of a controller on the demand of a seed, in a worker process.
+    Returns the episode metrics of TrafficEnv with the queue statistics.
+    '''
+    import torch
+    from environment import TrafficEnv
+
+    # the workers share the cores, one thread each avoids oversubscribing them
+    torch.set_num_threads(1)
+    start_time = time.perf_counter()
+    act = _greedy_policy(checkpoint_dir, policy_file) if controller == 'dqn' else None
+    name = '%s_%i' % (controller, seed)
+    env = TrafficEnv(**dict(env_kwargs, signal_program=SIGNAL_PROGRAMS.get(controller), queue_stats=True, label='evaluation_' + name))
+    try:
+        state, _ = env.reset(seed=seed)
+        total_reward = 0
+        decisions = 0
+        truncated = False
+        while not truncated:
+            state, reward, _, truncated, info = env.step(act(state) if act else 0)
+            total_reward += reward
+            decisions += 1
+    finally:
+        env.close()
+    return dict(info, controller=controller, seed=seed, decisions=decisions, average_reward=total_reward / decisions,
+        wall_time=time.perf_counter() - start_time)
+
+def confidence_interval(values, confidence=0.95, resamples=10000, seed=0):
+    '''
+    Percentile bootstrap confidence interval of the mean of values.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    means = values[rng.integers(0, len(values), (resamples, len(values)))].mean(axis=1)
+    return tuple(np.percentile(means, [50 * (1 - confidence), 50 * (1 + confidence)]))
+
+def summarize(records, confidence=0.95):
+    '''
+    The distribution of every metric per controller, and the paired differences
+    of the baselines to the dqn controller on the seeds both have run.
+    '''
+    by_controller = {}
+    for record in records:
+        by_controller.setdefault(record['controller'], {})[record['seed']] = record
+    summary = {'controllers': {}, 'differences': {}, 'confidence': confidence}
+    for controller, episodes in by_controller.items():
+        summary['controllers'][controller] = stats = {'episodes': len(episodes)}
+        for metric in METRICS:
+            # nan where an episode had nothing to measure, e.g. no highway traffic
+            values = [v for v in (r.get(metric) for r in episodes.values()) if v is not None and not np.isnan(v)]
+            if values:
+                low, high = confidence_interval(values, confidence)
+                p10, p50, p90 = np.percentile(values, [10, 50, 90])
+                stats[metric] = {'mean': float(np.mean(values)), 'ci_low': float(low), 'ci_high': float(high),
+                    'p10': float(p10), 'p50': float(p50), 'p90': float(p90)}
+    if 'dqn' in by_controller:
+        for controller, episodes in by_controller.items():
+            seeds = sorted(set(episodes) & set(by_controller['dqn']))
+            if controller == 'dqn' or not seeds:
+                continue
+            summary['differences'][controller] = differences = {'episodes': len(seeds)}
+            for metric in METRICS:
+                values = [by_controller['dqn'][s].get(metric, np.nan) - episodes[s].get(metric, np.nan) for s in seeds]
+                values = [v for v in values if not np.isnan(v)]
+                if values:
+                    low, high = confidence_interval(values, confidence)
+                    differences[metric] = {'mean': float(np.mean(values)), 'ci_low': float(low), 'ci_high': float(high)}
+    return summary
+
+def run_evaluation(evaluation_dir, controllers, seeds, env_kwargs, workers, checkpoint_dir=None, policy_file=None):
+    '''
+    Run every controller on every seed in a pool of workers processes, skipping
+    the episodes already in the evaluation directory, and return the summary of all.
+    '''
+    os.makedirs(evaluation_dir, exist_ok=True)
+    episodes_file = os.path.join(evaluation_dir, 'episodes.jsonl')
+    records = []
+    if os.path.exists(episodes_file):
+        from metrics import read_metrics
+
+        records = [r for r in read_metrics(episodes_file) if r['controller'] in controllers and r['seed'] in seeds]
+    done = {(r['controller'], r['seed']) for r in records}
+    pending = [(controller, seed) for seed in seeds for controller in controllers if (controller, seed) not in done]
+    print('%i episodes, %i finished before, %i to run on %i workers' % (len(controllers) * len(seeds), len(done), len(pending), workers))
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(run_episode, controller, seed, env_kwargs, checkpoint_dir, policy_file): (controller, seed)
+            for controller, seed in pending}
+        with open(episodes_file, 'a') as f:
+            for future in as_completed(futures):
+                controller, seed = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # nothing is written, so the episode runs again when the evaluation is resumed
+                    print('%s seed %i failed: %r' % (controller, seed, e))
+                    continue
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                records.append(record)
+                print('%-8s seed %6i  staying time %7.2f  queue %6.2f  %.1fs' % (controller, seed,
+                    record['average_staying_time_per_vehicle'], record['queue_mean'], record['wall_time']))
+    finally:
+        # on an interrupt the queued episodes are dropped instead of run, the resumed evaluation runs them
+        pool.shutdown(cancel_futures=True)
+
+    summary = summarize(records)
+    with open(os.path.join(evaluation_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def print_summary(summary):
+    percent = 100 * summary['confidence']
+    for controller, stats in summary['controllers'].items():
+        print('\n%s, %i episodes' % (controller, stats['episodes']))
+        print('%-34s %10s %22s %10s %10s %10s' % ('', 'mean', '%g%% CI' % percent, 'p10', 'p50', 'p90'))
+        for metric in METRICS:
+            if metric in stats:
+                s = stats[metric]
+                print('%-34s %10.2f %10.2f - %9.2f %10.2f %10.2f %10.2f' % (metric, s['mean'], s['ci_low'], s['ci_high'], s['p10'], s['p50'], s['p90']))
+    for controller, differences in summary['differences'].items():
+        print('\ndqn - %s, %i paired episodes' % (controller, differences['episodes']))
+        for metric in METRICS:
+            if metric in differences:
+                d = differences[metric]
+                print('%-34s %+10.2f %10.2f - %9.2f' % (metric, d['mean'], d['ci_low'], d['ci_high']))
+
+if __name__ == '__main__':
+    from generator import DEMAND_PROFILES
+    from training_simulation import ENV_KWARGS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('evaluation_dir', help='directory of the evaluation, reused to resume it')
+    parser.add_argument('--checkpoint-dir', help='training checkpoints, the latest is evaluated')
+    parser.add_argument('--policy', help='exported policy file (.pt, .onnx or .npz) to evaluate instead of a checkpoint')
+    parser.add_argument('--controllers', default=','.join(CONTROLLERS), help='comma separated controllers: dqn, fixed, actuated')
+    parser.add_argument('--seeds', type=int, default=100, help='demand seeds every controller runs')
+    parser.add_argument('--first-seed', type=int, default=10000, help='first demand seed, away from the seeds used in training')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='episodes running at the same time')
+    parser.add_argument('--demand-profile', choices=list(DEMAND_PROFILES), default='peak', help='traffic demand of the generated routes')
+    parser.add_argument('--lane-features', default='count', help='the lane features the policy was trained with')
+    parser.add_argument('--backend', default='traci', help="simulation backend: 'traci', 'libsumo' or 'fake'")
+    args = parser.parse_args()
+
+    controllers = args.controllers.split(',')
+    for controller in controllers:
+        if controller not in CONTROLLERS:
+            parser.error("unknown controller '%s'" % controller)
+    if 'dqn' in controllers and not (args.checkpoint_dir or args.policy):
+        parser.error('the dqn controller needs --checkpoint-dir or --policy')
+    if 'dqn' in controllers:
+        # loaded here once, so a policy that cannot be evaluated fails before any episode runs
+        try:
+            _greedy_policy(args.checkpoint_dir, args.policy)
+        except ValueError as e:
+            parser.error(str(e))
+
+    env_kwargs = dict(ENV_KWARGS, backend=args.backend, demand_scale=DEMAND_PROFILES[args.demand_profile],
+        lane_features=args.lane_features.split(','))
+    seeds = list(range(args.first_seed, args.first_seed + args.seeds))
+    summary = run_evaluation(args.evaluation_dir, controllers, seeds, env_kwargs, args.workers, args.checkpoint_dir, args.policy)
+    print_summary(summary)
@@ -0,0 +1,360 @@
+import gzip
+import os
+import pickle
+import xml.etree.ElementTree as ET
+import traci.constants as tc
+
+# length of a vehicle plus the minimum gap to the vehicle in front
+VEHICLE_SPACE = 7.5
+VEHICLE_LENGTH = 5.0
+# speed below which SUMO counts a vehicle as halting
+HALTING_SPEED = 0.1
+ACCELERATION = 3.0
+
+def _parse(file_name):
+    if file_name.endswith('.gz'):
+        with gzip.open(file_name) as f:
+            return ET.parse(f).getroot()
+    return ET.parse(file_name).getroot()
+
+class FakeSimulation:
+    def __init__(self, args):
+        '''
+        A small deterministic stand-in for SUMO that exposes the part of the TraCI
+        API TrafficEnv uses. It reads the same sumocfg, network and route files.
+        Vehicles drive their routes lane by lane with a simple car-following rule
+        and stop at the end of a lane whose traffic light link is not green; the
+        traffic lights run their static programs unless a phase is set.
+
+        args are the SUMO command line arguments without the binary.
+        '''
+        self.load(args)
+
+    def load(self, args):
+        '''
+        Reload the network and routes with new command line arguments, like traci.load.
+        '''
+        options = dict(zip(args[::2], args[1::2]))
+        config_file = options.get('-c', options.get('--configuration-file'))
+        config = _parse(config_file)
+        config_dir = os.path.dirname(config_file)
+        net_file = os.path.join(config_dir, config.find('input/net-file').get('value'))
+        if '--route-files' in options:
+            route_files = options['--route-files'].split(',')
+        else:
+            route_files = [os.path.join(config_dir, f) for f in config.find('input/route-files').get('value').split(',')]
+
+        self._load_network(net_file)
+        self._load_routes(route_files)
+        self._load_detectors(options['--additional-files'].split(',') if '--additional-files' in options else [])
+
+        self.time = 0
+        self.edge = _Edge(self)
+        self.lane = _Lane(self)
+        self.vehicle = _Vehicle(self)
+        self.trafficlight = _TrafficLight(self)
+        self.simulation = _Simulation(self)
+        self.inductionloop = _InductionLoop(self)
+        self._update_vehicle_lists()
+
+    def _load_network(self, net_file):
+        net = _parse(net_file)
+        self.lanes = {}         # lane id -> (edge id, index, length, max speed)
+        self.edge_lanes = {}    # edge id -> [lane id]
+        for edge in net.iter('edge'):
+            if edge.get('function') == 'internal':
+                continue
+            self.edge_lanes[edge.get('id')] = []
+            for lane in edge.iter('lane'):
+                self.lanes[lane.get('id')] = (edge.get('id'), int(lane.get('index')), float(lane.get('length')), float(lane.get('speed')))
+                self.edge_lanes[edge.get('id')].append(lane.get('id'))
+
+        # (from edge, to edge) -> [(from lane index, to lane index, tls id, link index)]
+        self.connections = {}
+        for connection in net.iter('connection'):
+            if connection.get('from').startswith(':'):
+                continue
+            key = (connection.get('from'), connection.get('to'))
+            link = (int(connection.get('fromLane')), int(connection.get('toLane')), connection.get('tl'), int(connection.get('linkIndex', -1)))
+            self.connections.setdefault(key, []).append(link)
+
+        # tls id -> [(duration, state)], current phase and time left in it
+        self.programs = {}
+        self.phases = {}
+        for tl_logic in net.iter('tlLogic'):
+            self.programs[tl_logic.get('id')] = [(int(float(p.get('duration'))), p.get('state')) for p in tl_logic.iter('phase')]
+            self.phases[tl_logic.get('id')] = [0, self.programs[tl_logic.get('id')][0][0]]
+
+    def _load_routes(self, route_files):
+        routes = {}
+        self.pending = []
+        for route_file in route_files:
+            root = _parse(route_file)
+            for route in root.iter('route'):
+                routes[route.get('id')] = route.get('edges').split()
+            for vehicle in root.iter('vehicle'):
+                self.pending.append((float(vehicle.get('depart')), vehicle.get('id'), routes[vehicle.get('route')]))
+        self.pending.sort(key=lambda v: v[0])
+        self.pending.reverse()
+        self.vehicles = {}      # vehicle id -> [route, edge index, lane id, position, speed]
+        self.lane_vehicles = {lane: [] for lane in self.lanes}  # front vehicle first
+
+    def _load_detectors(self, additional_files):
+        # loop id -> [lane id, position, vehicles, sum of their speeds] since the start
+        self.loops = {}
+        self.lane_loops = {}
+        for additional_file in additional_files:
+            for loop in _parse(additional_file).iter('inductionLoop'):
+                self.loops[loop.get('id')] = [loop.get('lane'), float(loop.get('pos')), 0, 0.0]
+                self.lane_loops.setdefault(loop.get('lane'), []).append(loop.get('id'))
+
+    def _detect(self, lane_id, old_position, new_position, speed):
+        '''
+        Count a vehicle that moved from old_position to new_position on the lane at
+        every loop it passed.
+        '''
+        for loop_id in self.lane_loops.get(lane_id, ()):
+            loop = self.loops[loop_id]
+            if old_position < loop[1] <= new_position:
+                loop[2] += 1
+                loop[3] += speed
+
+    def _link_lanes(self, edge, next_edge):
+        '''
+        Lane index pairs connecting edge to next_edge.
+        '''
+        return self.connections.get((edge, next_edge), [])
+
+    def _is_green(self, tls, link_index):
+        phase = self.phases[tls][0]
+        return self.programs[tls][phase][1][link_index] in 'Gg'
+
+    def _entry_lane(self, vehicle_id, edge, next_edge, from_lane_index=None):
+        '''
+        The lane a vehicle takes on edge so that it can continue to next_edge.
+        '''
+        lanes = self.edge_lanes[edge]
+        if next_edge is None:
+            candidates = list(range(len(lanes)))
+        else:
+            candidates = sorted({link[0] for link in self._link_lanes(edge, next_edge)}) or list(range(len(lanes)))
+        if from_lane_index in candidates:
+            return lanes[from_lane_index]
+        # deterministic stand-in for departLane="random"
+        return lanes[candidates[sum(map(ord, vehicle_id)) % len(candidates)]]
+
+    def simulationStep(self, step=0):
+        '''
+        Advance one second, or up to the time step if it is later.
+        '''
+        self._step()
+        while self.time < step:
+            self._step()
+
+    def _step(self):
+        self.time += 1
+
+        for tls, phase in self.phases.items():
+            phase[1] -= 1
+            if phase[1] <= 0:
+                phase[0] = (phase[0] + 1) % len(self.programs[tls])
+                phase[1] = self.programs[tls][phase[0]][0]
+
+        moved = set()   # vehicles that already changed lanes in this step
+        for lane_id, queue in self.lane_vehicles.items():
+            edge, _, length, max_speed = self.lanes[lane_id]
+            limit = float('inf')
+            for vehicle_id in list(queue):
+                if vehicle_id in moved:
+                    continue
+                vehicle = self.vehicles[vehicle_id]
+                route, edge_index, _, position, speed = vehicle
+                speed = min(speed + ACCELERATION, max_speed)
+                new_position = min(position + speed, limit)
+                if new_position >= length:
+                    next_lane = self._next_lane(vehicle_id, vehicle, edge, lane_id)
+                    if next_lane is False:
+                        # end of the route
+                        queue.remove(vehicle_id)
+                        del self.vehicles[vehicle_id]
+                        continue
+                    if next_lane is None:
+                        new_position = length
+                    else:
+                        queue.remove(vehicle_id)
+                        next_length = self.lanes[next_lane][2]
+                        vehicle[1] += 1
+                        vehicle[2] = next_lane
+                        vehicle[3] = min(new_position - length, next_length)
+                        vehicle[4] = new_position - position
+                        self.lane_vehicles[next_lane].append(vehicle_id)
+                        moved.add(vehicle_id)
+                        self._detect(next_lane, -1.0, vehicle[3], vehicle[4])
+                        continue
+                vehicle[4] = max(new_position - position, 0.0)
+                vehicle[3] = max(new_position, position)
+                limit = vehicle[3] - VEHICLE_SPACE
+                self._detect(lane_id, position, vehicle[3], vehicle[4])
+
+        while self.pending and self.pending[-1][0] <= self.time:
+            depart, vehicle_id, route = self.pending[-1]
+            lane_id = self._entry_lane(vehicle_id, route[0], route[1] if len(route) > 1 else None)
+            queue = self.lane_vehicles[lane_id]
+            if queue and self.vehicles[queue[-1]][3] < VEHICLE_SPACE:
+                # no space to insert, try again next step
+                break
+            self.pending.pop()
+            self.vehicles[vehicle_id] = [route, 0, lane_id, 0.0, 0.0]
+            queue.append(vehicle_id)
+
+        self._update_vehicle_lists()
+
+    def _next_lane(self, vehicle_id, vehicle, edge, lane_id):
+        '''
+        The lane the vehicle enters at the end of its lane, None if it has to wait
+        or False if it leaves the network.
+        '''
+        route, edge_index = vehicle[0], vehicle[1]
+        if edge_index + 1 >= len(route):
+            return False
+        next_edge = route[edge_index + 1]
+        lane_index = self.lanes[lane_id][1]
+        links = [link for link in self._link_lanes(edge, next_edge) if link[0] == lane_index]
+        if not links:
+            return None
+        _, to_lane, tls, link_index = links[0]
+        if tls is not None and not self._is_green(tls, link_index):
+            return None
+        after_next = route[edge_index + 2] if edge_index + 2 < len(route) else None
+        next_lane = self._entry_lane(vehicle_id, next_edge, after_next, to_lane)
+        queue = self.lane_vehicles[next_lane]
+        if queue and self.vehicles[queue[-1]][3] < VEHICLE_SPACE:
+            return None
+        return next_lane
+
+    def _update_vehicle_lists(self):
+        self.lane_ids = {lane: tuple(queue) for lane, queue in self.lane_vehicles.items()}
+        self.edge_ids = {edge: sum((self.lane_ids[lane] for lane in lanes), ()) for edge, lanes in self.edge_lanes.items()}
+
+    def save_state(self, file_name):
+        with open(file_name, 'wb') as f:
+            pickle.dump((self.time, self.phases, self.pending, self.vehicles, self.lane_vehicles), f)
+
+    def load_state(self, file_name):
+        with open(file_name, 'rb') as f:
+            self.time, self.phases, self.pending, self.vehicles, self.lane_vehicles = pickle.load(f)
+        self._update_vehicle_lists()
+
+    def close(self):
+        self.vehicles = {}
+        self.pending = []
+
+class _Domain:
+    def __init__(self, simulation):
+        self._simulation = simulation
+        self._subscriptions = {}
+
+    def subscribe(self, object_id, var_ids):
+        self._subscriptions[object_id] = list(var_ids)
+
+class _Edge(_Domain):
+    def getLastStepVehicleIDs(self, edge_id):
+        return self._simulation.edge_ids[edge_id]
+
+    def getLaneNumber(self, edge_id):
+        return len(self._simulation.edge_lanes[edge_id])
+
+    def getAllSubscriptionResults(self):
+        return {edge: {var: self._simulation.edge_ids[edge] for var in var_ids} for edge, var_ids in self._subscriptions.items()}
+
+class _Lane(_Domain):
+    def getLastStepVehicleIDs(self, lane_id):
+        return self._simulation.lane_ids[lane_id]
+
+    def getLastStepVehicleNumber(self, lane_id):
+        return len(self._simulation.lane_ids[lane_id])
+
+    def getLastStepHaltingNumber(self, lane_id):
+        vehicles = self._simulation.vehicles
+        return sum(1 for v in self._simulation.lane_ids[lane_id] if vehicles[v][4] < HALTING_SPEED)
+
+    def getLastStepOccupancy(self, lane_id):
+        # the occupied share of the lane length, which is what SUMO returns despite its documentation saying percent
+        length = self._simulation.lanes[lane_id][2]
+        return min(len(self._simulation.lane_ids[lane_id]) * VEHICLE_LENGTH / length, 1.0)
+
+    def getAllSubscriptionResults(self):
+        getters = {
+            tc.LAST_STEP_VEHICLE_ID_LIST: self.getLastStepVehicleIDs,
+            tc.LAST_STEP_VEHICLE_NUMBER: self.getLastStepVehicleNumber,
+            tc.LAST_STEP_VEHICLE_HALTING_NUMBER: self.getLastStepHaltingNumber,
+            tc.LAST_STEP_OCCUPANCY: self.getLastStepOccupancy,
+        }
+        return {lane: {var: getters[var](lane) for var in var_ids} for lane, var_ids in self._subscriptions.items()}
+
+class _InductionLoop(_Domain):
+    def getIntervalVehicleNumber(self, loop_id):
+        return self._simulation.loops[loop_id][2]
+
+    def getIntervalMeanSpeed(self, loop_id):
+        _, _, count, speed_sum = self._simulation.loops[loop_id]
+        return speed_sum / count if count else -1.0
+
+    def getAllSubscriptionResults(self):
+        getters = {
+            tc.VAR_INTERVAL_NUMBER: self.getIntervalVehicleNumber,
+            tc.VAR_INTERVAL_SPEED: self.getIntervalMeanSpeed,
+        }
+        return {loop: {var: getters[var](loop) for var in var_ids} for loop, var_ids in self._subscriptions.items()}
+
+class _Vehicle(_Domain):
+    def getLaneIndex(self, vehicle_id):
+        return self._simulation.lanes[self._simulation.vehicles[vehicle_id][2]][1]
+
+    def getSpeed(self, vehicle_id):
+        return self._simulation.vehicles[vehicle_id][4]
+
+    def getIDList(self):
+        return tuple(self._simulation.vehicles)
+
+    def getRoadID(self, vehicle_id):
+        return self._simulation.lanes[self._simulation.vehicles[vehicle_id][2]][0]
+
+    def getRoute(self, vehicle_id):
+        return tuple(self._simulation.vehicles[vehicle_id][0])
+
+    def getRouteIndex(self, vehicle_id):
+        return self._simulation.vehicles[vehicle_id][1]
+
+    def getLanePosition(self, vehicle_id):
+        return self._simulation.vehicles[vehicle_id][3]
+
+    def getSpeedFactor(self, vehicle_id):
+        # vehicles never drive faster than the speed limit
+        return 1.0
+
+class _TrafficLight(_Domain):
+    def getPhase(self, tls_id):
+        return self._simulation.phases[tls_id][0]
+
+    def setPhase(self, tls_id, index):
+        self._simulation.phases[tls_id] = [index, self._simulation.programs[tls_id][index][0]]
+
+    def setPhaseDuration(self, tls_id, duration):
+        self._simulation.phases[tls_id][1] = duration
+
+class _Simulation(_Domain):
+    def getMinExpectedNumber(self):
+        return len(self._simulation.vehicles) + len(self._simulation.pending)
+
+    def getTime(self):
+        return float(self._simulation.time)
+
+    def getPendingVehicles(self):
+        return tuple(v[1] for v in self._simulation.pending if v[0] <= self._simulation.time)
+
+    def saveState(self, file_name):
+        self._simulation.save_state(file_name)
+
+    def loadState(self, file_name):
+        self._simulation.load_state(file_name)
@@ -1,237 +1,290 @@
+import gzip
+import hashlib
 import numpy as np
 
+ROUTE_FILE = 'config/routes.rou.xml'
+
+# route id and the edges it is made of
+ROUTES = [
+    # routes leading to north highway
+    ('W1_HN', 'we1 we2 we3 we4 hwn'),
+    ('N1_HN', 'int1ns1 we2 we3 we4 hwn'),
+    ('S1_HN', 'int1sn1 we2 we3 we4 hwn'),
+    ('N2_HN', 'int2ns1 we3 we4 hwn'),
+    ('S2_HN', 'int2sn1 we3 we4 hwn'),
+
+    # routes leading to the south highway
+    ('W1_HS', 'we1 we2 we3 se1 hws'),
+    ('N1_HS', 'int1ns1 we2 we3 se1 hws'),
+    ('S1_HS', 'int1sn1 we2 we3 se1 hws'),
+    ('N2_HS', 'int2ns1 we3 se1 hws'),
+    ('S2_HS', 'int2sn1 we3 se1 hws'),
+
+    # routes leading to north road of intersection two
+    ('W1_N2', 'we1 we2 int2sn2'),
+    ('N1_N2', 'int1ns1 we2 int2sn2'),
+    ('S1_N2', 'int1sn1 we2 int2sn2'),
+    ('S2_N2', 'int2sn1 int2sn2'),
+    ('HN_N2', '-hwn ew1 ew2 int2sn2'),
+    ('HS_N2', '-hws nw1 ew2 int2sn2'),
+
+    # routes leading to south road of intersection two
+    ('W1_S2', 'we1 we2 int2ns2'),
+    ('N1_S2', 'int1ns1 we2 int2ns2'),
+    ('S1_S2', 'int1sn1 we2 int2ns2'),
+    ('N2_S2', 'int2ns1 int2ns2'),
+    ('HN_S2', '-hwn ew1 ew2 int2ns2'),
+    ('HS_S2', '-hws nw1 ew2 int2ns2'),
+
+    # routes leading to north road of intersection one
+    ('W1_N1', 'we1 int1sn2'),
+    ('S1_N1', 'int1sn1 int1sn2'),
+    ('N2_N1', 'int2ns1 ew3 int1sn2'),
+    ('S2_N1', 'int2sn1 ew3 int1sn2'),
+    ('HN_N1', '-hwn ew1 ew2 ew3 int1sn2'),
+    ('HS_N1', '-hws nw1 ew2 ew3 int1sn2'),
+
+    # routes leading to south road of intersection one
+    ('W1_S1', 'we1 int1ns2'),
+    ('N1_S1', 'int1ns1 int1ns2'),
+    ('N2_S1', 'int2ns1 ew3 int1ns2'),
+    ('S2_S1', 'int2sn1 ew3 int1ns2'),
+    ('HN_S1', '-hwn ew1 ew2 ew3 int1ns2'),
+    ('HS_S1', '-hws nw1 ew2 ew3 int1ns2'),
+
+    # routes leading to west road of intersection one
+    ('N1_W1', 'int1ns1 ew4'),
+    ('S1_W1', 'int1sn1 ew4'),
+    ('N2_W1', 'int2ns1 ew3 ew4'),
+    ('S2_W1', 'int2sn1 ew3 ew4'),
+    ('HN_W1', '-hwn ew1 ew2 ew3 ew4'),
+    ('HS_W1', '-hws nw1 ew2 ew3 ew4'),
+]
+
+# demand per second for different destinations, in the order they are drawn
+DEMAND = [
+    ('W1', 1. / 10),    # west road of intersection one
+    ('N1', 1. / 14),    # north road of intersection one
+    ('S1', 1. / 14),    # south road of intersection one
+    ('N2', 1. / 17),    # north road of intersection two
+    ('S2', 1. / 17),    # south road of intersection two
+    ('HN', 1. / 30),    # north highway
+    ('HS', 1. / 25),    # south highway
+]
+
+# demand_scale of TrafficGenerator for typical times of day
+DEMAND_PROFILES = {
+    'night': 0.02,
+    'low': 0.1,
+    'medium': 0.5,
+    'peak': 1.0,
+}
+
+# for every destination the turn choices as (upper bound of the turn draw, sources),
+# where a source is (vehicle id prefix, route id). a random source is picked when a
+# turn choice has more than one.
+TURNS = {
+    'W1': [
+        (0.25, [('S1_W1', 'N1_W1'), ('S2_W1', 'N2_W1'), ('HS_W1', 'N2_W1')]),   # left turn
+        (1.0, [('N1_W1', 'N1_W1'), ('N2_W1', 'N2_W1'), ('HN_W1', 'N2_W1')]),    # remaining routes
+    ],
+    'N1': [
+        (0.25, [('W1_N1', 'W1_N1'), ('S2_N1', 'S2_N1'), ('HS_N1', 'HS_N1')]),   # left turn
+        (0.55, [('N2_N1', 'N2_N1'), ('HN_N1', 'HN_N1')]),                       # right turn
+        (1.0, [('S1_N1', 'S1_N1')]),                                            # no turns
+    ],
+    'S1': [
+        (0.25, [('N2_S1', 'N2_S1'), ('S2_S1', 'S2_S1'), ('HS_S1', 'HS_S1'), ('HN_S1', 'HN_S1')]),
+        (0.55, [('W1_S1', 'W1_S1')]),
+        (1.0, [('N1_S1', 'N1_S1')]),
+    ],
+    'N2': [
+        (0.25, [('W1_N2', 'W1_N2'), ('N1_N2', 'N1_N2'), ('S1_N2', 'S1_N2'), ('HS_N2', 'HS_N2')]),
+        (0.55, [('HN_N2', 'HN_N2')]),
+        (1.0, [('S2_N2', 'S2_N2')]),
+    ],
+    'S2': [
+        (0.25, [('N1_S2', 'N1_S2'), ('HN_S2', 'HN_S2'), ('HS_S2', 'HS_S2')]),
+        (0.55, [('W1_S2', 'W1_S2'), ('S1_S2', 'S1_S2')]),
+        (1.0, [('N2_S2', 'N2_S2')]),
+    ],
+    'HN': [
+        (0.25, [('N1_HN', 'N1_HN'), ('N2_HN', 'N2_HN')]),   # left turn not including turn to enter highway
+        (0.55, [('S1_HN', 'S1_HN'), ('S2_HN', 'S2_HN')]),   # right turn
+        (1.0, [('W1_HN', 'W1_HN')]),                        # only turn is into the highway
+    ],
+    'HS': [
+        (0.25, [('N1_HS', 'N1_HS'), ('N2_HS', 'N2_HS')]),
+        (0.55, [('S1_HS', 'S1_HS'), ('S2_HS', 'S2_HS')]),
+        (1.0, [('W1_HS', 'W1_HS')]),
+    ],
+}
+
+HEADER = '''<routes>\n\t<vType id="average_car" vClass="passenger" accel="3" decel="4.5" minGap="2.5" maxSpeed="45" />
+            \n'''
+VEHICLE = '    <vehicle id="%s_%i" type="average_car" route="%s" depart="%i" departLane="random" />\n'
+FOOTER = '</routes>\n'
+
+def _route_table():
+    '''
+    Flatten TURNS into lookup arrays indexed by destination and turn choice.
+    '''
+    n_turns = max(len(turns) for turns in TURNS.values())
+    bounds = np.ones((len(DEMAND), n_turns))
+    n_sources = np.ones((len(DEMAND), n_turns), dtype=np.int64)
+    offsets = np.zeros((len(DEMAND), n_turns), dtype=np.int64)
+    sources = []
+    for d, (destination, _) in enumerate(DEMAND):
+        for t, (bound, turn_sources) in enumerate(TURNS[destination]):
+            bounds[d, t] = bound
+            n_sources[d, t] = len(turn_sources)
+            offsets[d, t] = len(sources)
+            sources += turn_sources
+    return bounds, n_sources, offsets, sources
+
+def _randint_mask(rng):
+    '''
+    Smallest all-ones bit mask covering rng, as used by the legacy randint rejection sampling.
+    '''
+    mask = 0
+    while mask < rng:
+        mask = (mask << 1) | 1
+    return mask
+
 class TrafficGenerator:
-    def __init__(self, time_steps):
+    def __init__(self, time_steps, vectorized=False, demand_scale=1.0):
+        '''
+        With vectorized=False the route file is identical to the one drawn second by
+        second with np.random for the same seed. With vectorized=True all draws for
+        the whole horizon are made at once; the demand follows the same distribution
+        but the file differs from the sequential one. demand_scale multiplies the
+        arrival probabilities of DEMAND, e.g. 0.2 for night-level traffic.
+        '''
         self._timp_steps = time_steps
-        self._num_cars = 0
+        self._vectorized = vectorized
+        self._demand_scale = demand_scale
+        self._demand = [(destination, min(p * demand_scale, 1.0)) for destination, p in DEMAND]
+        self._bounds, self._n_sources, self._offsets, self._sources = _route_table()
+
+    def cache_key(self, seed):
+        '''
+        Key identifying the route file generated for a seed: it changes with the
+        seed, the horizon, the generation mode and the demand tables.
+        '''
+        demand = (seed, self._timp_steps, self._vectorized, DEMAND, TURNS, ROUTES)
+        if self._demand_scale != 1.0:
+            # keys of unscaled demand stay the same as before the scale existed
+            demand += (self._demand_scale,)
+        demand = repr(demand)
+        return hashlib.sha1(demand.encode()).hexdigest()
 
-    def generate_routefile(self, seed):
+    def generate_routefile(self, seed, route_file=ROUTE_FILE):
         '''
-        Generate the route file.
+        Generate the route file. A route_file ending in .gz is written gzip
+        compressed, which SUMO reads directly.
         '''
+        if self._vectorized:
+            vehicles = self._draw_vehicles_vectorized(seed)
+        else:
+            vehicles = self._draw_vehicles(seed)
+
+        lines = [HEADER]
+        lines += ['    <route id="%s" edges="%s" />\n' % route for route in ROUTES]
+        lines += [VEHICLE % (prefix, i, route, depart) for i, (prefix, route, depart) in enumerate(vehicles)]
+        lines.append(FOOTER)
 
+        if route_file.endswith('.gz'):
+            routes = gzip.open(route_file, 'wt', compresslevel=1)
+        else:
+            routes = open(route_file, 'w')
+        with routes:
+            routes.write(''.join(lines))
+
+    def _draw_vehicles(self, seed):
+        '''
+        Draw the vehicles one second at a time in the same order as np.random was
+        always called, so a seed gives the same demand as before.
+
+        Instead of calling np.random.uniform/randint per draw, a block of raw 32-bit
+        Mersenne Twister outputs is taken from the global generator and decoded the
+        way the legacy uniform (two words per double) and randint (one masked word
+        per attempt, rejecting values out of range) consume it. Afterwards the
+        global generator is left exactly where the per-call draws would leave it.
+        '''
         np.random.seed(seed)    # make tests reproducible
+        rng_state = np.random.get_state()
+
+        # every second draws one double per destination, arrivals draw one more
+        # double and at most a few words for the source
+        n_words = 2 * len(DEMAND) * self._timp_steps + 4096
+        while True:
+            words = np.random.randint(0, 2 ** 32, size=n_words, dtype=np.uint32)
+            vehicles, used = self._decode_words(words)
+            if vehicles is not None:
+                break
+            n_words *= 2
+            np.random.set_state(rng_state)
+
+        np.random.set_state(rng_state)
+        np.random.randint(0, 2 ** 32, size=used, dtype=np.uint32)
+        return vehicles
+
+    def _decode_words(self, words):
+        '''
+        Replay the sequential draws on a block of raw generator outputs. Returns
+        the vehicles and the number of words used, or (None, 0) if the block was
+        too short.
+        '''
+        # doubles[k] is the legacy uniform draw that starts at word k
+        high = (words >> np.uint32(5)).astype(np.float64)
+        low = (words >> np.uint32(6)).astype(np.float64)
+        doubles = ((high[:-1] * 67108864.0 + low[1:]) / 9007199254740992.0).tolist()
+        words = words.tolist()
+        n_words = len(doubles) - 1
+
+        demand = [(p, [(bound, sources, _randint_mask(len(sources) - 1)) for bound, sources in TURNS[destination]]) for destination, p in self._demand]
+        vehicles = []
+        pos = 0
+        for i in range(self._timp_steps):
+            for p, turns in demand:
+                if pos + 4 > n_words:
+                    return None, 0
+                u = doubles[pos]
+                pos += 2
+                if u < p:
+                    rl = doubles[pos]
+                    pos += 2
+                    for bound, sources, mask in turns:
+                        if rl < bound:
+                            break
+                    if len(sources) > 1:
+                        # choose a random source like np.random.randint(1, len(sources) + 1)
+                        while True:
+                            if pos >= n_words:
+                                return None, 0
+                            choice = words[pos] & mask
+                            pos += 1
+                            if choice < len(sources):
+                                break
+                        prefix, route = sources[choice]
+                    else:
+                        prefix, route = sources[0]
+                    vehicles.append((prefix, route, i))
+        return vehicles, pos
+
+    def _draw_vehicles_vectorized(self, seed):
+        '''
+        Draw arrivals, turn choices and sources for the whole horizon as arrays.
+        '''
+        rng = np.random.default_rng(seed)
+        p = np.array([p for _, p in self._demand])
+
+        # row-major order of the arrivals keeps vehicles sorted by departure and
+        # destination, like the sequential draws
+        departs, destinations = np.nonzero(rng.random((self._timp_steps, len(DEMAND))) < p)
+        turns = (rng.random(len(departs))[:, None] >= self._bounds[destinations]).sum(axis=1)
+        n_sources = self._n_sources[destinations, turns]
+        choices = self._offsets[destinations, turns] + (rng.random(len(departs)) * n_sources).astype(np.int64)
 
-        # demand per second for different destinations
-        pW1 = 1. / 10
-        pN1 = 1. / 14
-        pS1 = 1. / 14
-        pN2 = 1. / 17
-        pS2 = 1. / 17
-        pHN = 1. / 30
-        pHS = 1. / 25
-
-        with open('config/routes.rou.xml', 'w') as routes:
-            print('''<routes>\n\t<vType id="average_car" vClass="passenger" accel="3" decel="4.5" minGap="2.5" maxSpeed="45" />
-            ''', file=routes)
-
-            # routes leading to north highway
-            print('    <route id="W1_HN" edges="we1 we2 we3 we4 hwn" />', file=routes)
-            print('    <route id="N1_HN" edges="int1ns1 we2 we3 we4 hwn" />', file=routes)
-            print('    <route id="S1_HN" edges="int1sn1 we2 we3 we4 hwn" />', file=routes)
-            print('    <route id="N2_HN" edges="int2ns1 we3 we4 hwn" />', file=routes)
-            print('    <route id="S2_HN" edges="int2sn1 we3 we4 hwn" />', file=routes)
-
-            # routes leading to the south highway
-            print('    <route id="W1_HS" edges="we1 we2 we3 se1 hws" />', file=routes)
-            print('    <route id="N1_HS" edges="int1ns1 we2 we3 se1 hws" />', file=routes)
-            print('    <route id="S1_HS" edges="int1sn1 we2 we3 se1 hws" />', file=routes)
-            print('    <route id="N2_HS" edges="int2ns1 we3 se1 hws" />', file=routes)
-            print('    <route id="S2_HS" edges="int2sn1 we3 se1 hws" />', file=routes)
-
-            # routes leading to north road of intersection two
-            print('    <route id="W1_N2" edges="we1 we2 int2sn2" />', file=routes)
-            print('    <route id="N1_N2" edges="int1ns1 we2 int2sn2" />', file=routes)
-            print('    <route id="S1_N2" edges="int1sn1 we2 int2sn2" />', file=routes)
-            print('    <route id="S2_N2" edges="int2sn1 int2sn2" />', file=routes)
-            print('    <route id="HN_N2" edges="-hwn ew1 ew2 int2sn2" />', file=routes)
-            print('    <route id="HS_N2" edges="-hws nw1 ew2 int2sn2" />', file=routes)
-
-            # routes leading to south road of intersection two
-            print('    <route id="W1_S2" edges="we1 we2 int2ns2" />', file=routes)
-            print('    <route id="N1_S2" edges="int1ns1 we2 int2ns2" />', file=routes)
-            print('    <route id="S1_S2" edges="int1sn1 we2 int2ns2" />', file=routes)
-            print('    <route id="N2_S2" edges="int2ns1 int2ns2" />', file=routes)
-            print('    <route id="HN_S2" edges="-hwn ew1 ew2 int2ns2" />', file=routes)
-            print('    <route id="HS_S2" edges="-hws nw1 ew2 int2ns2" />', file=routes)
-
-            # routes leading to north road of intersection one
-            print('    <route id="W1_N1" edges="we1 int1sn2" />', file=routes)
-            print('    <route id="S1_N1" edges="int1sn1 int1sn2" />', file=routes)
-            print('    <route id="N2_N1" edges="int2ns1 ew3 int1sn2" />', file=routes)
-            print('    <route id="S2_N1" edges="int2sn1 ew3 int1sn2" />', file=routes)
-            print('    <route id="HN_N1" edges="-hwn ew1 ew2 ew3 int1sn2" />', file=routes)
-            print('    <route id="HS_N1" edges="-hws nw1 ew2 ew3 int1sn2" />', file=routes)
-
-            # routes leading to south road of intersection one
-            print('    <route id="W1_S1" edges="we1 int1ns2" />', file=routes)
-            print('    <route id="N1_S1" edges="int1ns1 int1ns2" />', file=routes)
-            print('    <route id="N2_S1" edges="int2ns1 ew3 int1ns2" />', file=routes)
-            print('    <route id="S2_S1" edges="int2sn1 ew3 int1ns2" />', file=routes)
-            print('    <route id="HN_S1" edges="-hwn ew1 ew2 ew3 int1ns2" />', file=routes)
-            print('    <route id="HS_S1" edges="-hws nw1 ew2 ew3 int1ns2" />', file=routes)
-
-            # routes leading to west road of intersection one
-            print('    <route id="N1_W1" edges="int1ns1 ew4" />', file=routes)
-            print('    <route id="S1_W1" edges="int1sn1 ew4" />', file=routes)
-            print('    <route id="N2_W1" edges="int2ns1 ew3 ew4" />', file=routes)
-            print('    <route id="S2_W1" edges="int2sn1 ew3 ew4" />', file=routes)
-            print('    <route id="HN_W1" edges="-hwn ew1 ew2 ew3 ew4" />', file=routes)
-            print('    <route id="HS_W1" edges="-hws nw1 ew2 ew3 ew4" />', file=routes)
-        
-            for i in range(self._timp_steps):
-                # destination is west road of intersection one
-                if np.random.uniform() < pW1:
-                    rl = np.random.uniform()
-                    if rl < 0.25:  # take a route with a left turn 
-                        route_choice = np.random.randint(1, 4)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="S1_W1_%i" type="average_car" route="N1_W1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="S2_W1_%i" type="average_car" route="N2_W1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 3:
-                            print('    <vehicle id="HS_W1_%i" type="average_car" route="N2_W1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        self._num_cars += 1
-                    else: # take one of the reamining routes
-                        route_choice = np.random.randint(1, 4)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="N1_W1_%i" type="average_car" route="N1_W1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="N2_W1_%i" type="average_car" route="N2_W1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 3:
-                            print('    <vehicle id="HN_W1_%i" type="average_car" route="N2_W1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-
-                # destination is north road of intersection one
-                if np.random.uniform() < pN1:
-                    rls = np.random.uniform()
-                    if rls < 0.25:  # take a route with a left turn 
-                        route_choice = np.random.randint(1, 4)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="W1_N1_%i" type="average_car" route="W1_N1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="S2_N1_%i" type="average_car" route="S2_N1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 3:
-                            print('    <vehicle id="HS_N1_%i" type="average_car" route="HS_N1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        self._num_cars += 1
-                    elif rls < 0.55: # take one of the remaining routes with a right turn 
-                        route_choice = np.random.randint(1, 3)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="N2_N1_%i" type="average_car" route="N2_N1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="HN_N1_%i" type="average_car" route="HN_N1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    else: # take the remaining route with no turns
-                        print('    <vehicle id="S1_N1_%i" type="average_car" route="S1_N1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-
-                # destination is south road of intersection one
-                if np.random.uniform() < pS1:
-                    rls = np.random.uniform()
-                    if rls < 0.25:  # take a route with a left turn 
-                        route_choice = np.random.randint(1, 5)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="N2_S1_%i" type="average_car" route="N2_S1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="S2_S1_%i" type="average_car" route="S2_S1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 3:
-                            print('    <vehicle id="HS_S1_%i" type="average_car" route="HS_S1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        elif route_choice == 4:
-                            print('    <vehicle id="HN_S1_%i" type="average_car" route="HN_S1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        self._num_cars += 1
-                    elif rls < 0.55: # take one of the remaining routes with a right turn 
-                        print('    <vehicle id="W1_S1_%i" type="average_car" route="W1_S1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    else: # take the remaining route with no turns
-                        print('    <vehicle id="N1_S1_%i" type="average_car" route="N1_S1" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-
-                # destination is north road of intersection two
-                if np.random.uniform() < pN2:
-                    rls = np.random.uniform()
-                    if rls < 0.25:  # take a route with a left turn 
-                        route_choice = np.random.randint(1, 5)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="W1_N2_%i" type="average_car" route="W1_N2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="N1_N2_%i" type="average_car" route="N1_N2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 3:
-                            print('    <vehicle id="S1_N2_%i" type="average_car" route="S1_N2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        elif route_choice == 4:
-                            print('    <vehicle id="HS_N2_%i" type="average_car" route="HS_N2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        self._num_cars += 1
-                    elif rls < 0.55: # take one of the remaining routes with a right turn 
-                        print('    <vehicle id="HN_N2_%i" type="average_car" route="HN_N2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    else: # take the remaining route with no turns
-                        print('    <vehicle id="S2_N2_%i" type="average_car" route="S2_N2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-
-                # destination is south road of intersection two
-                if np.random.uniform() < pS2:
-                    rls = np.random.uniform()
-                    if rls < 0.25:  # take a route with a left turn 
-                        route_choice = np.random.randint(1, 4)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="N1_S2_%i" type="average_car" route="N1_S2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="HN_S2_%i" type="average_car" route="HN_S2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 3:
-                            print('    <vehicle id="HS_S2_%i" type="average_car" route="HS_S2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)                        
-                        self._num_cars += 1
-                    elif rls < 0.55: # take one of the remaining routes with a right turn
-                        route_choice = np.random.randint(1, 3)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="W1_S2_%i" type="average_car" route="W1_S2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="S1_S2_%i" type="average_car" route="S1_S2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    else: # take the remaining route with no turns
-                        print('    <vehicle id="N2_S2_%i" type="average_car" route="N2_S2" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-
-                # destination is the north highway
-                if np.random.uniform() < pHN:
-                    rls = np.random.uniform()
-                    if rls < 0.25:  # take a route with a left turn not including turn to enter highway
-                        route_choice = np.random.randint(1, 3)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="N1_HN_%i" type="average_car" route="N1_HN" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="N2_HN_%i" type="average_car" route="N2_HN" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    elif rls < 0.55: # take one of the remaining routes with a right turn
-                        route_choice = np.random.randint(1, 3)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="S1_HN_%i" type="average_car" route="S1_HN" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="S2_HN_%i" type="average_car" route="S2_HN" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    else: # take the route with only turn being turn into highway
-                        print('    <vehicle id="W1_HN_%i" type="average_car" route="W1_HN" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-
-                # destination is the south highway
-                if np.random.uniform() < pHS:
-                    rls = np.random.uniform()
-                    if rls < 0.25:  # take a route with a left turn
-                        route_choice = np.random.randint(1, 3)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="N1_HS_%i" type="average_car" route="N1_HS" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="N2_HS_%i" type="average_car" route="N2_HS" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    elif rls < 0.55: # take one of the remaining routes with a right turn
-                        route_choice = np.random.randint(1, 3)   # choose a random source
-                        if route_choice == 1:
-                            print('    <vehicle id="S1_HS_%i" type="average_car" route="S1_HS" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        elif route_choice == 2:
-                            print('    <vehicle id="S2_HS_%i" type="average_car" route="S2_HS" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-                    else: # take the route with only turn being turn into highway
-                        print('    <vehicle id="W1_HS_%i" type="average_car" route="W1_HS" depart="%i" departLane="random" />' % (self._num_cars, i), file=routes)
-                        self._num_cars += 1
-  
-            print('</routes>', file=routes)
-        
-        self._num_cars = 0
\ No newline at end of file
+        sources = self._sources
+        return [sources[c] + (d,) for c, d in zip(choices.tolist(), departs.tolist())]
@@ -0,0 +1,131 @@
+import collections
+import math
+import numpy as np
+import traci.constants as tc
+
+# induction loops are placed this far into the first lane of a highway edge
+DETECTOR_POSITION = 5.0
+# the detectors aggregate over one interval that outlasts any episode
+DETECTOR_PERIOD = 1000000000
+SPEED_BIN = 0.1
+MAX_SPEED = 70.0
+
+def write_detector_file(file_name, lanes):
+    '''
+    Write a SUMO additional file with an induction loop near the start of each of
+    the lanes, given as (lane id, length) pairs. The loops write no output file,
+    they are read over TraCI.
+    '''
+    with open(file_name, 'w') as f:
+        f.write('<additional>\n')
+        for lane_id, length in lanes:
+            f.write('    <inductionLoop id="%s" lane="%s" pos="%.2f" period="%i" file="NUL"/>\n'
+                % (detector_id(lane_id), lane_id, min(DETECTOR_POSITION, length / 2), DETECTOR_PERIOD))
+        f.write('</additional>\n')
+
+def detector_id(lane_id):
+    return 'speed_' + lane_id
+
+class HighwaySpeedStats:
+    def __init__(self, start_time=0, window=3600):
+        '''
+        Streaming statistics of the speeds measured by the highway detectors, in
+        constant memory however long the episode. The detectors only report the
+        mean speed of the vehicles of every read interval, so the histogram of
+        SPEED_BIN wide bins up to MAX_SPEED holds interval means, weighted by
+        their vehicles, and its percentiles are those of the interval means to
+        within a bin, not of individual vehicle speeds. The flow is the number of vehicles per hour over the last
+        window seconds, from the counts of the reads in that window.
+        '''
+        self.start_time = start_time
+        self.window = window
+        self.count = 0
+        self.total = 0.0
+        self.histogram = np.zeros(int(MAX_SPEED / SPEED_BIN) + 1, dtype=np.int64)
+        # (time, vehicles) of the reads in the window, at most one per decision
+        self._recent = collections.deque()
+        self._recent_count = 0
+
+    def add(self, time, speed, count):
+        '''
+        Record count vehicles that passed a detector up to time at the mean speed speed.
+        '''
+        if count <= 0:
+            return
+        self.count += count
+        self.total += speed * count
+        self.histogram[min(int(speed / SPEED_BIN), len(self.histogram) - 1)] += count
+        self._recent.append((time, count))
+        self._recent_count += count
+        while self._recent[0][0] <= time - self.window:
+            self._recent_count -= self._recent.popleft()[1]
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def percentile(self, q):
+        '''
+        The interval mean speed below which the intervals of q percent (0-100) of the
+        vehicles fall, as the middle of its bin.
+        '''
+        if not self.count:
+            return math.nan
+        rank = q / 100 * (self.count - 1)
+        index = int(np.searchsorted(np.cumsum(self.histogram), rank, side='right'))
+        return (index + 0.5) * SPEED_BIN
+
+    def flow(self, time):
+        '''
+        Vehicles per hour over the window before time, or since the start if it is shorter.
+        '''
+        seconds = min(self.window, time - self.start_time)
+        return self._recent_count * 3600 / seconds if seconds > 0 else math.nan
+
+class HighwaySpeedDetectors:
+    def __init__(self, lane_ids, use_subscriptions=False):
+        '''
+        Reads the induction loops on the lanes once per decision. Each loop reports
+        the number of vehicles that passed it and their mean speed since the start
+        of the simulation; the difference to the previous read is the vehicles
+        that passed in between and their mean speed, so no per-vehicle query is
+        needed and the simulation steps in between can run in bulk.
+        '''
+        self.detector_ids = [detector_id(lane_id) for lane_id in lane_ids]
+        self.use_subscriptions = use_subscriptions
+
+    def start(self, connection, stats):
+        '''
+        Take the current counts as the baseline of a new episode, which leaves out
+        the vehicles of a warm start, and send the measured speeds to stats.
+        '''
+        self._connection = connection
+        self.stats = stats
+        if self.use_subscriptions:
+            for detector in self.detector_ids:
+                connection.inductionloop.subscribe(detector, [tc.VAR_INTERVAL_NUMBER, tc.VAR_INTERVAL_SPEED])
+        self._previous = self._totals()
+
+    def _totals(self):
+        '''
+        Vehicles and the sum of their speeds of every detector.
+        '''
+        totals = []
+        if self.use_subscriptions:
+            results = self._connection.inductionloop.getAllSubscriptionResults()
+            for detector in self.detector_ids:
+                count = results[detector][tc.VAR_INTERVAL_NUMBER]
+                totals.append((count, results[detector][tc.VAR_INTERVAL_SPEED] * count if count else 0.0))
+        else:
+            loops = self._connection.inductionloop
+            for detector in self.detector_ids:
+                count = loops.getIntervalVehicleNumber(detector)
+                totals.append((count, loops.getIntervalMeanSpeed(detector) * count if count else 0.0))
+        return totals
+
+    def read(self, time):
+        totals = self._totals()
+        for (count, speed_sum), (previous_count, previous_speed_sum) in zip(totals, self._previous):
+            count -= previous_count
+            if count > 0:
+                self.stats.add(time, (speed_sum - previous_speed_sum) / count, count)
+        self._previous = totals
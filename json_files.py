@@ -0,0 +1,19 @@
+import json
+import os
+
+def write_json(file_name, value, indent=None):
+    '''
+    Write value to a JSON file atomically and durably: it is written to a
+    temporary file, synced to disk and renamed, so a reader or a crash never
+    leaves half of it.
+    '''
+    tmp_file = file_name + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(value, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file_name)
+
+def read_json(file_name):
+    with open(file_name) as f:
+        return json.load(f)
@@ -0,0 +1,134 @@
+import json
+import math
+import os
+import queue
+import threading
+import numpy as np
+
+class MetricsWriter:
+    def __init__(self, file_name, log_file_name=None):
+        '''
+        Appends one JSON line per episode to file_name from a background thread,
+        so the training loop only puts the record on a queue. Every line is
+        flushed and synced to disk as soon as it is written; after a crash the
+        file holds every finished episode. With log_file_name the episode is
+        also appended to the plain text training log. An error writing a record
+        is raised again by the next call of write, flush or close.
+        '''
+        self.file_name = file_name
+        self.log_file_name = log_file_name
+        self._error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_records, daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        self._raise_error()
+        self._queue.put(dict(record))
+
+    def flush(self):
+        '''
+        Wait until every record written so far is on disk.
+        '''
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        '''
+        Write the queued records and stop the writer thread.
+        '''
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _write_records(self):
+        with open(self.file_name, 'a') as f:
+            while True:
+                record = self._queue.get()
+                try:
+                    if record is None:
+                        return
+                    self._write_record(f, record)
+                except Exception as e:
+                    # kept for the training loop, which gets it on its next call; the
+                    # thread goes on taking records, so flush and close never hang
+                    if self._error is None:
+                        self._error = e
+                finally:
+                    self._queue.task_done()
+
+    def _write_record(self, f, record):
+        line = json.dumps(record) + '\n'
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        if self.log_file_name is not None:
+            with open(self.log_file_name, 'a') as log:
+                log.write('episode: ' + str(record['episode']) + ',  Average Staying Time Per Vehicle: ' + str(record['average_staying_time_per_vehicle']) + ', Average Reward Per Episode: ' + str(record['average_reward']) + '\n')
+
+def read_metrics(file_name):
+    '''
+    The records of a metrics file as a list of dicts. A last line cut off by a crash is skipped.
+    '''
+    records = []
+    with open(file_name) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+def truncate_metrics(file_name, log_file_name, first_episode):
+    '''
+    Drop the records of first_episode and later from a metrics file and its
+    training log, e.g. the episodes after the checkpoint a run resumes from,
+    which are run and recorded again.
+    '''
+    if os.path.exists(file_name):
+        records = [r for r in read_metrics(file_name) if r['episode'] < first_episode]
+        _replace_lines(file_name, [json.dumps(r) + '\n' for r in records])
+    if log_file_name is not None and os.path.exists(log_file_name):
+        with open(log_file_name) as f:
+            lines = [line for line in f if not (line.startswith('episode: ') and int(line[len('episode: '):line.index(',')]) >= first_episode)]
+        _replace_lines(log_file_name, lines)
+
+def _replace_lines(file_name, lines):
+    # written to a temporary file and renamed, so a crash leaves the old or the new file
+    tmp_file = file_name + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file_name)
+
+def to_columns(records):
+    '''
+    The records as one float64 array per field, NaN where a record lacks the field.
+    '''
+    names = []
+    for record in records:
+        for name in record:
+            if name not in names:
+                names.append(name)
+    columns = {}
+    for name in names:
+        values = [record.get(name) for record in records]
+        columns[name] = np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+    return columns
+
+def write_columnar(file_name, output_file_name=None):
+    '''
+    Convert a metrics file to a columnar .npz file with one array per field and
+    return its name. Defaults to the metrics file name with .npz instead of .jsonl.
+    '''
+    if output_file_name is None:
+        output_file_name = os.path.splitext(file_name)[0] + '.npz'
+    np.savez(output_file_name, **to_columns(read_metrics(file_name)))
+    return output_file_name
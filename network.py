@@ -0,0 +1,89 @@
+import gzip
+import os
+import xml.etree.ElementTree as ET
+
+def _parse(file_name):
+    if file_name.endswith('.gz'):
+        with gzip.open(file_name) as f:
+            return ET.parse(f).getroot()
+    return ET.parse(file_name).getroot()
+
+def net_file(sumocfg_path):
+    '''
+    Path of the network file a SUMO configuration uses.
+    '''
+    config = _parse(sumocfg_path)
+    return os.path.join(os.path.dirname(sumocfg_path), config.find('input/net-file').get('value'))
+
+def read_edges(net_file_name):
+    '''
+    Length and highest lane speed limit of every normal edge of a network, as
+    {edge id: (length, speed)}. Internal junction edges are left out.
+    '''
+    edges = {}
+    for edge in _parse(net_file_name).iter('edge'):
+        if edge.get('function') == 'internal':
+            continue
+        lanes = edge.findall('lane')
+        edges[edge.get('id')] = (float(lanes[0].get('length')), max(float(lane.get('speed')) for lane in lanes))
+    return edges
+
+def read_lanes(net_file_name):
+    '''
+    The lanes of every normal edge of a network, as {edge id: [(lane id, length),
+    ...]} in lane index order.
+    '''
+    lanes = {}
+    for edge in _parse(net_file_name).iter('edge'):
+        if edge.get('function') != 'internal':
+            ordered = sorted((int(lane.get('index')), lane.get('id'), float(lane.get('length'))) for lane in edge.findall('lane'))
+            lanes[edge.get('id')] = [(lane_id, length) for _, lane_id, length in ordered]
+    return lanes
+
+def read_lane_table(net_file_name):
+    '''
+    The incoming lanes of every traffic light of a network, as {tls id: {edge id:
+    [(lane id, length), ...]}} with the edges in the order of their first link
+    index and the lanes of an edge in index order. Every lane of an edge is
+    listed, also one without a link of the traffic light.
+    '''
+    lanes = read_lanes(net_file_name)
+    links = {}
+    for connection in _parse(net_file_name).iter('connection'):
+        if connection.get('tl') is not None:
+            links.setdefault(connection.get('tl'), []).append((int(connection.get('linkIndex')), connection.get('from')))
+    table = {}
+    for tls_id, tls_links in links.items():
+        table[tls_id] = {}
+        for _, edge in sorted(tls_links):
+            if edge not in table[tls_id]:
+                table[tls_id][edge] = lanes[edge]
+    return table
+
+def read_departures(route_file_name):
+    '''
+    The vehicles of a route file as {vehicle id: (depart, route edges)}.
+    '''
+    root = _parse(route_file_name)
+    routes = {route.get('id'): tuple(route.get('edges').split()) for route in root.iter('route')}
+    return {vehicle.get('id'): (float(vehicle.get('depart')), routes[vehicle.get('route')]) for vehicle in root.iter('vehicle')}
+
+def read_links(net_file_name, tls_id):
+    '''
+    The links of a traffic light as [(from edge, from lane index, to edge)] by link index.
+    '''
+    links = {}
+    for connection in _parse(net_file_name).iter('connection'):
+        if connection.get('tl') == tls_id:
+            links[int(connection.get('linkIndex'))] = (connection.get('from'), int(connection.get('fromLane')), connection.get('to'))
+    return [links[i] for i in range(len(links))]
+
+def read_phases(net_file_name, tls_id):
+    '''
+    The phases of the static program of a traffic light as [(duration, state)],
+    with one state character per link.
+    '''
+    for tl_logic in _parse(net_file_name).iter('tlLogic'):
+        if tl_logic.get('id') == tls_id:
+            return [(float(phase.get('duration')), phase.get('state')) for phase in tl_logic.iter('phase')]
+    raise ValueError('no traffic light %s in %s' % (tls_id, net_file_name))
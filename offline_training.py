@@ -0,0 +1,74 @@
+'''
+Train a DQNAgent on transitions recorded with training_simulation.py
+--record-transitions, without running the simulation:
+
+    python training_simulation.py --record-transitions transitions
+    python offline_training.py transitions checkpoints --gradient-steps 100000
+
+The batches are sampled uniformly from all recorded transitions and read by a
+background thread while the agent trains. The checkpoints can be exported with
+policy_export.py.
+'''
+import argparse
+import time
+import torch
+from dqn import DQNAgent
+from checkpoint import Checkpointer
+from transitions import TransitionDataset, PrefetchLoader
+
+def train_offline(agent, loader, gradient_steps, target_update_interval=100, log_interval=1000, checkpointer=None, checkpoint_interval=None):
+    '''
+    Run gradient_steps updates of the agent on batches from the loader and
+    return the updates per second. A checkpoint is saved every checkpoint_interval
+    updates, numbered by the checkpoint, and after the last.
+    '''
+    start_time = time.perf_counter()
+    log_time = start_time
+    for step in range(1, gradient_steps + 1):
+        agent.train_batch(*loader.next())
+        if step % target_update_interval == 0:
+            agent.update_target_model()
+        if step % log_interval == 0:
+            now = time.perf_counter()
+            print('%i updates, %.0f updates/sec' % (step, log_interval / (now - log_time)))
+            log_time = now
+        if checkpointer and (step % checkpoint_interval == 0 or step == gradient_steps):
+            checkpointer.save(agent, (step - 1) // checkpoint_interval, extra={'gradient_steps': step})
+    return gradient_steps / (time.perf_counter() - start_time)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('transitions_dir', help='directory of the recorded transitions')
+    parser.add_argument('checkpoint_dir', help='directory agent checkpoints are written to')
+    parser.add_argument('--gradient-steps', type=int, default=100000, help='updates to train for')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--target-update-interval', type=int, default=100, help='updates between target network updates')
+    parser.add_argument('--checkpoint-interval', type=int, default=10000, help='updates between checkpoints')
+    parser.add_argument('--prefetch', type=int, default=4, help='batches read ahead of training')
+    parser.add_argument('--in-memory', action='store_true', help='load the transitions into memory instead of reading them from the shards')
+    parser.add_argument('--compile-step', action='store_true', help='run the TD update compiled with torch.compile')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    dataset = TransitionDataset(args.transitions_dir, args.in_memory)
+    print('%i transitions of %i episodes in %i shards' % (len(dataset), len({(e['episode'], e['seed']) for e in dataset.episodes}), len(dataset.shards)))
+    # the hyperparameters of training_simulation.py; the replay memory stays empty
+    agent = DQNAgent(
+        state_size=dataset.state_size,
+        action_size=2,
+        gamma=0.95,
+        epsilon=0.1,
+        learning_rate=0.0002,
+        update_rate=0.001,
+        memory_size=1,
+        compile_step=args.compile_step)
+    loader = PrefetchLoader(dataset, args.batch_size, args.prefetch, args.seed)
+    checkpointer = Checkpointer(args.checkpoint_dir)
+    try:
+        rate = train_offline(agent, loader, args.gradient_steps, args.target_update_interval,
+            checkpointer=checkpointer, checkpoint_interval=args.checkpoint_interval)
+    finally:
+        loader.close()
+        checkpointer.wait()
+    print('%.0f updates/sec' % rate)
@@ -0,0 +1,88 @@
+'''
+Plot a training metrics file written by MetricsWriter to PNG files, without a display.
+
+    python plot_metrics.py log.metrics.jsonl
+'''
+import argparse
+import os
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from metrics import read_metrics, to_columns
+
+def _members(columns):
+    '''
+    The label and row mask of every ensemble member in the columns, or of all rows
+    if they come from a single agent.
+    '''
+    if 'member' not in columns:
+        return [(None, np.ones(len(columns['episode']), dtype=bool))]
+    return [('member %i' % m, columns['member'] == m) for m in np.unique(columns['member'])]
+
+def plot(file_name, output_dir=None):
+    '''
+    Save the reward, staying time and highway speed curves of a metrics file and
+    return the names of the images.
+    '''
+    if output_dir is None:
+        output_dir = os.path.dirname(os.path.abspath(file_name))
+    base = os.path.join(output_dir, os.path.splitext(os.path.basename(file_name))[0])
+    columns = to_columns(read_metrics(file_name))
+    if not columns:
+        return []
+    episodes = columns['episode']
+    members = _members(columns)
+    images = []
+
+    fig, ax = plt.subplots()
+    for label, rows in members:
+        ax.plot(episodes[rows], columns['average_reward'][rows], label=label)
+    ax.set_title('Average Reward Per Episode')
+    ax.set_xlabel('Episode')
+    ax.set_ylabel('Average Reward')
+    if len(members) > 1:
+        ax.legend()
+    images.append(base + '.reward.png')
+    fig.savefig(images[-1])
+    plt.close(fig)
+
+    fig, ax = plt.subplots()
+    if len(members) > 1:
+        for label, rows in members:
+            ax.plot(episodes[rows], columns['average_staying_time_per_vehicle'][rows], label=label)
+    else:
+        ax.plot(episodes, columns['average_staying_time_per_vehicle'], label='mean')
+    if 'staying_time_p50' in columns and len(members) == 1:
+        ax.plot(episodes, columns['staying_time_p50'], label='median')
+        ax.fill_between(episodes, columns['staying_time_p50'], columns['staying_time_p90'], alpha=0.3, label='median to p90')
+    ax.set_title('Average Staying Time Per Vehicle Per Episode')
+    ax.set_xlabel('Episode')
+    ax.set_ylabel('Average Staying Time Per Vehicle')
+    ax.legend()
+    images.append(base + '.staying_time.png')
+    fig.savefig(images[-1])
+    plt.close(fig)
+
+    if 'average_highway_speed' in columns:
+        fig, ax = plt.subplots()
+        for label, rows in members:
+            ax.plot(episodes[rows], columns['average_highway_speed'][rows], label=label)
+        ax.set_title('Average Highway Speed Per Episode')
+        ax.set_xlabel('Episode')
+        ax.set_ylabel('Average Highway Speed (m/s)')
+        if len(members) > 1:
+            ax.legend()
+        images.append(base + '.highway_speed.png')
+        fig.savefig(images[-1])
+        plt.close(fig)
+
+    return images
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_name', help='metrics file written during training')
+    parser.add_argument('--output-dir', help='directory the images are saved to, by default the one of the metrics file')
+    args = parser.parse_args()
+    for image in plot(args.file_name, args.output_dir):
+        print(image)
@@ -0,0 +1,160 @@
+'''
+Export a trained DQN for serving, and load it again without the training code.
+
+    python policy_export.py --checkpoint-dir checkpoints --output policy.pt
+    python policy_export.py --checkpoint-dir checkpoints --output policy.pt --quantize
+    python policy_export.py --checkpoint-dir checkpoints --output policy.onnx
+    python policy_export.py --checkpoint-dir checkpoints --output policy.npz
+
+The format follows the extension: .pt is TorchScript, .onnx is ONNX (needs the
+onnx package to export and onnxruntime to serve), .npz holds the weights for the
+NumPy runtime. --quantize stores int8 dynamically quantized linear layers and
+is only available for TorchScript.
+'''
+import argparse
+import copy
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+
+def input_size(model):
+    '''
+    The width of the model input: the state, and for a SharedDQN the intersection
+    index column its embedding takes in place of embedding_dim inputs of fc1.
+    '''
+    if hasattr(model, 'embedding'):
+        return model.fc1.in_features - model.embedding.embedding_dim + 1
+    return model.fc1.in_features
+
+def export_policy(model, path, quantize=False):
+    '''
+    Write the model to path in the format its extension names.
+    '''
+    # a copy, so exporting does not move the network of a training agent off its device
+    model = copy.deepcopy(model).cpu().eval()
+    state_size = input_size(model)
+    example = torch.zeros(1, state_size)
+    extension = os.path.splitext(path)[1]
+    if quantize and extension != '.pt':
+        raise ValueError('int8 quantization is only supported for TorchScript (.pt) exports')
+
+    if extension == '.pt':
+        if quantize:
+            from torch.ao.quantization import quantize_dynamic
+            model = quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        with torch.no_grad():
+            # traced graphs, quantized ones in particular, do not expose the input size, so it is stored alongside
+            torch.jit.save(torch.jit.trace(model, example), path, _extra_files={'state_size': str(state_size)})
+    elif extension == '.onnx':
+        torch.onnx.export(model, (example,), path, input_names=['state'], output_names=['q_values'], dynamo=False)
+    elif extension == '.npz':
+        if hasattr(model, 'embedding'):
+            raise ValueError('the NumPy runtime only serves the plain DQN')
+        np.savez(path, **{name: p.detach().numpy() for name, p in model.state_dict().items()})
+    else:
+        raise ValueError("unknown policy format '%s', expected .pt, .onnx or .npz" % extension)
+
+class TorchScriptPolicy:
+    def __init__(self, path):
+        extra_files = {'state_size': ''}
+        self.model = torch.jit.load(path, _extra_files=extra_files).eval()
+        self._input = torch.zeros(1, int(extra_files['state_size']))
+        # writing an observation into this array fills the model input in place
+        self.observation = self._input.numpy()[0]
+
+    def act(self):
+        with torch.inference_mode():
+            return int(self.model(self._input).argmax())
+
+class OnnxPolicy:
+    def __init__(self, path):
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        state_size = self.session.get_inputs()[0].shape[1]
+        self._input = np.zeros((1, state_size), dtype=np.float32)
+        self.observation = self._input[0]
+        self._feed = {'state': self._input}
+
+    def act(self):
+        return int(self.session.run(None, self._feed)[0].argmax())
+
+class NumpyPolicy:
+    def __init__(self, path):
+        '''
+        The DQN forward pass in NumPy with every intermediate result written into
+        a preallocated buffer, so deciding allocates no arrays.
+        '''
+        weights = np.load(path)
+        self.w1 = np.ascontiguousarray(weights['fc1.weight'].T)
+        self.b1 = weights['fc1.bias']
+        self.w2 = np.ascontiguousarray(weights['fc2.weight'].T)
+        self.b2 = weights['fc2.bias']
+        self.w3 = np.ascontiguousarray(weights['fc3.weight'].T)
+        self.b3 = weights['fc3.bias']
+        self.observation = np.zeros(self.w1.shape[0], dtype=np.float32)
+        self._h1 = np.zeros(self.w1.shape[1], dtype=np.float32)
+        self._h2 = np.zeros(self.w2.shape[1], dtype=np.float32)
+        self._q = np.zeros(self.w3.shape[1], dtype=np.float32)
+
+    def act(self):
+        np.dot(self.observation, self.w1, out=self._h1)
+        self._h1 += self.b1
+        np.maximum(self._h1, 0, out=self._h1)
+        np.dot(self._h1, self.w2, out=self._h2)
+        self._h2 += self.b2
+        np.maximum(self._h2, 0, out=self._h2)
+        np.dot(self._h2, self.w3, out=self._q)
+        self._q += self.b3
+        return int(self._q.argmax())
+
+def load_policy(path):
+    '''
+    The serving runtime for an exported policy. Write the observation into its
+    observation array and call act() for the greedy action.
+    '''
+    extension = os.path.splitext(path)[1]
+    if extension == '.pt':
+        return TorchScriptPolicy(path)
+    if extension == '.onnx':
+        return OnnxPolicy(path)
+    if extension == '.npz':
+        return NumpyPolicy(path)
+    raise ValueError("unknown policy format '%s', expected .pt, .onnx or .npz" % extension)
+
+def action_agreement(model, policy, states):
+    '''
+    Fraction of the states for which the policy picks the greedy action of the model.
+    '''
+    with torch.no_grad():
+        expected = model(torch.from_numpy(np.asarray(states, dtype=np.float32))).argmax(dim=1).numpy()
+    matches = 0
+    for state, action in zip(states, expected):
+        policy.observation[:] = state
+        matches += policy.act() == action
+    return matches / len(states)
+
+if __name__ == '__main__':
+    from checkpoint import load_checkpoint_agent
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint-dir', required=True, help='directory of the training checkpoints, the latest is exported')
+    parser.add_argument('--output', required=True, help='policy file, .pt, .onnx or .npz')
+    parser.add_argument('--quantize', action='store_true', help='int8 dynamic quantization of the linear layers')
+    args = parser.parse_args()
+
+    try:
+        agent = load_checkpoint_agent(args.checkpoint_dir)
+    except (ValueError, RuntimeError) as e:
+        parser.error('cannot load the checkpoint: %s' % e)
+    if agent is None:
+        parser.error('no checkpoint in %s' % args.checkpoint_dir)
+    export_policy(agent.model, args.output, args.quantize)
+
+    rng = np.random.default_rng(0)
+    states = rng.integers(0, 40, (10000, input_size(agent.model))).astype(np.float32)
+    if hasattr(agent.model, 'embedding'):
+        # the last column of a shared network's input is the index of the intersection
+        states[:, -1] = rng.integers(0, agent.model.embedding.num_embeddings, len(states))
+    print('actions matching the trained network: %.4f' % action_agreement(agent.model.cpu(), load_policy(args.output), states))
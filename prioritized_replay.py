@@ -0,0 +1,134 @@
+import json
+import os
+import numpy as np
+from replay_memory import ReplayMemory
+
+class SumTree:
+    def __init__(self, capacity):
+        '''
+        Binary tree in a flat array whose leaves hold one priority per memory slot
+        and whose inner nodes hold the sum of their children; node i has the
+        children 2i and 2i + 1 and the root is node 1. Updates and lookups take
+        O(log n) and both work on whole batches of indices at once.
+        '''
+        self.capacity = capacity
+        self.leaves = 1 << max(capacity - 1, 0).bit_length()
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.leaves]
+
+    def update(self, indices, priorities):
+        '''
+        Set the priorities of the slots at indices; for a repeated index the last one wins.
+        '''
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            # a parent shared by several nodes is recomputed once per node, always to the same sum
+            nodes >>= 1
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        '''
+        The slots whose prefix sum interval contains each of the values.
+        '''
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        tree = self.tree
+        for _ in range(self.depth):
+            nodes <<= 1
+            left_sums = tree[nodes]
+            right = values >= left_sums
+            values -= left_sums * right
+            nodes += right
+        return nodes - self.leaves
+
+class PrioritizedReplayMemory(ReplayMemory):
+    def __init__(self, capacity, state_size, alpha=0.6, beta=0.4, beta_annealing_samples=100000, epsilon=1e-6, seed=None):
+        '''
+        ReplayMemory that samples transitions with probability proportional to
+        priority ** alpha, where the priority is the absolute TD error of the
+        last update of the transition plus epsilon. New transitions get the
+        highest priority seen so far. sample also returns the importance
+        sampling weights, with beta growing linearly to 1 over
+        beta_annealing_samples batches, normalised by the largest weight of the
+        batch, and the indices update_priorities takes the new TD errors for.
+        '''
+        super().__init__(capacity, state_size, seed)
+        self.alpha = alpha
+        self.beta_start = beta
+        self.beta_annealing_samples = beta_annealing_samples
+        self.epsilon = epsilon
+        self.samples = 0
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    @property
+    def beta(self):
+        return min(1.0, self.beta_start + (1.0 - self.beta_start) * self.samples / self.beta_annealing_samples)
+
+    def push(self, state, action, reward, next_state, done):
+        i = self.position
+        super().push(state, action, reward, next_state, done)
+        self.tree.update([i], self.max_priority ** self.alpha)
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        indices = (self.position + np.arange(len(actions))) % self.capacity
+        super().push_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(indices, self.max_priority ** self.alpha)
+
+    def sample(self, batch_size):
+        '''
+        Sample a batch with one value drawn from each of batch_size equal parts of
+        the total priority. Returns the transitions, the weights and the indices.
+        '''
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        # rounding in the inner sums can step past the last filled slot
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        probabilities = self.tree.get(indices) / total
+        weights = (self.size * probabilities) ** -self.beta
+        weights = (weights / weights.max()).astype(np.float32)
+        self.samples += 1
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices],
+            weights,
+            indices
+        )
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def snapshot(self):
+        arrays, meta = super().snapshot()
+        arrays['priorities'] = self.tree.get(np.arange(self.size))
+        meta.update(alpha=self.alpha, beta=self.beta_start, beta_annealing_samples=self.beta_annealing_samples,
+            epsilon=self.epsilon, samples=self.samples, max_priority=self.max_priority)
+        return arrays, meta
+
+    @classmethod
+    def load(cls, directory):
+        memory = super().load(directory)
+        with open(os.path.join(directory, 'memory.json')) as f:
+            meta = json.load(f)
+        memory.alpha = meta['alpha']
+        memory.beta_start = meta['beta']
+        memory.beta_annealing_samples = meta['beta_annealing_samples']
+        memory.epsilon = meta['epsilon']
+        memory.samples = meta['samples']
+        memory.max_priority = meta['max_priority']
+        memory.tree = SumTree(memory.capacity)
+        memory.tree.update(np.arange(memory.size), np.load(os.path.join(directory, 'priorities.npy')))
+        return memory
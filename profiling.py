@@ -0,0 +1,198 @@
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self._profiler.times[self._name] += time.perf_counter() - self._start
+        self._profiler.calls[self._name] += 1
+
+class Profiler:
+    def __init__(self):
+        '''
+        Wall time and call count per named stage plus free counters, collected
+        per episode. TrafficEnv and DQNAgent take one as profiler=; without it
+        they use NULL_PROFILER, which does nothing.
+        '''
+        self.enabled = True
+        self._stages = {}
+        self.reset()
+
+    def reset(self):
+        '''
+        Start a new episode.
+        '''
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        '''
+        Context manager adding the time spent in it to the stage called name.
+        '''
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self, name)
+        return stage
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def summary(self, episode, sim_seconds):
+        '''
+        The measurements of the episode so far as a flat dict.
+        '''
+        wall_time = time.perf_counter() - self._start
+        summary = {
+            'episode': episode,
+            'wall_time': wall_time,
+            'sim_seconds': sim_seconds,
+            'sim_seconds_per_wall_second': sim_seconds / wall_time if wall_time else 0.0,
+            'traci_calls_per_step': self.counters['traci_calls'] / sim_seconds if sim_seconds else 0.0,
+            'learner_steps_per_second': self.counters['gradient_steps'] / wall_time if wall_time else 0.0,
+        }
+        for name in sorted(self.times):
+            summary[name + '_time'] = self.times[name]
+            summary[name + '_calls'] = self.calls[name]
+        for name in sorted(self.counters):
+            summary[name] = self.counters[name]
+        return summary
+
+class _NullStage:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+class _NullProfiler:
+    enabled = False
+
+    def __init__(self):
+        self._stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def count(self, name, n=1):
+        pass
+
+NULL_PROFILER = _NullProfiler()
+
+class _CountingDomain:
+    def __init__(self, connection, name, profiler):
+        self._connection = connection
+        self._name = name
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        # looked up on every call, the domains of a FakeSimulation are replaced on load
+        counters = self._profiler.counters
+        connection = self._connection
+        domain = self._name
+
+        def counted(*args, **kwargs):
+            counters['traci_calls'] += 1
+            return getattr(getattr(connection, domain), name)(*args, **kwargs)
+        return counted
+
+class CountingConnection:
+    DOMAINS = ('edge', 'lane', 'vehicle', 'trafficlight', 'simulation', 'inductionloop')
+
+    def __init__(self, connection, profiler):
+        '''
+        Wraps a TraCI connection, the libsumo module or a FakeSimulation and counts
+        every command sent through it in the traci_calls counter of the profiler.
+        '''
+        self._connection = connection
+        self._profiler = profiler
+        for name in self.DOMAINS:
+            setattr(self, name, _CountingDomain(connection, name, profiler))
+
+    def __getattr__(self, name):
+        attribute = getattr(self._connection, name)
+        if not callable(attribute):
+            return attribute
+        counters = self._profiler.counters
+
+        def counted(*args, **kwargs):
+            counters['traci_calls'] += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+class ProfileWriter:
+    def __init__(self, log_file_name):
+        '''
+        Appends the per-episode profiles next to the training log: log.txt gives
+        log.profile.jsonl and log.profile.csv.
+        '''
+        base = os.path.splitext(log_file_name)[0]
+        self.json_file_name = base + '.profile.jsonl'
+        self.csv_file_name = base + '.profile.csv'
+        self._columns = None
+
+    def write(self, summary):
+        with open(self.json_file_name, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+        if self._columns is None:
+            self._columns = list(summary)
+            write_header = not os.path.exists(self.csv_file_name)
+        else:
+            write_header = False
+        with open(self.csv_file_name, 'a', newline='') as f:
+            writer = csv.DictWriter(f, self._columns, extrasaction='ignore')
+            if write_header:
+                writer.writeheader()
+            writer.writerow(summary)
+
+class SamplingProfiler:
+    def __init__(self, log_file_name, first_episode, last_episode):
+        '''
+        Profiles the episodes first_episode to last_episode (inclusive) with the
+        pyinstrument sampling profiler when it is installed, or with cProfile
+        otherwise, and saves one report per episode next to the training log.
+        '''
+        self.base = os.path.splitext(log_file_name)[0]
+        self.first_episode = first_episode
+        self.last_episode = last_episode
+        self._profiler = None
+        try:
+            import pyinstrument
+            self._pyinstrument = pyinstrument
+        except ImportError:
+            self._pyinstrument = None
+
+    def start(self, episode):
+        if not self.first_episode <= episode <= self.last_episode:
+            return
+        self._episode = episode
+        if self._pyinstrument is not None:
+            self._profiler = self._pyinstrument.Profiler()
+            self._profiler.start()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if self._profiler is None:
+            return
+        if self._pyinstrument is not None:
+            self._profiler.stop()
+            with open('%s.episode%i.html' % (self.base, self._episode), 'w') as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats('%s.episode%i.prof' % (self.base, self._episode))
+        self._profiler = None
@@ -0,0 +1,262 @@
+import os
+import numpy as np
+from gymnasium import spaces
+from generator import DEMAND, TURNS, ROUTES
+from network import net_file, read_edges, read_lane_table, read_links, read_phases
+
+# length of a vehicle plus the minimum gap to the vehicle in front, and the
+# acceleration of the vehicle type of the generated routes
+VEHICLE_SPACE = 7.5
+ACCELERATION = 3.0
+# the lane features of TrafficEnv the queue model has: vehicles on the lane, and
+# those of them that have reached the stop line and wait there
+QUEUE_FEATURES = ('count', 'halting')
+
+def _demand_outcomes(routes, roads, links, edges):
+    '''
+    For every destination of DEMAND, the probabilities that an arrival drawn for it
+    reaches the intersection on each link, and its free-flow travel time from the
+    departure to the start of the approach. The turn and source choices follow
+    TrafficGenerator; a route through a link of several lanes picks one of them
+    uniformly. Returns (probabilities, link, delay), the first as (destinations, outcomes).
+    '''
+    route_edges = dict(routes)
+    outcomes = {}
+    for d, (destination, _) in enumerate(DEMAND):
+        lower = 0.0
+        for bound, sources in TURNS[destination]:
+            for _, route in sources:
+                path = route_edges[route].split()
+                entries = [i for i, edge in enumerate(path[:-1]) if edge in roads]
+                if entries:
+                    i = entries[0]
+                    route_links = [k for k, (from_edge, _, to_edge) in enumerate(links) if from_edge == path[i] and to_edge == path[i + 1]]
+                    delay = int(round(sum(edges[edge][0] / edges[edge][1] for edge in path[:i])))
+                    for k in route_links:
+                        key = (k, delay)
+                        outcomes.setdefault(key, np.zeros(len(DEMAND)))[d] += (bound - lower) / len(sources) / len(route_links)
+            lower = bound
+    keys = sorted(outcomes)
+    probabilities = np.array([outcomes[key] for key in keys]).T
+    return probabilities, np.array([k for k, _ in keys]), np.array([delay for _, delay in keys])
+
+class QueueModelEnv:
+    # the keys of episode_metrics()
+    EPISODE_METRICS = ('average_staying_time_per_vehicle', 'staying_time_count', 'average_approach_vehicles', 'sim_seconds')
+
+    def __init__(self, num_envs, sumocfg_file_name, time_steps, n_id, e_id, s_id, w_id, tls_id, green_time, yellow_time,
+            demand_scale=1.0, lane_features=('count',), saturation_headway=2.0, seed=None, **env_kwargs):
+        '''
+        A surrogate of num_envs TrafficEnvs of one intersection, simulated together
+        with NumPy as queues of the approach lanes instead of by SUMO. Observations,
+        actions and rewards are those of TrafficEnv, batched like a gymnasium
+        vector environment (with its next-step autoreset), so the staying time
+        reward and the 12 lane counts have the same meaning.
+
+        Vehicles arrive on the approaches with the probabilities of TrafficGenerator,
+        after the free-flow travel time from their departure, on a lane of their
+        link. Each lane is a queue in arrival order: a vehicle leaves it once it
+        could have driven the lane from a stop, its link is green and the
+        lane has discharged no vehicle in the last saturation_headway seconds. A
+        full lane holds arrivals back until there is space. The rest of the
+        network, e.g. the other intersection, is not modelled.
+
+        demand_scale is that of TrafficGenerator, or one per environment. The other
+        TrafficEnv arguments, like the log file or the highways, are accepted for
+        the use with ENV_KWARGS and have no effect.
+        '''
+        for feature in lane_features:
+            if feature not in QUEUE_FEATURES:
+                raise ValueError("lane feature '%s' is not modelled, expected one of %s" % (feature, ', '.join(QUEUE_FEATURES)))
+        if saturation_headway < 1:
+            raise ValueError('at most one vehicle per second leaves a lane, saturation_headway must be at least 1')
+        self.num_envs = num_envs
+        self.time_steps = time_steps
+        self.green_time = green_time
+        self.yellow_time = yellow_time
+        self.lane_features = list(lane_features)
+        self.saturation_headway = saturation_headway
+
+        net = net_file(os.path.join('config', sumocfg_file_name))
+        self.roads = [n_id, e_id, s_id, w_id]
+        approaches = read_lane_table(net)[tls_id]
+        edges = read_edges(net)
+        # the lanes in the order of the TrafficEnv observation
+        self.lanes = [(road, index) for road in self.roads for index in range(len(approaches[road]))]
+        lengths = np.array([approaches[road][index][1] for road, index in self.lanes])
+        # driving the lane at the speed limit, after speeding up to it from a stop
+        speeds = np.array([edges[road][1] for road, _ in self.lanes])
+        self._travel_times = np.ceil(lengths / speeds + speeds / (2 * ACCELERATION)).astype(np.int64)
+        self._capacities = (lengths // VEHICLE_SPACE).astype(np.int64)
+        # (lanes, roads) which road a lane belongs to
+        self._lane_roads = np.array([[road == other for other in self.roads] for road, _ in self.lanes], dtype=np.int64)
+
+        links = read_links(net, tls_id)
+        lane_index = {lane: i for i, lane in enumerate(self.lanes)}
+        lane_of_link = [lane_index[(from_edge, from_lane)] for from_edge, from_lane, _ in links]
+        # the links grouped by their rank among the links of their lane, as (links, their lanes)
+        ranks = [lane_of_link[:k].count(lane) for k, lane in enumerate(lane_of_link)]
+        self._link_ranks = [(np.flatnonzero(np.array(ranks) == r), np.array(lane_of_link)[np.array(ranks) == r]) for r in range(max(ranks) + 1)]
+        # (phases, links) whether a link may drive, yielding or not
+        self._green = np.array([[c in 'Gg' for c in state] for _, state in read_phases(net, tls_id)])
+        self._num_phases = len(self._green)
+
+        probabilities, self._outcome_links, self._outcome_delays = _demand_outcomes(ROUTES, self.roads, links, edges)
+        self._cumulative = np.cumsum(probabilities, axis=1)
+        self._arrival_probabilities = np.minimum(np.array([p for _, p in DEMAND]) * np.reshape(demand_scale, (-1, 1)), 1.0)
+        self._rng = np.random.default_rng(seed)
+
+        observation_size = len(self.lanes) * len(lane_features)
+        self.single_observation_space = spaces.Box(low=np.zeros(observation_size), high=np.ones(observation_size) * np.inf, dtype=np.float32)
+        self.single_action_space = spaces.Discrete(2)
+        self.observation_space = spaces.Box(low=np.zeros((num_envs, observation_size)), high=np.ones((num_envs, observation_size)) * np.inf, dtype=np.float32)
+        self.action_space = spaces.MultiDiscrete([2] * num_envs)
+
+        n, lanes, capacity = num_envs, len(self.lanes), self._capacities.max()
+        # every lane is a ring buffer of the entry times and links of its vehicles
+        self._entry = np.zeros((n, lanes, capacity), dtype=np.int64)
+        self._link = np.zeros((n, lanes, capacity), dtype=np.int64)
+        self._head = np.zeros((n, lanes), dtype=np.int64)
+        self._size = np.zeros((n, lanes), dtype=np.int64)
+        self._entry_sum = np.zeros((n, lanes), dtype=np.int64)
+        self._credit = np.zeros((n, lanes))
+        self._backlog = np.zeros((n, len(links)), dtype=np.int64)
+        # arrivals still on their way to the intersection, by the second they arrive
+        self._future = np.zeros((self._outcome_delays.max() + 1, n, len(links)), dtype=np.int64)
+        self.time = np.zeros(n, dtype=np.int64)
+        self.phase = np.zeros(n, dtype=np.int64)
+        self.prev_actions = np.full(n, -1)
+        self._departed = np.zeros(n, dtype=np.int64)
+        self._staying_time_sum = np.zeros(n, dtype=np.int64)
+        self._vehicle_seconds = np.zeros(n, dtype=np.int64)
+        self._autoreset = np.zeros(n, dtype=bool)
+        self._all = np.arange(n)
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        self._reset(np.ones(self.num_envs, dtype=bool))
+        return self.get_state(), {}
+
+    def _reset(self, mask):
+        for array in (self._head, self._size, self._entry_sum, self._credit, self._backlog, self.time, self.phase,
+                self._departed, self._staying_time_sum, self._vehicle_seconds):
+            array[mask] = 0
+        self._future[:, mask] = 0
+        self.prev_actions[mask] = -1
+        self._autoreset[mask] = False
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        # the environments that ended an episode in the last step only reset in this one
+        resetting = self._autoreset.copy()
+        self._reset(resetting)
+        active = ~resetting
+
+        keep = (self.prev_actions == -1) | (self.prev_actions == actions)
+        g, y = self.green_time, self.yellow_time
+        lengths = np.where(keep, g, 2 * (y + g)) * active
+        # the phase of every environment in every second of its schedule, as in TrafficEnv.step
+        seconds = np.arange(lengths.max())[None, :]
+        offsets = np.select([keep[:, None], seconds < y, seconds < y + g, seconds < 2 * y + g], [0, 1, 2, 3], 4)
+        phases = (self.phase[:, None] + offsets) % self._num_phases
+        for s in range(lengths.max()):
+            self._simulation_step(s < lengths, phases[:, s])
+        self.phase = np.where(active & ~keep, (self.phase + 4) % self._num_phases, self.phase)
+        self.prev_actions = np.where(active, actions, self.prev_actions)
+
+        rewards = -self.compute_rewards() * active
+        truncated = active & (self.time >= self.time_steps)
+        infos = {}
+        if truncated.any():
+            for key, values in self.episode_metrics().items():
+                infos[key] = np.where(truncated, values, 0)
+                infos['_' + key] = truncated
+        self._autoreset = truncated
+        return self.get_state(), rewards, np.zeros(self.num_envs, dtype=bool), truncated, infos
+
+    def _simulation_step(self, active, phases):
+        '''
+        Advance the active environments by one second with their phases.
+        '''
+        n = self.num_envs
+        self.time += active
+        time = self.time
+
+        # arrivals of this second, and their arrival at the intersection
+        arrives = (self._rng.random((n, len(DEMAND))) < self._arrival_probabilities) & active[:, None]
+        env, destination = np.nonzero(arrives)
+        outcome = (self._rng.random(len(env))[:, None] >= self._cumulative[destination]).sum(axis=1)
+        reached = outcome < len(self._outcome_links)
+        env, outcome = env[reached], outcome[reached]
+        np.add.at(self._future, ((time[env] + self._outcome_delays[outcome]) % len(self._future), env, self._outcome_links[outcome]), 1)
+        slot = time % len(self._future)
+        self._backlog += self._future[slot, self._all] * active[:, None]
+        self._future[slot, self._all] *= ~active[:, None]
+
+        # at most one vehicle per link enters its lane per second, if there is space;
+        # the links sharing a lane take turns in the order of their index
+        for links, lanes in self._link_ranks:
+            env, j = np.nonzero((self._backlog[:, links] > 0) & (self._size[:, lanes] < self._capacities[lanes]) & active[:, None])
+            link, lane = links[j], lanes[j]
+            position = (self._head[env, lane] + self._size[env, lane]) % self._entry.shape[2]
+            self._entry[env, lane, position] = time[env]
+            self._link[env, lane, position] = link
+            self._size[env, lane] += 1
+            self._entry_sum[env, lane] += time[env]
+            self._backlog[env, link] -= 1
+
+        # the front vehicle of every lane crosses the stop line if its link is green
+        # and the lane has credit: it earns 1 / saturation_headway departures per
+        # second while a vehicle is ready to leave, and at most one while none is
+        head = self._head[:, :, None]
+        entry = np.take_along_axis(self._entry, head, axis=2)[:, :, 0]
+        link = np.take_along_axis(self._link, head, axis=2)[:, :, 0]
+        ready = ((self._size > 0) & (time[:, None] - entry >= self._travel_times)
+            & self._green[phases[:, None], link] & active[:, None])
+        self._credit += active[:, None] / self.saturation_headway
+        leaves = ready & (self._credit >= 1.0 - 1e-9)
+        self._credit = np.where(ready, self._credit - leaves, np.minimum(self._credit, 1.0))
+        self._size -= leaves
+        self._head = (self._head + leaves) % self._entry.shape[2]
+        self._entry_sum -= entry * leaves
+        self._departed += leaves.sum(axis=1)
+        self._staying_time_sum += ((time[:, None] - entry) * leaves).sum(axis=1)
+        self._vehicle_seconds += self._size.sum(axis=1) * active
+
+    def _halting(self):
+        '''
+        Vehicles per lane that have been on it for at least its travel time.
+        '''
+        capacity = self._entry.shape[2]
+        queued = (np.arange(capacity) - self._head[:, :, None]) % capacity < self._size[:, :, None]
+        return (queued & (self.time[:, None, None] - self._entry >= self._travel_times[:, None])).sum(axis=2)
+
+    def get_state(self):
+        features = {'count': self._size, 'halting': self._halting() if 'halting' in self.lane_features else None}
+        return np.concatenate([features[feature] for feature in self.lane_features], axis=1).astype(np.float32)
+
+    def compute_rewards(self):
+        '''
+        The reward of TrafficEnv.compute_reward for every environment: the spread
+        of the average staying times of the vehicles on the four approaches.
+        '''
+        counts = self._size @ self._lane_roads
+        sums = self._entry_sum @ self._lane_roads
+        # a vehicle that entered in second e has been seen in seconds e to time
+        averages = np.where(counts > 0, (counts * (self.time[:, None] + 1) - sums) / np.maximum(counts, 1), 0.0)
+        return np.abs(averages.mean(axis=1, keepdims=True) - averages).sum(axis=1)
+
+    def episode_metrics(self):
+        '''
+        Staying time and queue statistics of the episodes so far, one value per environment.
+        '''
+        return {
+            'average_staying_time_per_vehicle': self._staying_time_sum / np.maximum(self._departed, 1),
+            'staying_time_count': self._departed,
+            'average_approach_vehicles': self._vehicle_seconds / np.maximum(self.time, 1),
+            'sim_seconds': self.time.copy(),
+        }
+
+    def close(self):
+        pass
@@ -0,0 +1,118 @@
+import json
+import os
+import numpy as np
+
+class ReplayMemory:
+    ARRAYS = ('states', 'actions', 'rewards', 'next_states', 'dones')
+
+    def __init__(self, capacity, state_size, seed=None):
+        '''
+        Fixed capacity ring buffer of transitions stored in preallocated arrays.
+        Once full, new transitions overwrite the oldest ones. seed seeds the
+        generator the batches are sampled with.
+        '''
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def push(self, state, action, reward, next_state, done):
+        '''
+        Store a transition.
+        '''
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        '''
+        Store a batch of transitions, one per row of the arrays.
+        '''
+        n = len(actions)
+        indices = (self.position + np.arange(n)) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size):
+        '''
+        Sample a batch of transitions uniformly with replacement. Every array in
+        the batch is a new contiguous array, so it can be wrapped with
+        torch.from_numpy without copying.
+        '''
+        indices = self.rng.integers(0, self.size, size=batch_size)
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices]
+        )
+
+    def nbytes(self):
+        '''
+        Memory taken by the transition arrays.
+        '''
+        return self.states.nbytes + self.actions.nbytes + self.rewards.nbytes + self.next_states.nbytes + self.dones.nbytes
+
+    def snapshot(self):
+        '''
+        A copy of the stored transitions and of the ring buffer position, which
+        save() can write while the memory keeps changing.
+        '''
+        arrays = {name: getattr(self, name)[:self.size].copy() for name in self.ARRAYS}
+        meta = {'capacity': self.capacity, 'position': self.position, 'size': self.size, 'rng': self.rng.bit_generator.state}
+        return arrays, meta
+
+    @staticmethod
+    def save(directory, snapshot):
+        '''
+        Write a snapshot as one .npy file per array plus a JSON file with the position.
+        '''
+        arrays, meta = snapshot
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + '.npy'), array)
+        with open(os.path.join(directory, 'memory.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory):
+        '''
+        Load a saved memory. The arrays are memory-mapped copy-on-write, so a large
+        memory is only read from disk as its pages are used and the files are
+        never modified.
+        '''
+        with open(os.path.join(directory, 'memory.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='c') for name in cls.ARRAYS}
+        memory = cls.__new__(cls)
+        memory.capacity = meta['capacity']
+        memory.position = meta['position']
+        memory.size = meta['size']
+        for name, array in arrays.items():
+            if memory.size < memory.capacity:
+                # the saved rows are the filled part of the ring buffer, the rest is allocated again
+                full = np.zeros((memory.capacity,) + array.shape[1:], dtype=array.dtype)
+                full[:memory.size] = array
+                array = full
+            setattr(memory, name, array)
+        memory.rng = np.random.default_rng()
+        memory.rng.bit_generator.state = meta['rng']
+        return memory
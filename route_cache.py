@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+
+# files used this recently are never evicted: the process that just got one
+# from the cache may not have started SUMO on it yet
+EVICTION_GRACE = 60
+
+class RouteCache:
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        '''
+        Cache of gzip compressed route files keyed by TrafficGenerator.cache_key.
+        When the files in cache_dir take more than max_bytes, the least recently
+        used ones are removed. Several processes can share cache_dir; a file one
+        of them evicts while another uses it is generated again.
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, traffic_generator, seed):
+        '''
+        Get the path of the route file for a seed, generating it on a miss.
+        '''
+        route_file = os.path.join(self.cache_dir, traffic_generator.cache_key(seed) + '.rou.xml.gz')
+        try:
+            # the modification time is the last use of the file for the eviction
+            os.utime(route_file)
+            return route_file
+        except FileNotFoundError:
+            # a miss, or evicted by another process since
+            pass
+
+        # write to a temporary file first so other processes sharing the cache
+        # never read a partially written route file
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp.gz', dir=self.cache_dir)
+        os.close(fd)
+        traffic_generator.generate_routefile(seed, tmp_file)
+        os.replace(tmp_file, route_file)
+        self.evict(keep=route_file)
+        return route_file
+
+    def evict(self, keep=None):
+        '''
+        Remove the least recently used route files until the cache fits in max_bytes,
+        except files used in the last EVICTION_GRACE seconds.
+        '''
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.rou.xml.gz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:   # evicted by another process
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+
+        recent = time.time() - EVICTION_GRACE
+        for mtime, size, path in sorted(files):
+            if total <= self.max_bytes or mtime >= recent:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:   # already evicted by another process
+                pass
+            total -= size
@@ -0,0 +1,32 @@
+from network import read_phases
+
+# the programs TrafficEnv can leave the traffic lights to instead of its actions:
+# the fixed-time program of the network, or the actuated one written below
+SIGNAL_PROGRAMS = ('static', 'actuated')
+ACTUATED_PROGRAM_ID = 'actuated'
+# bounds of the green phases of the actuated program, as seconds and as a
+# multiple of the phase duration of the fixed-time program
+MIN_GREEN = 5
+MAX_GREEN_FACTOR = 1.5
+
+def write_actuated_programs(file_name, net_file_name, tls_ids):
+    '''
+    Write a SUMO additional file with an actuated program for each of the traffic
+    lights, made from its fixed-time program: the same phases, where a green phase
+    lasts from MIN_GREEN seconds up to MAX_GREEN_FACTOR times its fixed duration
+    and ends early once the gap between vehicles on its lanes grows, measured by
+    the detectors SUMO places itself. Yellow phases keep their duration. The
+    program is the one the traffic light runs once the file is loaded.
+    '''
+    with open(file_name, 'w') as f:
+        f.write('<additional>\n')
+        for tls_id in tls_ids:
+            f.write('    <tlLogic id="%s" programID="%s" type="actuated" offset="0">\n' % (tls_id, ACTUATED_PROGRAM_ID))
+            for duration, state in read_phases(net_file_name, tls_id):
+                if 'y' in state:
+                    f.write('        <phase duration="%g" state="%s"/>\n' % (duration, state))
+                else:
+                    f.write('        <phase duration="%g" minDur="%g" maxDur="%g" state="%s"/>\n'
+                        % (duration, min(MIN_GREEN, duration), MAX_GREEN_FACTOR * duration, state))
+            f.write('    </tlLogic>\n')
+        f.write('</additional>\n')
@@ -0,0 +1,107 @@
+import math
+
+class StayingTimeStats:
+    def __init__(self):
+        '''
+        Streaming statistics of the staying time per vehicle. Staying times are
+        whole seconds, so a histogram of them is an exact sketch whose size is
+        bounded by the longest staying time rather than the number of vehicles.
+        Sums are kept as integers, which makes the mean identical to np.mean of
+        the list of staying times.
+        '''
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0
+        self.histogram = {}
+
+    def add(self, staying_time):
+        self.count += 1
+        self.total += staying_time
+        self.total_squares += staying_time * staying_time
+        self.histogram[staying_time] = self.histogram.get(staying_time, 0) + 1
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def variance(self):
+        '''
+        Population variance, like np.var.
+        '''
+        if not self.count:
+            return math.nan
+        return (self.count * self.total_squares - self.total * self.total) / (self.count * self.count)
+
+    def percentile(self, q):
+        '''
+        The q-th percentile (0-100) with linear interpolation between closest ranks, like np.percentile.
+        '''
+        if not self.count:
+            return math.nan
+        rank = q / 100 * (self.count - 1)
+        lower_rank = math.floor(rank)
+        lower = upper = None
+        seen = 0
+        for staying_time in sorted(self.histogram):
+            seen += self.histogram[staying_time]
+            if lower is None and seen > lower_rank:
+                lower = staying_time
+            if seen > lower_rank + 1 or seen == self.count:
+                upper = staying_time
+                break
+        return lower + (upper - lower) * (rank - lower_rank)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'variance': self.variance(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+class StayingTimeTracker:
+    def __init__(self, roads, stats=None):
+        '''
+        Staying time of the vehicles on the approach roads of an intersection. The
+        sum of staying times per road is kept up to date, so the average of a road
+        costs O(1), and departures are found with set differences. Staying times
+        of departed vehicles go into StayingTimeStats instead of a list, which
+        several trackers can share through stats.
+        '''
+        self.roads = list(roads)
+        self.staying_times = {road: {} for road in self.roads}  # road -> {vehID: seconds}
+        self.totals = {road: 0 for road in self.roads}
+        self.stats = stats if stats is not None else StayingTimeStats()
+
+    def update(self, vehicle_ids):
+        '''
+        Count one more second for every vehicle on the roads; vehicle_ids maps each road to its vehicle IDs.
+        '''
+        for road in self.roads:
+            staying_times = self.staying_times[road]
+            ids = vehicle_ids[road]
+            for vehID in ids:
+                staying_times[vehID] = staying_times.get(vehID, 0) + 1
+            self.totals[road] += len(ids)
+
+    def remove_departed(self, vehicle_ids):
+        '''
+        Remove the vehicles that are on none of the roads any more and record their staying times.
+        '''
+        present = set()
+        for road in self.roads:
+            present.update(vehicle_ids[road])
+        for road in self.roads:
+            staying_times = self.staying_times[road]
+            for vehID in staying_times.keys() - present:
+                staying_time = staying_times.pop(vehID)
+                self.totals[road] -= staying_time
+                self.stats.add(staying_time)
+
+    def average(self, road):
+        '''
+        Average staying time of the vehicles on a road.
+        '''
+        num_vehicles = len(self.staying_times[road])
+        return 0 if num_vehicles == 0 else self.totals[road] / num_vehicles
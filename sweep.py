@@ -0,0 +1,275 @@
+'''
+Hyperparameter and signal timing sweeps over a local process pool.
+
+    python sweep.py space.json sweeps/grid --workers 4
+    python sweep.py space.json sweeps/random --random 20 --workers 4
+    python sweep.py space.json sweeps/grid --workers 4    # again, to resume
+
+The search space is a JSON object from parameter name to a list of values, e.g.
+
+    {"gamma": [0.9, 0.95, 0.99], "epsilon": [0.05, 0.1], "green_time": [10, 15], "yellow_time": [4, 6]}
+
+A grid sweep runs every combination. A random sweep draws --random trials, and
+there a parameter can also be {"low": 0.0001, "high": 0.01, "log": true}, drawn
+uniformly (or log-uniformly) between the bounds.
+
+Every trial runs in its own directory under the sweep directory, with its own
+route file, SUMO port, TraCI label, training log and streamed metrics file.
+A trial whose running mean of the metric is worse than the median of the other
+trials at the same episode is stopped early. Finished and stopped trials leave
+a result.json; running the sweep again skips them and restarts the others.
+'''
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from json_files import write_json, read_json
+
+AGENT_PARAMETERS = ('gamma', 'epsilon', 'update_rate', 'memory_size', 'prioritized')
+ENV_PARAMETERS = ('green_time', 'yellow_time', 'time_steps', 'demand_scale', 'fast_forward', 'lane_features')
+TRIAL_PARAMETERS = ('batch_size', 'seed')
+
+def _check_parameters(names):
+    for name in names:
+        if name == 'learning_rate':
+            # DQNAgent keeps learning_rate but its RMSprop steps with update_rate, so such a sweep would change nothing
+            raise ValueError('DQNAgent trains with update_rate as its RMSprop step size, sweep update_rate instead of learning_rate')
+        if name not in AGENT_PARAMETERS + ENV_PARAMETERS + TRIAL_PARAMETERS:
+            raise ValueError("unknown sweep parameter '%s'" % name)
+
+def grid_trials(space):
+    '''
+    Every combination of the values of the space, in a fixed order.
+    '''
+    _check_parameters(space)
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def random_trials(space, num_trials, seed=0):
+    '''
+    num_trials parameter sets drawn from the space.
+    '''
+    _check_parameters(space)
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(num_trials):
+        params = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, dict):
+                if values.get('log'):
+                    params[name] = math.exp(rng.uniform(math.log(values['low']), math.log(values['high'])))
+                else:
+                    params[name] = rng.uniform(values['low'], values['high'])
+            else:
+                params[name] = rng.choice(values)
+        trials.append(params)
+    return trials
+
+class MedianStoppingRule:
+    def __init__(self, sweep_dir, metric, mode='min', grace_episodes=5):
+        '''
+        Stops a trial after an episode if the mean of its metric so far is worse
+        than the median of the other trials' means over the same episodes. Only
+        trials that have reached the episode count, and nothing is stopped before
+        grace_episodes episodes or while fewer than two other trials are there.
+        '''
+        self.sweep_dir = sweep_dir
+        self.metric = metric
+        self.sign = 1.0 if mode == 'min' else -1.0
+        self.grace_episodes = grace_episodes
+
+    def should_stop(self, trial, values):
+        episodes = len(values)
+        if episodes < self.grace_episodes:
+            return False
+        from metrics import read_metrics
+
+        others = []
+        for name in os.listdir(self.sweep_dir):
+            metrics_file = os.path.join(self.sweep_dir, name, 'metrics.jsonl')
+            if name == trial or not os.path.exists(metrics_file):
+                continue
+            other = [r[self.metric] for r in read_metrics(metrics_file) if self.metric in r]
+            if len(other) >= episodes:
+                others.append(np.mean(other[:episodes]))
+        if len(others) < 2:
+            return False
+        return self.sign * np.mean(values) > self.sign * np.median(others)
+
+def run_trial(sweep_dir, trial, params, num_episodes, env_kwargs, metric='average_staying_time_per_vehicle', stopping_rule=None):
+    '''
+    Train a DQNAgent with the parameters of the trial and return its result, ranked
+    by the metric of the episode records. Runs in a worker process of the sweep,
+    entirely inside the trial's directory.
+    '''
+    import torch
+    from environment import TrafficEnv
+    from dqn import DQNAgent
+    from metrics import MetricsWriter
+
+    # the workers share the cores, one thread each avoids oversubscribing them
+    torch.set_num_threads(1)
+    trial_dir = os.path.join(sweep_dir, trial)
+    seed = params.get('seed', 0)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    env_kwargs = dict(env_kwargs, **{k: v for k, v in params.items() if k in ENV_PARAMETERS})
+    env_kwargs.update(
+        log_file_name=os.path.join(trial_dir, 'log.txt'),
+        route_file=os.path.join(trial_dir, 'routes.rou.xml'),
+        label='sweep_' + trial)
+    agent_kwargs = dict(gamma=0.95, epsilon=0.1, learning_rate=0.0002, update_rate=0.001)
+    agent_kwargs.update({k: v for k, v in params.items() if k in AGENT_PARAMETERS})
+    batch_size = params.get('batch_size', 32)
+
+    env = TrafficEnv(**env_kwargs)
+    agent = DQNAgent(state_size=env.observation_space.shape[-1], action_size=2, **agent_kwargs)
+    metrics_file_name = os.path.join(trial_dir, 'metrics.jsonl')
+    metrics_writer = MetricsWriter(metrics_file_name, env_kwargs['log_file_name'])
+    values = []
+    status = 'complete'
+    start_time = time.perf_counter()
+    try:
+        for episode in range(num_episodes):
+            episode_start = time.perf_counter()
+            # every trial sees the same demand in the same episode
+            state, _ = env.reset(seed=episode)
+            total_reward = 0
+            count = 0
+            truncated = False
+            while not truncated:
+                action = agent.act(state)
+                next_state, reward, terminated, truncated, info = env.step(action)
+                agent.remember(state, action, reward, next_state, truncated)
+                state = next_state
+                total_reward += reward
+                count += 1
+                agent.replay(batch_size)
+            agent.update_target_model()
+            record = dict(info, episode=episode, average_reward=total_reward / count, wall_time=time.perf_counter() - episode_start)
+            metrics_writer.write(record)
+            values.append(record[metric])
+            if stopping_rule and episode < num_episodes - 1:
+                # the record is on disk before the other trials compare against it
+                metrics_writer.flush()
+                if stopping_rule.should_stop(trial, values):
+                    status = 'stopped'
+                    break
+    finally:
+        metrics_writer.close()
+        env.close()
+
+    result = {
+        'trial': trial,
+        'params': params,
+        'status': status,
+        'episodes': len(values),
+        # the mean over the last quarter of the episodes, which ranks the trials
+        'objective': float(np.mean(values[-max(len(values) // 4, 1):])),
+        'wall_time': time.perf_counter() - start_time,
+    }
+    write_json(os.path.join(trial_dir, 'result.json'), result, indent=2)
+    return result
+
+def run_sweep(sweep_dir, trials, num_episodes, env_kwargs, workers, metric='average_staying_time_per_vehicle', mode='min',
+        grace_episodes=5, early_stopping=True, base_port=None):
+    '''
+    Run the trials, a list of parameter dicts, in a pool of workers processes and
+    return the results of all of them, the complete trials best first, then the stopped ones. The trial list is stored in the
+    sweep directory; a sweep that is run again must have the same trials, and only
+    the trials without a result run.
+    '''
+    from environment import TrafficEnv
+
+    # the fields of the episode records, the queue statistics only where the environment counts them
+    fields = [name for name in TrafficEnv.EPISODE_METRICS if env_kwargs.get('queue_stats') or not name.startswith('queue_')]
+    fields += ['average_reward', 'wall_time']
+    if metric not in fields:
+        raise ValueError("unknown metric '%s', the episode records have %s" % (metric, ', '.join(fields)))
+    os.makedirs(sweep_dir, exist_ok=True)
+    sweep_file = os.path.join(sweep_dir, 'sweep.json')
+    if os.path.exists(sweep_file):
+        if read_json(sweep_file)['trials'] != json.loads(json.dumps(trials)):
+            raise ValueError('%s holds a sweep with other trials, use a new directory' % sweep_dir)
+    else:
+        write_json(sweep_file, {'trials': trials, 'num_episodes': num_episodes, 'metric': metric, 'mode': mode}, indent=2)
+
+    names = ['trial_%04i' % i for i in range(len(trials))]
+    results = {}
+    pending = []
+    for i, (name, params) in enumerate(zip(names, trials)):
+        trial_dir = os.path.join(sweep_dir, name)
+        result_file = os.path.join(trial_dir, 'result.json')
+        if os.path.exists(result_file):
+            results[name] = read_json(result_file)
+            continue
+        # an interrupted trial starts over
+        os.makedirs(trial_dir, exist_ok=True)
+        for file_name in ('metrics.jsonl', 'log.txt'):
+            if os.path.exists(os.path.join(trial_dir, file_name)):
+                os.remove(os.path.join(trial_dir, file_name))
+        write_json(os.path.join(trial_dir, 'params.json'), params, indent=2)
+        trial_env_kwargs = dict(env_kwargs)
+        if base_port is not None:
+            trial_env_kwargs['port'] = base_port + i
+        pending.append((name, params, trial_env_kwargs))
+
+    print('%i trials, %i finished before, %i to run on %i workers' % (len(trials), len(results), len(pending), workers))
+    stopping_rule = MedianStoppingRule(sweep_dir, metric, mode, grace_episodes) if early_stopping else None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(run_trial, sweep_dir, name, params, num_episodes, trial_env_kwargs, metric, stopping_rule): name
+            for name, params, trial_env_kwargs in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # no result is written, so the trial runs again when the sweep is resumed
+                print('%s failed: %r' % (name, e))
+                continue
+            results[name] = result
+            print('%s %-8s %3i episodes  %s %.3f  %s' % (name, result['status'], result['episodes'], metric, result['objective'], result['params']))
+    finally:
+        # on an interrupt the queued trials are dropped instead of run, the resumed sweep runs them
+        pool.shutdown(cancel_futures=True)
+
+    # a stopped trial's objective comes from its early episodes and is not comparable, so complete trials rank first
+    sign = 1 if mode == 'min' else -1
+    ranked = sorted(results.values(), key=lambda r: (r['status'] != 'complete', sign * r['objective']))
+    write_json(os.path.join(sweep_dir, 'results.json'), ranked, indent=2)
+    return ranked
+
+if __name__ == '__main__':
+    from training_simulation import ENV_KWARGS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('space', help='JSON file with the search space')
+    parser.add_argument('sweep_dir', help='directory of the sweep, reused to resume it')
+    parser.add_argument('--random', type=int, help='draw this many random trials instead of the full grid')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random search')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='trials running at the same time')
+    parser.add_argument('--episodes', type=int, default=100, help='training episodes per trial')
+    parser.add_argument('--metric', default='average_staying_time_per_vehicle', help='episode metric the trials are ranked by')
+    parser.add_argument('--mode', choices=['min', 'max'], default='min', help='whether a lower or a higher metric is better')
+    parser.add_argument('--grace-episodes', type=int, default=5, help='episodes every trial runs before it can be stopped early')
+    parser.add_argument('--no-early-stopping', action='store_true', help='run every trial for all episodes')
+    parser.add_argument('--backend', default='traci', help="simulation backend: 'traci', 'libsumo' or 'fake'")
+    parser.add_argument('--base-port', type=int, help='SUMO port of the first trial, the others count up; a free port by default')
+    args = parser.parse_args()
+
+    space = read_json(args.space)
+    trials = random_trials(space, args.random, args.seed) if args.random else grid_trials(space)
+    ranked = run_sweep(args.sweep_dir, trials, args.episodes, dict(ENV_KWARGS, backend=args.backend), args.workers,
+        args.metric, args.mode, args.grace_episodes, not args.no_early_stopping, args.base_port)
+    print('best trials:')
+    for result in ranked[:5]:
+        print('%s %.3f %s' % (result['trial'], result['objective'], result['params']))
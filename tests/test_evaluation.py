@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import torch
+import evaluation
+from checkpoint import Checkpointer
+from dqn import DQNAgent, SharedDQNAgent
+
+def save_checkpoint(directory, agent):
+    checkpointer = Checkpointer(directory)
+    checkpointer.save(agent, 0)
+    checkpointer.wait()
+
+def test_greedy_policy_from_checkpoint(tmp_path):
+    agent = DQNAgent(state_size=12, action_size=2, gamma=0.95, epsilon=0.1, learning_rate=0.0002, update_rate=0.001)
+    save_checkpoint(str(tmp_path), agent)
+    act = evaluation._greedy_policy(str(tmp_path))
+    states = np.random.default_rng(0).integers(0, 40, (50, 12)).astype(np.float32)
+    with torch.no_grad():
+        expected = agent.model(torch.from_numpy(states)).argmax(dim=1).tolist()
+    assert [act(state) for state in states] == expected
+
+def test_greedy_policy_rejects_multi_intersection_checkpoint(tmp_path):
+    save_checkpoint(str(tmp_path), SharedDQNAgent(state_size=12, action_size=2, num_intersections=2, gamma=0.95, epsilon=0.1,
+        learning_rate=0.0002, update_rate=0.001))
+    with pytest.raises(ValueError, match='multi-intersection'):
+        evaluation._greedy_policy(str(tmp_path))
@@ -0,0 +1,38 @@
+import pytest
+from metrics import MetricsWriter, read_metrics, truncate_metrics
+
+def test_truncate_metrics_drops_episodes_after_checkpoint(tmp_path):
+    metrics_file = str(tmp_path / 'log.metrics.jsonl')
+    log_file = str(tmp_path / 'log.txt')
+    writer = MetricsWriter(metrics_file, log_file)
+    for episode in range(5):
+        writer.write({'episode': episode, 'average_staying_time_per_vehicle': 1.0, 'average_reward': -1.0})
+    writer.close()
+
+    # resumed from the checkpoint after episode 2, episodes 3 and 4 run again
+    truncate_metrics(metrics_file, log_file, 3)
+    writer = MetricsWriter(metrics_file, log_file)
+    for episode in range(3, 5):
+        writer.write({'episode': episode, 'average_staying_time_per_vehicle': 2.0, 'average_reward': -2.0})
+    writer.close()
+
+    assert [r['episode'] for r in read_metrics(metrics_file)] == list(range(5))
+    with open(log_file) as f:
+        assert [line.split(',')[0] for line in f] == ['episode: %i' % e for e in range(5)]
+
+def test_writer_error_is_raised_instead_of_hanging(tmp_path):
+    writer = MetricsWriter(str(tmp_path / 'log.metrics.jsonl'), str(tmp_path / 'log.txt'))
+    # no staying time for the training log
+    writer.write({'episode': 0, 'average_reward': -1.0})
+    with pytest.raises(KeyError):
+        writer.flush()
+    with pytest.raises(KeyError):
+        writer.write({'episode': 1, 'average_staying_time_per_vehicle': 1.0, 'average_reward': -1.0})
+    with pytest.raises(KeyError):
+        writer.close()
+
+def test_unserializable_record_is_raised_on_close(tmp_path):
+    writer = MetricsWriter(str(tmp_path / 'log.metrics.jsonl'))
+    writer.write({'episode': 0, 'value': object()})
+    with pytest.raises(TypeError):
+        writer.close()
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+import torch
+from checkpoint import Checkpointer, load_checkpoint_agent
+from dqn import DQNAgent, SharedDQN, SharedDQNAgent
+from policy_export import action_agreement, export_policy, load_policy
+
+def shared_states(state_size, num_intersections, n=200):
+    rng = np.random.default_rng(0)
+    states = rng.integers(0, 40, (n, state_size + 1)).astype(np.float32)
+    # the last column is the index of the intersection
+    states[:, -1] = rng.integers(0, num_intersections, n)
+    return states
+
+@pytest.mark.parametrize('extension', ['.pt', '.onnx'])
+def test_export_shared_dqn(tmp_path, extension):
+    if extension == '.onnx':
+        pytest.importorskip('onnxruntime')
+    torch.manual_seed(0)
+    model = SharedDQN(12, 2, 2)
+    path = str(tmp_path / ('policy' + extension))
+    export_policy(model, path)
+    policy = load_policy(path)
+    assert policy.observation.shape == (13,)
+    assert action_agreement(model, policy, shared_states(12, 2)) == 1.0
+
+def test_export_shared_dqn_npz_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        export_policy(SharedDQN(12, 2, 2), str(tmp_path / 'policy.npz'))
+
+def test_export_cli_shared_checkpoint(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path / 'checkpoints'))
+    checkpointer.save(SharedDQNAgent(state_size=12, action_size=2, num_intersections=2, gamma=0.95, epsilon=0.1,
+        learning_rate=0.0002, update_rate=0.001), 0)
+    checkpointer.wait()
+    output = str(tmp_path / 'policy.pt')
+    result = subprocess.run([sys.executable, 'policy_export.py', '--checkpoint-dir', str(tmp_path / 'checkpoints'), '--output', output],
+        capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'actions matching the trained network: 1.0000' in result.stdout
+    assert load_policy(output).observation.shape == (13,)
+
+def test_load_checkpoint_agent(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path))
+    assert load_checkpoint_agent(str(tmp_path)) is None
+    agent = DQNAgent(state_size=24, action_size=2, gamma=0.95, epsilon=0.1, learning_rate=0.0002, update_rate=0.001)
+    checkpointer.save(agent, 3)
+    checkpointer.wait()
+    loaded = load_checkpoint_agent(str(tmp_path))
+    assert type(loaded) is DQNAgent and loaded.state_size == 24
+    for name, weight in agent.model.state_dict().items():
+        assert torch.equal(loaded.model.state_dict()[name], weight)
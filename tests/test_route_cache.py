@@ -0,0 +1,55 @@
+import os
+import time
+import route_cache
+from generator import TrafficGenerator
+from route_cache import RouteCache
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+def test_get_regenerates_file_evicted_by_another_process(tmp_path, monkeypatch):
+    cache = RouteCache(str(tmp_path))
+    generator = TrafficGenerator(300)
+    route_file = cache.get(generator, 1)
+    utime = os.utime
+
+    def evicted_before_utime(path, *args, **kwargs):
+        # another process removes the file between the lookup and the touch
+        if path == route_file and os.path.exists(path) and not args:
+            os.remove(path)
+        return utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(route_cache.os, 'utime', evicted_before_utime)
+    assert cache.get(generator, 1) == route_file
+    assert os.path.exists(route_file)
+
+def test_evict_keeps_recently_used_files(tmp_path):
+    generator = TrafficGenerator(300)
+    cache = RouteCache(str(tmp_path))
+    files = [cache.get(generator, seed) for seed in range(4)]
+    age(files[0], 2 * route_cache.EVICTION_GRACE)
+    age(files[1], 3 * route_cache.EVICTION_GRACE)
+    cache.max_bytes = 0
+    cache.evict()
+    # the old files go, the ones just used stay however full the cache is
+    assert [os.path.exists(f) for f in files] == [False, False, True, True]
+
+def test_evict_skips_files_removed_while_scanning(tmp_path, monkeypatch):
+    generator = TrafficGenerator(300)
+    cache = RouteCache(str(tmp_path))
+    files = [cache.get(generator, seed) for seed in range(3)]
+    for f in files:
+        age(f, 2 * route_cache.EVICTION_GRACE)
+    scandir = os.scandir
+
+    def removed_after_listing(path):
+        entries = list(scandir(path))
+        # another process evicts a file after it was listed
+        os.remove(files[0])
+        return iter(entries)
+
+    monkeypatch.setattr(route_cache.os, 'scandir', removed_after_listing)
+    cache.max_bytes = 0
+    cache.evict()
+    assert not any(os.path.exists(f) for f in files)
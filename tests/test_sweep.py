@@ -0,0 +1,18 @@
+import os
+import pytest
+from sweep import grid_trials, run_sweep
+from training_simulation import ENV_KWARGS
+
+ENV = dict(ENV_KWARGS, backend='fake', time_steps=300)
+
+def test_sweep_ranks_by_record_metric(tmp_path):
+    # average_reward is only in the written record, not in the step info
+    trials = grid_trials({'gamma': [0.9, 0.95, 0.99]})
+    ranked = run_sweep(str(tmp_path), trials, 2, ENV, 1, metric='average_reward', mode='max', grace_episodes=1)
+    assert len(ranked) == 3
+    for result in ranked:
+        assert os.path.exists(os.path.join(str(tmp_path), result['trial'], 'result.json'))
+
+def test_sweep_rejects_unknown_metric(tmp_path):
+    with pytest.raises(ValueError):
+        run_sweep(str(tmp_path), grid_trials({'gamma': [0.9]}), 1, ENV, 1, metric='queue_mean')
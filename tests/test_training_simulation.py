@@ -0,0 +1,36 @@
+import pytest
+import training_simulation
+from dqn import DQNAgent
+from ensemble import DQNEnsembleAgent
+from environment import TrafficEnv
+
+class RecordList(list):
+    def write(self, record):
+        self.append(record)
+
+@pytest.fixture
+def short_episodes(monkeypatch):
+    # the episodes of the workers end on different steps, as actions that switch
+    # the phase take longer than ones that keep it, so workers reset while others finish
+    monkeypatch.setitem(training_simulation.ENV_KWARGS, 'time_steps', 300)
+    monkeypatch.setitem(training_simulation.ENV_KWARGS, 'backend', 'fake')
+    return TrafficEnv(**training_simulation.ENV_KWARGS).observation_space.shape[-1]
+
+def test_train_vectorized_across_autoreset(short_episodes):
+    agent = DQNAgent(state_size=short_episodes, action_size=2, gamma=0.95, epsilon=0.5, learning_rate=0.0002, update_rate=0.001)
+    records = RecordList()
+    training_simulation.train_vectorized(agent, 4, 12, 32, records)
+    assert [r['episode'] for r in records] == list(range(12))
+    for record in records:
+        assert set(record) <= {'episode', 'average_reward', 'wall_time'} | set(TrafficEnv.EPISODE_METRICS)
+        assert record['sim_seconds'] >= 300
+
+def test_train_ensemble_across_autoreset(short_episodes):
+    agent = DQNEnsembleAgent(state_size=short_episodes, action_size=2, num_members=4, gamma=0.95, epsilons=0.5,
+        learning_rates=0.001, update_rate=0.001)
+    records = RecordList()
+    training_simulation.train_ensemble(agent, 3, 32, records)
+    assert sorted((r['member'], r['episode']) for r in records) == [(m, e) for m in range(4) for e in range(3)]
+    for record in records:
+        assert set(record) <= {'member', 'episode', 'average_reward', 'wall_time'} | set(TrafficEnv.EPISODE_METRICS)
+        assert record['sim_seconds'] >= 300
@@ -0,0 +1,25 @@
+import numpy as np
+from transitions import TransitionDataset, TransitionRecorder
+
+def record_episode(recorder, episode, rows, state_size):
+    recorder.begin_episode(episode, seed=episode)
+    states = np.full((rows, state_size), episode, dtype=np.float32)
+    recorder.record_batch(states, np.zeros(rows, dtype=np.int64), np.ones(rows, dtype=np.float32), states, np.zeros(rows, dtype=np.float32))
+    recorder.end_episode()
+
+def test_recording_resumes_after_last_row(tmp_path):
+    recorder = TransitionRecorder(str(tmp_path), 4, shard_size=8)
+    record_episode(recorder, 0, 5, 4)
+    recorder.close()
+    # a new recorder continues in the shard the last one left, and fills the next
+    recorder = TransitionRecorder(str(tmp_path), 4, shard_size=8)
+    record_episode(recorder, 1, 6, 4)
+    recorder.close()
+
+    dataset = TransitionDataset(str(tmp_path))
+    assert len(dataset) == 11 and len(dataset.shards) == 2
+    assert [(e['episode'], e['shard'], e['start'], e['end']) for e in dataset.episodes] == [(0, 0, 0, 5), (1, 0, 5, 8), (1, 1, 0, 3)]
+    out = {'states': np.zeros((11, 4), np.float32), 'actions': np.zeros(11, np.int64), 'rewards': np.zeros(11, np.float32),
+        'next_states': np.zeros((11, 4), np.float32), 'dones': np.zeros(11, np.float32)}
+    dataset.gather(np.arange(11), out)
+    assert out['states'][:, 0].tolist() == [0] * 5 + [1] * 6
@@ -0,0 +1,12 @@
+from training_simulation import ENV_KWARGS
+from vector_env import make_vector_env
+
+def test_workers_count_up_from_port():
+    envs = make_vector_env(3, asynchronous=False, **dict(ENV_KWARGS, backend='fake', port=9000))
+    assert [env.port for env in envs.envs] == [9000, 9001, 9002]
+    envs.close()
+
+def test_free_port_without_port():
+    envs = make_vector_env(2, asynchronous=False, **dict(ENV_KWARGS, backend='fake'))
+    assert [env.port for env in envs.envs] == [None, None]
+    envs.close()
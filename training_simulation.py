@@ -1,6 +1,18 @@
+import argparse
+import os
+import time
+import numpy as np
 from environment import TrafficEnv
-from dqn import DQNAgent
-import matplotlib.pyplot as plt
+from vector_env import make_vector_env
+from generator import DEMAND_PROFILES
+from dqn import DQNAgent, SharedDQNAgent
+from ensemble import DQNEnsembleAgent
+from queue_model import QueueModelEnv
+from profiling import Profiler, ProfileWriter, SamplingProfiler
+from checkpoint import Checkpointer
+from metrics import MetricsWriter, truncate_metrics, write_columnar
+from plot_metrics import plot
+from transitions import TransitionRecorder
 
 NE_HIGHWAY_ID = 'hwn'
 SE_HIGHWAY_ID = 'hws'
@@ -12,79 +24,317 @@ INT1_E = 'ew3'
 INT1_N = 'int1ns1'
 INT1_S = 'int1sn1'
 INT_SPEED_LIMIT = 15.64
+TLS_INT2_ID = 'int2'
+INT2_W = 'we2'
+INT2_E = 'ew2'
+INT2_N = 'int2ns1'
+INT2_S = 'int2sn1'
+
+# both signalized junctions of the network, for --multi-intersection
+INTERSECTIONS = [
+    dict(tls_id=TLS_INT1_ID, n_id=INT1_N, e_id=INT1_E, s_id=INT1_S, w_id=INT1_W),
+    dict(tls_id=TLS_INT2_ID, n_id=INT2_N, e_id=INT2_E, s_id=INT2_S, w_id=INT2_W),
+]
+
+ENV_KWARGS = dict(
+    sumocfg_file_name='run.sumocfg',
+    log_file_name='log.txt',
+    time_steps=3600,
+    n_id=INT1_N, 
+    e_id=INT1_E, 
+    s_id=INT1_S, 
+    w_id=INT1_W, 
+    tls_id=TLS_INT1_ID,
+    n_highway_id=NE_HIGHWAY_ID,
+    s_highway_id=SE_HIGHWAY_ID, 
+    green_time=10,
+    yellow_time=6,
+    use_gui=False
+)
+
+def episode_record(infos, i, metric_names, **fields):
+    '''
+    The metrics record of the episode environment i of a vector environment
+    finished: the fields and the episode metrics among the step infos.
+    '''
+    record = dict(fields)
+    for name in metric_names:
+        # the infos only have the metrics once some environment finished an episode
+        if name in infos and infos['_' + name][i]:
+            record[name] = infos[name][i].item()
+    return record
+
+def train_vectorized(agent, num_envs, num_episodes, batch_size, metrics_writer, learn_inline=True, surrogate=False, gradient_steps=1):
+    '''
+    Train with num_envs environments stepping in worker processes. The agent picks
+    the actions of all workers in one batch and stores their transitions together.
+    With learn_inline=False the agent's learner thread does the replay and target updates.
+    The metrics of every episode go to metrics_writer in the order the episodes finished.
+    With surrogate=True the environments are intersections of a QueueModelEnv instead.
+    Every replay call runs gradient_steps gradient steps.
+    '''
+    envs = QueueModelEnv(num_envs, **ENV_KWARGS) if surrogate else make_vector_env(num_envs, **ENV_KWARGS)
+    metric_names = QueueModelEnv.EPISODE_METRICS if surrogate else TrafficEnv.EPISODE_METRICS
+    states, _ = envs.reset()
+    total_rewards = np.zeros(num_envs)
+    counts = np.zeros(num_envs, dtype=np.int64)
+    start_times = np.full(num_envs, time.perf_counter())
+    # after an episode ends, the next step of that worker only resets it and its
+    # transition must not be stored
+    autoreset = np.zeros(num_envs, dtype=bool)
+    episode = 0
+
+    while episode < num_episodes:
+        actions = agent.act_batch(states)
+        next_states, step_rewards, _, truncated, infos = envs.step(actions)
+
+        valid = ~autoreset
+        agent.remember_batch(states[valid], actions[valid], step_rewards[valid], next_states[valid], truncated[valid])
+        total_rewards[valid] += step_rewards[valid]
+        counts[valid] += 1
+        states = next_states
+
+        if learn_inline:
+            for _ in range(valid.sum()):
+                agent.replay(batch_size, gradient_steps)
+
+        for i in np.flatnonzero(truncated & valid):
+            if episode < num_episodes:
+                metrics_writer.write(episode_record(infos, i, metric_names, episode=episode, average_reward=total_rewards[i] / counts[i],
+                    wall_time=time.perf_counter() - start_times[i]))
+                episode += 1
+            total_rewards[i] = 0
+            counts[i] = 0
+            start_times[i] = time.perf_counter()
+            if learn_inline:
+                agent.update_target_model()
+        autoreset = truncated
+
+    envs.close()
+
+def train_ensemble(agent, num_episodes, batch_size, metrics_writer):
+    '''
+    Train the members of a DQNEnsembleAgent, each on its own environment in a
+    worker process, until every member has run num_episodes episodes. All
+    members act in one batch and replay in one batched update per step. Every
+    record written to metrics_writer has the index of its member.
+    '''
+    num_members = agent.num_members
+    envs = make_vector_env(num_members, **ENV_KWARGS)
+    states, _ = envs.reset()
+    total_rewards = np.zeros(num_members)
+    counts = np.zeros(num_members, dtype=np.int64)
+    episodes = np.zeros(num_members, dtype=np.int64)
+    start_times = np.full(num_members, time.perf_counter())
+    # as in train_vectorized, the step after the end of an episode only resets that worker
+    autoreset = np.zeros(num_members, dtype=bool)
+
+    while episodes.min() < num_episodes:
+        actions = agent.act(states)
+        next_states, step_rewards, _, truncated, infos = envs.step(actions)
+
+        valid = ~autoreset
+        agent.remember(states, actions, step_rewards, next_states, truncated, np.flatnonzero(valid))
+        total_rewards[valid] += step_rewards[valid]
+        counts[valid] += 1
+        states = next_states
+        agent.replay(batch_size)
+
+        finished = np.flatnonzero(truncated & valid)
+        for i in finished:
+            if episodes[i] < num_episodes:
+                metrics_writer.write(episode_record(infos, i, TrafficEnv.EPISODE_METRICS, member=int(i), episode=int(episodes[i]),
+                    average_reward=total_rewards[i] / counts[i], wall_time=time.perf_counter() - start_times[i]))
+            episodes[i] += 1
+            total_rewards[i] = 0
+            counts[i] = 0
+            start_times[i] = time.perf_counter()
+        if len(finished):
+            agent.update_target_model(finished)
+        autoreset = truncated
+
+    envs.close()
 
 if __name__ == '__main__':
-    env = TrafficEnv(
-        sumocfg_file_name='run.sumocfg',
-        log_file_name='log.txt',
-        time_steps=3600,
-        n_id=INT1_N, 
-        e_id=INT1_E, 
-        s_id=INT1_S, 
-        w_id=INT1_W, 
-        tls_id=TLS_INT1_ID,
-        n_highway_id=NE_HIGHWAY_ID,
-        s_highway_id=SE_HIGHWAY_ID, 
-        green_time=10,
-        yellow_time=6,
-        use_gui=False
-    )
-
-    agent = DQNAgent(
-        state_size=12, 
-        action_size=2,
-        gamma=0.95,
-        epsilon=0.1,
-        learning_rate=0.0002,
-        update_rate=0.001)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-envs', type=int, default=1, help='number of environments stepping in parallel worker processes')
+    parser.add_argument('--async-learner', action='store_true', help='train in a learner thread while the environment steps')
+    parser.add_argument('--update-to-data-ratio', type=float, default=1.0, help='learner gradient steps per stored transition')
+    parser.add_argument('--publish-interval', type=int, default=10, help='learner gradient steps between weight copies to the acting policy')
+    parser.add_argument('--target-update-interval', type=int, default=100, help='learner gradient steps between target network updates')
+    parser.add_argument('--surrogate', action='store_true', help='train on the NumPy queue model of the intersection instead of SUMO')
+    parser.add_argument('--fast-forward', action='store_true', help='skip ahead without decisions while the approaches are empty')
+    parser.add_argument('--demand-profile', choices=list(DEMAND_PROFILES), default='peak', help='traffic demand of the generated routes')
+    parser.add_argument('--prioritized', action='store_true', help='sample replay batches by TD error')
+    parser.add_argument('--compile-step', action='store_true', help='run the TD update compiled with torch.compile')
+    parser.add_argument('--gradient-steps', type=int, default=1, help='gradient steps per replay, on batches sampled together')
+    parser.add_argument('--lane-features', default='count', help='comma separated per-lane observation values: count, halting, occupancy')
+    parser.add_argument('--multi-intersection', action='store_true', help='control both intersections with one shared network')
+    parser.add_argument('--ensemble', type=int, default=1, help='train this many independent agents together, each on its own environment')
+    parser.add_argument('--ensemble-epsilons', help='comma separated epsilon of each ensemble member, 0.1 for all by default')
+    parser.add_argument('--ensemble-learning-rates', help='comma separated learning rate of each ensemble member, 0.001 for all by default')
+    parser.add_argument('--columnar', action='store_true', help='also store the metrics as a columnar .npz file at the end')
+    parser.add_argument('--profile', action='store_true', help='write per-episode stage timings next to the training log')
+    parser.add_argument('--profile-episodes', help='run a sampling profiler over the episodes FIRST:LAST')
+    parser.add_argument('--checkpoint-dir', help='directory agent checkpoints are written to')
+    parser.add_argument('--checkpoint-interval', type=int, default=10, help='episodes between checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue from the latest checkpoint in --checkpoint-dir')
+    parser.add_argument('--record-transitions', help='directory every transition is recorded to, for offline_training.py')
+    args = parser.parse_args()
+    if (args.profile or args.profile_episodes) and args.num_envs > 1:
+        parser.error('profiling needs --num-envs 1, the environments of workers cannot be timed')
+    if args.checkpoint_dir and args.num_envs > 1:
+        parser.error('checkpoints need --num-envs 1, the episodes running in workers cannot be resumed')
+    if args.multi_intersection and args.num_envs > 1:
+        parser.error('--multi-intersection needs --num-envs 1')
+    if args.ensemble > 1 and (args.num_envs > 1 or args.multi_intersection or args.async_learner or args.prioritized
+            or args.checkpoint_dir or args.profile or args.profile_episodes):
+        parser.error('--ensemble runs one environment per member and cannot be combined with --num-envs, --multi-intersection, '
+            '--async-learner, --prioritized, checkpoints or profiling')
+    if args.record_transitions and (args.num_envs > 1 or args.ensemble > 1):
+        parser.error('--record-transitions needs --num-envs 1 and no --ensemble')
+    if args.surrogate and (args.multi_intersection or args.ensemble > 1 or args.checkpoint_dir or args.record_transitions
+            or args.profile or args.profile_episodes):
+        parser.error('--surrogate models one intersection and cannot be combined with --multi-intersection, --ensemble, '
+            'checkpoints, --record-transitions or profiling')
+    if args.async_learner and args.gradient_steps > 1:
+        parser.error('the learner thread takes its gradient steps from --update-to-data-ratio, not --gradient-steps')
+    if args.ensemble > 1 and (args.compile_step or args.gradient_steps > 1):
+        parser.error('--ensemble updates all members in one batched step without --compile-step or --gradient-steps')
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume needs --checkpoint-dir')
+
+    ENV_KWARGS.update(fast_forward=args.fast_forward, demand_scale=DEMAND_PROFILES[args.demand_profile], lane_features=args.lane_features.split(','))
+    profiler = Profiler() if args.profile else None
+    profile_writer = ProfileWriter(ENV_KWARGS['log_file_name']) if args.profile else None
+    sampling_profiler = None
+    if args.profile_episodes:
+        first, last = args.profile_episodes.split(':')
+        sampling_profiler = SamplingProfiler(ENV_KWARGS['log_file_name'], int(first), int(last))
+
+    env_kwargs = dict(ENV_KWARGS, intersections=INTERSECTIONS) if args.multi_intersection else ENV_KWARGS
+    # SUMO only starts on reset, the environment is created here for its observation size, which follows the lanes of the network
+    env = TrafficEnv(**env_kwargs, profiler=profiler)
+    state_size = env.observation_space.shape[-1]
+
+    if args.ensemble > 1:
+        # the single agent steps RMSprop with its update_rate, so that is the default learning rate of the members
+        agent = DQNEnsembleAgent(
+            state_size=state_size,
+            action_size=2,
+            num_members=args.ensemble,
+            gamma=0.95,
+            epsilons=[float(e) for e in args.ensemble_epsilons.split(',')] if args.ensemble_epsilons else 0.1,
+            learning_rates=[float(r) for r in args.ensemble_learning_rates.split(',')] if args.ensemble_learning_rates else 0.001,
+            update_rate=0.001)
+    elif args.multi_intersection:
+        agent = SharedDQNAgent(
+            state_size=state_size,
+            action_size=2,
+            num_intersections=len(INTERSECTIONS),
+            gamma=0.95,
+            epsilon=0.1,
+            learning_rate=0.0002,
+            update_rate=0.001,
+            profiler=profiler,
+            prioritized=args.prioritized,
+            compile_step=args.compile_step)
+    else:
+        agent = DQNAgent(
+            state_size=state_size,
+            action_size=2,
+            gamma=0.95,
+            epsilon=0.1,
+            learning_rate=0.0002,
+            update_rate=0.001,
+            profiler=profiler,
+            prioritized=args.prioritized,
+            compile_step=args.compile_step)
 
     num_episodes = 100
     batch_size = 32
-    rewards = []
+    # one line per episode, written as soon as the episode finishes
+    metrics_file_name = os.path.splitext(ENV_KWARGS['log_file_name'])[0] + '.metrics.jsonl'
 
-    for episode in range(num_episodes):
-        state, info = env.reset()
-        total_reward = 0
-        truncated = False
+    checkpointer = Checkpointer(args.checkpoint_dir) if args.checkpoint_dir else None
+    first_episode = 0
+    if args.resume:
+        resumed = checkpointer.load(agent)
+        if resumed is not None:
+            first_episode = resumed[0] + 1
+            # the episodes after the checkpoint are recorded again, as they run again
+            truncate_metrics(metrics_file_name, ENV_KWARGS['log_file_name'], first_episode)
+    metrics_writer = MetricsWriter(metrics_file_name, ENV_KWARGS['log_file_name'])
 
-        count = 0
+    # with several intersections, each intersection's transition is a row of its own
+    recorder = TransitionRecorder(args.record_transitions, state_size) if args.record_transitions else None
 
-        while not truncated:
-            action = agent.act(state)
-            next_state, reward, terminated, truncated, _ = env.step(action)
-            agent.remember(state, action, reward, next_state, truncated)
-            state = next_state
-            total_reward += reward
-            count += 1
+    if args.async_learner:
+        agent.start_learner(batch_size, args.update_to_data_ratio, args.publish_interval, args.target_update_interval)
 
-            agent.replay(batch_size)
-        
-        agent.update_target_model()
+    if args.ensemble > 1:
+        train_ensemble(agent, num_episodes, batch_size, metrics_writer)
+    elif args.num_envs > 1 or args.surrogate:
+        train_vectorized(agent, args.num_envs, num_episodes, batch_size, metrics_writer, learn_inline=not args.async_learner,
+            surrogate=args.surrogate, gradient_steps=args.gradient_steps)
+    else:
+        for episode in range(first_episode, num_episodes):
+            if profiler:
+                profiler.reset()
+            if sampling_profiler:
+                sampling_profiler.start(episode)
+            start_time = time.perf_counter()
+            seed = None
+            if recorder:
+                # a seed of the same randomness as an unseeded reset, which the recorded episode can be generated again from
+                seed = int.from_bytes(os.urandom(4), 'little')
+                recorder.begin_episode(episode, seed)
+            state, _ = env.reset(seed=seed)
+            total_reward = 0
+            truncated = False
+
+            count = 0
+
+            while not truncated:
+                action = agent.act(state)
+                next_state, reward, terminated, truncated, info = env.step(action)
+                agent.remember(state, action, reward, next_state, truncated)
+                if recorder:
+                    recorder.record_batch(np.reshape(state, (-1, state_size)), np.reshape(action, -1), np.reshape(reward, -1),
+                        np.reshape(next_state, (-1, state_size)), np.full(np.size(action), truncated))
+                state = next_state
+                # with several intersections, the mean of their rewards
+                total_reward += np.mean(reward)
+                count += 1
+
+                if not args.async_learner:
+                    agent.replay(batch_size, args.gradient_steps)
+            
+            if not args.async_learner:
+                agent.update_target_model()
+            if recorder:
+                recorder.end_episode()
+            
+            metrics_writer.write(dict(info, episode=episode, average_reward=total_reward / count, wall_time=time.perf_counter() - start_time))
+
+            if sampling_profiler:
+                sampling_profiler.stop()
+            if profiler:
+                profile_writer.write(profiler.summary(episode, env.sumo_step))
+            if checkpointer and ((episode + 1) % args.checkpoint_interval == 0 or episode == num_episodes - 1):
+                checkpointer.save(agent, episode)
         
-        rewards.append(total_reward / count)
-    
-    state, info = env.reset()
-    info = list(info.values())
-
-    # write to log file
-    log = open('log.txt', 'a')
-    for i in range(num_episodes):
-        log.write('episode: ' + str(i) + ',  Average Staying Time Per Vehicle: ' + str(info[i]) + ', Average Reward Per Episode: ' + str(rewards[i]) + '\n')
-    log.close()
-
-    # First plot (in the first window)
-    fig1, ax1 = plt.subplots()  # Create a figure and axes for the first plot
-    ax1.plot(range(num_episodes), rewards)
-    ax1.set_title('Average Reward Per Episode')
-    ax1.set_xlabel('Episode')
-    ax1.set_ylabel('Average Reward')
-
-    # Second plot (in the second window)
-    fig2, ax2 = plt.subplots()  # Create a figure and axes for the second plot
-    ax2.plot(range(num_episodes), info)
-    ax2.set_title('Average Staying Time Per Vehicle Per Episode')
-    ax2.set_xlabel('Episode')
-    ax2.set_ylabel('Average Staying Time Per Vehicle')
-
-    # Display both plots
-    plt.show()
+        env.close()
+
+    if recorder:
+        recorder.close()
+    if args.async_learner:
+        agent.stop_learner()
+    metrics_writer.close()
+    if checkpointer:
+        checkpointer.wait()
+
+    if args.columnar:
+        write_columnar(metrics_file_name)
+    # saved as images next to the metrics file, plot_metrics.py redraws them from the file at any time
+    plot(metrics_file_name)
@@ -0,0 +1,199 @@
+import glob
+import os
+import queue
+import threading
+import numpy as np
+from json_files import write_json, read_json
+
+SHARD_FILE = 'shard.json'
+
+def _shard_arrays(state_size):
+    # the arrays of ReplayMemory, so batches read from shards look like sampled ones
+    return {
+        'states': ((state_size,), np.float32),
+        'actions': ((), np.int64),
+        'rewards': ((), np.float32),
+        'next_states': ((state_size,), np.float32),
+        'dones': ((), np.float32),
+    }
+
+def _shard_dirs(directory):
+    return sorted(glob.glob(os.path.join(directory, 'shard_*')))
+
+class TransitionRecorder:
+    def __init__(self, directory, state_size, shard_size=100000):
+        '''
+        Appends transitions to shards of shard_size rows in directory. A shard is
+        a subdirectory with one memory-mapped .npy file per array of ReplayMemory
+        and a shard.json with the number of rows written so far and the episodes
+        they belong to, with the seed of their demand. Rows only count once their
+        episode ends or their shard is full, so a reader never sees the rows of
+        an episode that is still running. Recording into a directory that has
+        shards continues after the last row.
+        '''
+        self.directory = directory
+        self.state_size = state_size
+        self.shard_size = shard_size
+        self._episode = None
+        os.makedirs(directory, exist_ok=True)
+        shards = _shard_dirs(directory)
+        if shards:
+            meta = read_json(os.path.join(shards[-1], SHARD_FILE))
+            if meta['state_size'] != state_size:
+                raise ValueError('%s holds transitions with %i state values, not %i' % (directory, meta['state_size'], state_size))
+            if meta['size'] < meta['capacity']:
+                self._open_shard(len(shards) - 1, meta)
+                return
+        self._open_shard(len(shards))
+
+    def _open_shard(self, index, meta=None):
+        self._shard_index = index
+        self._shard_dir = os.path.join(self.directory, 'shard_%06i' % index)
+        mode = 'r+'
+        if meta is None:
+            os.makedirs(self._shard_dir, exist_ok=True)
+            meta = {'state_size': self.state_size, 'capacity': self.shard_size, 'size': 0, 'episodes': []}
+            mode = 'w+'
+        self._arrays = {name: np.lib.format.open_memmap(os.path.join(self._shard_dir, name + '.npy'), mode=mode,
+            dtype=dtype, shape=(meta['capacity'],) + shape) for name, (shape, dtype) in _shard_arrays(self.state_size).items()}
+        self._meta = meta
+        self._size = meta['size']
+        self._episode_start = self._size
+        if mode == 'w+':
+            self._commit()
+
+    def begin_episode(self, episode, seed=None):
+        '''
+        The following rows belong to the episode, whose demand came from seed.
+        '''
+        self._episode = {'episode': episode, 'seed': seed}
+
+    def record(self, state, action, reward, next_state, done):
+        self.record_batch(np.expand_dims(state, 0), np.expand_dims(action, 0), np.expand_dims(reward, 0),
+            np.expand_dims(next_state, 0), np.expand_dims(done, 0))
+
+    def record_batch(self, states, actions, rewards, next_states, dones):
+        '''
+        Append one row per transition, e.g. the transitions of all intersections in a step.
+        '''
+        batch = {'states': states, 'actions': actions, 'rewards': rewards, 'next_states': next_states, 'dones': dones}
+        n = len(actions)
+        written = 0
+        while written < n:
+            if self._size == self._meta['capacity']:
+                # the part of the episode in the full shard counts there, the rest goes to the next
+                self._end_segment()
+                self._open_shard(self._shard_index + 1)
+            count = min(n - written, self._meta['capacity'] - self._size)
+            for name, array in self._arrays.items():
+                array[self._size:self._size + count] = batch[name][written:written + count]
+            self._size += count
+            written += count
+
+    def end_episode(self):
+        self._end_segment()
+        self._episode = None
+
+    def _end_segment(self):
+        if self._size > self._episode_start:
+            self._meta['episodes'].append(dict(self._episode or {'episode': None, 'seed': None}, start=self._episode_start, end=self._size))
+        self._episode_start = self._size
+        self._commit()
+
+    def _commit(self):
+        for array in self._arrays.values():
+            array.flush()
+        self._meta['size'] = self._size
+        write_json(os.path.join(self._shard_dir, SHARD_FILE), self._meta)
+
+    def close(self):
+        '''
+        Release the shard. The rows of an unfinished episode are dropped and
+        overwritten by the next recording into the directory.
+        '''
+        self._arrays = {}
+
+class TransitionDataset:
+    def __init__(self, directory, in_memory=False):
+        '''
+        The transitions recorded in directory by a TransitionRecorder, read through
+        memory maps of the shards, or loaded into memory with in_memory=True.
+        '''
+        self.shards = []
+        self.episodes = []
+        sizes = []
+        for shard_dir in _shard_dirs(directory):
+            meta = read_json(os.path.join(shard_dir, SHARD_FILE))
+            if not meta['size']:
+                continue
+            arrays = {}
+            for name in _shard_arrays(meta['state_size']):
+                array = np.load(os.path.join(shard_dir, name + '.npy'), mmap_mode='r')[:meta['size']]
+                arrays[name] = np.array(array) if in_memory else array
+            self.shards.append(arrays)
+            self.episodes.extend(dict(e, shard=len(self.shards) - 1) for e in meta['episodes'])
+            self.state_size = meta['state_size']
+            sizes.append(meta['size'])
+        if not sizes:
+            raise ValueError('no transitions recorded in %s' % directory)
+        # the index of the first row of every shard, and the end of the last
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def gather(self, indices, out):
+        '''
+        Copy the rows at the sorted indices into the arrays of the dict out.
+        '''
+        bounds = np.searchsorted(indices, self.offsets)
+        for shard, arrays in enumerate(self.shards):
+            first, last = bounds[shard], bounds[shard + 1]
+            if first == last:
+                continue
+            rows = indices[first:last] - self.offsets[shard]
+            for name, array in arrays.items():
+                np.take(array, rows, axis=0, out=out[name][first:last])
+
+class PrefetchLoader:
+    def __init__(self, dataset, batch_size, prefetch=4, seed=None):
+        '''
+        Uniformly sampled batches of a TransitionDataset, as (states, actions,
+        rewards, next_states, dones) like ReplayMemory.sample. A background thread
+        reads the next prefetch batches into preallocated buffers while the
+        caller trains on the current one, which it must be done with before it
+        asks for the next.
+        '''
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self._rng = np.random.default_rng(seed)
+        # the buffers of the queued batches, the one being filled and the one in use
+        self._buffers = [{name: np.empty((batch_size,) + shape, dtype=dtype) for name, (shape, dtype) in _shard_arrays(dataset.state_size).items()}
+            for _ in range(prefetch + 2)]
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        i = 0
+        while not self._stop.is_set():
+            buffer = self._buffers[i % len(self._buffers)]
+            # sorted, the rows of a shard are read in file order; the order within a batch does not matter to the loss
+            indices = np.sort(self._rng.integers(0, len(self.dataset), self.batch_size))
+            self.dataset.gather(indices, buffer)
+            batch = tuple(buffer[name] for name in ('states', 'actions', 'rewards', 'next_states', 'dones'))
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            i += 1
+
+    def next(self):
+        return self._queue.get()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,20 @@
+import gymnasium as gym
+from environment import TrafficEnv
+
+def make_vector_env(num_envs, asynchronous=True, **env_kwargs):
+    '''
+    Create num_envs TrafficEnv instances behind gymnasium's vector API. With
+    asynchronous=True every instance runs in its own worker process. Each
+    instance has its own labeled TraCI connection, SUMO port and route file;
+    with a port in env_kwargs the instances count up from it.
+    '''
+    def make_env(i):
+        kwargs = dict(env_kwargs)
+        if kwargs.get('port') is not None:
+            kwargs['port'] += i
+        return lambda: TrafficEnv(label='TrafficEnv_worker_%i' % i, **kwargs)
+
+    env_fns = [make_env(i) for i in range(num_envs)]
+    if asynchronous:
+        return gym.vector.AsyncVectorEnv(env_fns)
+    return gym.vector.SyncVectorEnv(env_fns)